@@ -1,4 +1,5 @@
 import logging
+from datetime import datetime, timedelta, timezone
 from contextlib import asynccontextmanager
 
 import uvicorn
@@ -6,12 +7,26 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 import config
+from src.ai_jobs import runner as ai_job_runner
+from src.compression import CompressionMiddleware
 from src.database import get_db, close_client
+from src.http_clients import close_http_clients
+from src.image_store import migrate_images
+from src.image_processing import shutdown_pool
+from src.post_events import hub as post_event_hub
+from src.queue_order import init_counter
+from src.scheduler import materialize_schedule
+from src.serialization import JSONResponse
+from src.slot_reservations import backfill as backfill_reservations
 from routers.auth import router as auth_router
+from routers.bulk import router as bulk_router
+from routers.events import router as events_router
 from routers.posts import router as posts_router
 from routers.generate import router as generate_router
+from routers.ai_jobs import router as ai_jobs_router
 from routers.settings import router as settings_router
 from routers.history import router as history_router
+from routers.schedule import router as schedule_router
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -24,14 +39,40 @@ async def _create_indexes():
     await db.post_queue.create_index([("status", 1), ("scheduled_time", 1)])
     await db.post_queue.create_index([("status", 1)])
     await db.post_queue.create_index([("queue_order", 1)])
+    # Keyset pagination: one index range scan per page
+    await db.post_queue.create_index([("status", 1), ("queue_order", 1), ("_id", 1)])
+    await db.post_queue.create_index([("status", 1), ("published_at", 1), ("_id", 1)])
+    await db.post_queue.create_index([("status", 1), ("lease_expires_at", 1)])
+    await db.post_queue.create_index([("updated_at", 1)])
     await db.settings.create_index([("setting_key", 1)], unique=True)
+    await db["post_images.chunks"].create_index([("files_id", 1), ("n", 1)], unique=True)
+    await db["post_images.files"].create_index([("filename", 1), ("uploadDate", 1)])
+    await db.upload_sessions.create_index([("expires_at", 1)])
+    await db.slot_reservations.create_index([("account", 1), ("slot_time", 1)], unique=True)
+    await db.slot_reservations.create_index([("post_id", 1)])
+    await db.ai_cache.create_index([("expires_at", 1)], expireAfterSeconds=0)
+    await db.ai_jobs.create_index([("status", 1), ("provider", 1), ("created_at", 1)])
+    await db.ai_jobs.create_index([("batch_id", 1)])
+    await db.ai_jobs.create_index([("expires_at", 1)], expireAfterSeconds=0)
     logger.info("MongoDB indexes ensured")
 
 
 @asynccontextmanager
 async def lifespan(application: FastAPI):
     await _create_indexes()
+    await migrate_images()
+    await init_counter()
+    reserved = await backfill_reservations(datetime.now(timezone.utc) - timedelta(days=2))
+    if reserved:
+        logger.info(f"Reserved slots for {reserved} existing scheduled posts")
+    await materialize_schedule()
+    post_event_hub.start()
+    ai_job_runner.start()
     yield
+    await ai_job_runner.stop()
+    await post_event_hub.stop()
+    await close_http_clients()
+    shutdown_pool()
     close_client()
 
 
@@ -40,6 +81,7 @@ app = FastAPI(
     description="AI-powered LinkedIn post scheduling and publishing",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=JSONResponse,
     redirect_slashes=False,
 )
 
@@ -50,12 +92,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
 
 app.include_router(auth_router)
+app.include_router(bulk_router)  # before posts, whose /{post_id} routes would shadow /bulk
 app.include_router(posts_router)
 app.include_router(generate_router)
+app.include_router(ai_jobs_router)
 app.include_router(settings_router)
 app.include_router(history_router)
+app.include_router(schedule_router)
+app.include_router(events_router)
 
 
 @app.get("/health")
@@ -0,0 +1,142 @@
+"""Benchmark: drain a backlog of due posts against a local LinkedIn stand-in.
+
+Starts a small HTTP server that mimics the LinkedIn Posts and Images
+endpoints (with configurable latency), seeds a scratch Mongo database with
+due posts, and times `cron.publisher.run` at several concurrency limits.
+
+    python -m benchmarks.publisher_backlog --posts 1000 --image-ratio 0.3
+
+Needs a reachable MongoDB (MONGO_CONNECTION_STRING); writes only to the
+`<db>_bench` database, which it drops afterwards.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn  # noqa: E402
+from cryptography.fernet import Fernet  # noqa: E402
+from fastapi import FastAPI, Request, Response  # noqa: E402
+
+import config  # noqa: E402
+
+config.MONGO_DB_NAME = f"{config.MONGO_DB_NAME}_bench"
+config.FERNET_KEY = config.FERNET_KEY or Fernet.generate_key().decode()
+
+from src import linkedin_api  # noqa: E402
+from src.database import get_db, close_client  # noqa: E402
+from src.image_store import store_image  # noqa: E402
+from src.http_clients import close_http_clients  # noqa: E402
+from src.token_store import store_tokens  # noqa: E402
+from cron import publisher  # noqa: E402
+
+HOST, PORT = "127.0.0.1", 8765
+
+
+def _stand_in(latency: float) -> FastAPI:
+    app = FastAPI()
+    counter = {"n": 0}
+
+    @app.post("/rest/posts")
+    async def create_post():
+        await asyncio.sleep(latency)
+        counter["n"] += 1
+        return Response(status_code=201, headers={"x-restli-id": f"urn:li:share:{counter['n']}"})
+
+    @app.post("/rest/images")
+    async def init_upload():
+        await asyncio.sleep(latency)
+        counter["n"] += 1
+        return {
+            "value": {
+                "uploadUrl": f"http://{HOST}:{PORT}/upload/{counter['n']}",
+                "image": f"urn:li:image:{counter['n']}",
+            }
+        }
+
+    @app.put("/upload/{image_id}")
+    async def upload(image_id: str, request: Request):
+        await request.body()
+        await asyncio.sleep(latency * 2)
+        return Response(status_code=201)
+
+    return app
+
+
+async def _seed(posts: int, image_ratio: float, image_kb: int) -> None:
+    db = get_db()
+    await db.post_queue.delete_many({})
+    now = datetime.now(timezone.utc)
+    image_every = int(1 / image_ratio) if image_ratio > 0 else 0
+    docs = []
+    for i in range(posts):
+        doc = {
+            "content": f"Backlog post {i}",
+            "post_type": "text",
+            "status": "scheduled",
+            "scheduled_time": now - timedelta(minutes=posts - i),
+            "queue_order": i + 1,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if image_every and i % image_every == 0:
+            # Distinct bytes per post, so nothing is served from the URN cache
+            doc.update(await store_image(os.urandom(image_kb * 1024), "image/jpeg"), post_type="image")
+        docs.append(doc)
+    await db.post_queue.insert_many(docs)
+
+
+async def _check_order() -> bool:
+    db = get_db()
+    cursor = db.post_queue.find({"status": "published"}).sort("published_at", 1)
+    times = [doc["scheduled_time"] async for doc in cursor]
+    return times == sorted(times)
+
+
+async def main(args: argparse.Namespace) -> None:
+    server = uvicorn.Server(uvicorn.Config(_stand_in(args.latency), host=HOST, port=PORT, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    linkedin_api.POSTS_URL = f"http://{HOST}:{PORT}/rest/posts"
+    linkedin_api.IMAGES_URL = f"http://{HOST}:{PORT}/rest/images"
+    publisher.DAILY_CAP = args.posts
+    await store_tokens("bench", "bench-token", None, 86400 * 30, {"name": "Benchmark"})
+
+    print(f"{args.posts} posts, {args.image_ratio:.0%} with images, {args.latency * 1000:.0f} ms stand-in latency")
+    print(f"{'concurrency':>11} {'seconds':>8} {'posts/s':>8} {'in order':>8}")
+    try:
+        for concurrency in args.concurrency:
+            await _seed(args.posts, args.image_ratio, args.image_kb)
+            config.PUBLISH_CONCURRENCY = concurrency
+            start = time.perf_counter()
+            published = await publisher.run()
+            elapsed = time.perf_counter() - start
+            ordered = await _check_order()
+            print(f"{concurrency:>11} {elapsed:>8.2f} {published / elapsed:>8.1f} {str(ordered):>8}")
+    finally:
+        await get_db().client.drop_database(config.MONGO_DB_NAME)
+        await close_http_clients()
+        close_client()
+        server.should_exit = True
+        await serve_task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--image-ratio", type=float, default=0.3)
+    parser.add_argument("--image-kb", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in latency per call, seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,105 @@
+"""Benchmark: rendering queue and history pages to JSON.
+
+Compares the previous path (per-field `isoformat()` in `_serialize`, then
+FastAPI's `jsonable_encoder` and the stdlib `json` in JSONResponse) with
+`post_out` and the orjson response class, on synthetic post documents
+shaped like those in post_queue.
+
+    python -m benchmarks.serialization --docs 1000 5000 --runs 20
+
+Needs no database.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse as StdlibJSONResponse  # noqa: E402
+
+from src.serialization import JSONResponse, post_out  # noqa: E402
+
+
+def _legacy_serialize(doc: dict) -> dict:
+    """The previous routers.posts._serialize."""
+    doc["_id"] = str(doc["_id"])
+    doc["has_image"] = bool(doc.pop("image_id", None) or doc.get("image_urn"))
+    for field in ("scheduled_time", "published_at", "created_at", "updated_at"):
+        if doc.get(field):
+            doc[field] = doc[field].isoformat()
+    return doc
+
+
+def _docs(count: int, published: bool) -> list[dict]:
+    start = datetime(2024, 1, 1, 9, 0)
+    docs = []
+    for i in range(count):
+        when = start + timedelta(hours=i)
+        doc = {
+            "_id": ObjectId(),
+            "content": f"Post {i}: " + "Lessons from shipping a product in public. " * 12,
+            "post_type": "image" if i % 4 == 0 else "text",
+            "status": "published" if published else ("scheduled" if i % 2 else "draft"),
+            "scheduled_time": when,
+            "queue_order": 1024.0 * (i + 1),
+            "image_urn": None,
+            "linkedin_post_id": f"urn:li:share:{7000000000 + i}" if published else None,
+            "error": None,
+            "created_at": when - timedelta(days=3),
+            "updated_at": when - timedelta(days=1),
+        }
+        if i % 4 == 0:
+            doc["image_id"] = ObjectId()
+        if published:
+            doc["published_at"] = when
+        docs.append(doc)
+    return docs
+
+
+def _legacy(docs: list[dict]) -> bytes:
+    # _serialize mutated the documents, so a real request worked on fresh ones
+    posts = [_legacy_serialize(dict(doc)) for doc in docs]
+    content = jsonable_encoder({"posts": posts, "next_cursor": None})
+    return StdlibJSONResponse(content).body
+
+
+def _current(docs: list[dict]) -> bytes:
+    return JSONResponse({"posts": [post_out(doc) for doc in docs], "next_cursor": None}).body
+
+
+def _time(render, docs: list[dict], runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        render(docs)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--docs", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    for payload, published in (("queue", False), ("history", True)):
+        for count in args.docs:
+            docs = _docs(count, published)
+            assert len(_legacy(docs)) > 0 and len(_current(docs)) > 0
+            print(f"{payload}, {count} documents:")
+            for label, render in (("_serialize + jsonable_encoder + json", _legacy), ("post_out + orjson", _current)):
+                timings = _time(render, docs, args.runs)
+                p50 = statistics.median(timings)
+                print(f"  {label:38s} p50 {p50 * 1000:8.2f} ms  {p50 / count * 1e6:6.2f} us/doc")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark: slot calculation, one query per candidate slot vs one range query.
+
+Seeds a scratch Mongo database with a busy two weeks (every slot but the
+last few taken) and times `get_next_available_slots`, which reads taken
+slots from slot_reservations in one range query, against the original
+implementation, which issued a `count_documents` per candidate slot.
+
+    python -m benchmarks.slot_calculation --slots-per-day 8 --runs 50
+
+Needs a reachable MongoDB (MONGO_CONNECTION_STRING); writes only to the
+`<db>_bench` database, which it drops afterwards.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+config.MONGO_DB_NAME = f"{config.MONGO_DB_NAME}_bench"
+
+from src import scheduler, slot_reservations  # noqa: E402
+from src.database import get_db, close_client  # noqa: E402
+from src.schemas import DaySchedule, ScheduleSettings, TimeSlot  # noqa: E402
+
+
+async def _per_slot_queries(count: int) -> list[datetime]:
+    """The previous implementation: UTC only, one round trip per candidate."""
+    settings = await scheduler.get_schedule_settings()
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    slots: list[datetime] = []
+    for day_offset in range(scheduler.LOOKAHEAD_DAYS):
+        date = now + timedelta(days=day_offset)
+        day_schedule = settings.schedule.get(scheduler.DAY_NAMES[date.weekday()])
+        if not day_schedule or not day_schedule.enabled:
+            continue
+        for slot in day_schedule.slots:
+            slot_time = date.replace(hour=slot.hour, minute=slot.minute, second=0, microsecond=0)
+            if slot_time <= now:
+                continue
+            if await db.post_queue.count_documents({"status": "scheduled", "scheduled_time": slot_time}):
+                continue
+            slots.append(slot_time)
+            if len(slots) >= count:
+                return slots
+    return slots
+
+
+async def _seed(slots_per_day: int, free: int) -> None:
+    db = get_db()
+    await db.post_queue.delete_many({})
+    await db.slot_reservations.delete_many({})
+    await db.slot_reservations.create_index([("account", 1), ("slot_time", 1)], unique=True)
+    day = DaySchedule(slots=[TimeSlot(hour=8 + i) for i in range(slots_per_day)])
+    settings = ScheduleSettings(daily_cap=50, schedule={name: day for name in scheduler.DAY_NAMES})
+    await db.settings.update_one(
+        {"setting_key": "schedule"}, {"$set": settings.model_dump()}, upsert=True
+    )
+    taken = (await scheduler.get_next_available_slots(count=10_000))[:-free]
+    now = datetime.now(timezone.utc)
+    await db.post_queue.insert_many([
+        {"content": "taken", "status": "scheduled", "scheduled_time": t, "queue_order": i, "created_at": now}
+        for i, t in enumerate(taken)
+    ])
+    await slot_reservations.backfill(now - timedelta(days=1))
+    print(f"{len(taken)} slots taken, {free} free")
+
+
+async def _time(fn, runs: int, count: int) -> tuple[float, float, list[datetime]]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = await fn(count)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1], result
+
+
+async def main(args: argparse.Namespace) -> None:
+    await _seed(args.slots_per_day, args.free)
+    print(f"{'implementation':>16} {'p50 ms':>8} {'p95 ms':>8}")
+    try:
+        results = []
+        for name, fn in (("per-slot query", _per_slot_queries), ("range query", scheduler.get_next_available_slots)):
+            p50, p95, slots = await _time(fn, args.runs, args.free)
+            results.append(slots)
+            print(f"{name:>16} {p50:>8.2f} {p95:>8.2f}")
+        print(f"same slots: {results[0] == results[1]}")
+    finally:
+        await get_db().client.drop_database(config.MONGO_DB_NAME)
+        close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slots-per-day", type=int, default=8)
+    parser.add_argument("--free", type=int, default=5, help="free slots left at the end of the window")
+    parser.add_argument("--runs", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -23,10 +23,30 @@ LINKEDIN_CLIENT_SECRET = os.getenv("LINKEDIN_CLIENT_SECRET", "")
 # Fernet key for token encryption
 FERNET_KEY = os.getenv("FERNET_KEY", "")
 
-# AI provider: "openai" or "anthropic"
+# Preferred AI provider until one is picked in the AI settings: "openai" or "anthropic"
 AI_PROVIDER = os.getenv("AI_PROVIDER", "openai")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
+# "parallel": one completion per variant, all at once; "single": one completion for all
+AI_VARIANT_MODE = os.getenv("AI_VARIANT_MODE", "parallel")
+AI_VARIANT_COUNT = int(os.getenv("AI_VARIANT_COUNT", "3"))
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", "86400"))  # 0 = off
+AI_CACHE_MEMORY_ENTRIES = int(os.getenv("AI_CACHE_MEMORY_ENTRIES", "256"))
+# Provider routing (see src/ai_providers.py)
+AI_FAILOVER = os.getenv("AI_FAILOVER", "true").lower() == "true"
+AI_HEDGE = os.getenv("AI_HEDGE", "false").lower() == "true"
+AI_PROVIDER_TIMEOUT_SECONDS = float(os.getenv("AI_PROVIDER_TIMEOUT_SECONDS", "90"))
+AI_FIRST_TOKEN_TIMEOUT_SECONDS = float(os.getenv("AI_FIRST_TOKEN_TIMEOUT_SECONDS", "20"))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+AI_LATENCY_WINDOW = int(os.getenv("AI_LATENCY_WINDOW", "200"))
+# Background generation jobs (per API process)
+AI_JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "4"))  # 0 = don't run jobs in this process
+AI_JOB_OPENAI_CONCURRENCY = int(os.getenv("AI_JOB_OPENAI_CONCURRENCY", "4"))
+AI_JOB_ANTHROPIC_CONCURRENCY = int(os.getenv("AI_JOB_ANTHROPIC_CONCURRENCY", "2"))
+AI_JOB_LEASE_SECONDS = int(os.getenv("AI_JOB_LEASE_SECONDS", "300"))
+AI_JOB_MAX_ATTEMPTS = int(os.getenv("AI_JOB_MAX_ATTEMPTS", "3"))
+AI_JOB_POLL_SECONDS = float(os.getenv("AI_JOB_POLL_SECONDS", "2"))
+AI_JOB_RETENTION_DAYS = int(os.getenv("AI_JOB_RETENTION_DAYS", "7"))
 
 # Environment-specific config
 ENV_CONFIG = {
@@ -62,3 +82,42 @@ else:
 # Cookie settings
 COOKIE_DOMAIN = os.getenv("COOKIE_DOMAIN", ".topcx.ai" if ENV == "prod" else None)
 COOKIE_SECURE = ENV == "prod"
+
+# Publisher daemon
+PUBLISHER_POLL_SECONDS = float(os.getenv("PUBLISHER_POLL_SECONDS", "15"))
+PUBLISHER_RESYNC_SECONDS = float(os.getenv("PUBLISHER_RESYNC_SECONDS", "300"))
+PUBLISHER_BLOCKED_RETRY_SECONDS = float(os.getenv("PUBLISHER_BLOCKED_RETRY_SECONDS", "60"))
+PUBLISHER_HEAP_LIMIT = int(os.getenv("PUBLISHER_HEAP_LIMIT", "1000"))
+PUBLISH_LEASE_SECONDS = int(os.getenv("PUBLISH_LEASE_SECONDS", "300"))
+PUBLISH_CONCURRENCY = int(os.getenv("PUBLISH_CONCURRENCY", "4"))
+PRESTAGE_HORIZON_SECONDS = float(os.getenv("PRESTAGE_HORIZON_SECONDS", "900"))
+PRESTAGE_INTERVAL_SECONDS = float(os.getenv("PRESTAGE_INTERVAL_SECONDS", "60"))
+
+# Auto-scheduling
+AUTO_SCHEDULE_DAYS = int(os.getenv("AUTO_SCHEDULE_DAYS", "14"))
+SLOT_MATERIALIZE_DAYS = int(os.getenv("SLOT_MATERIALIZE_DAYS", "62"))
+AUTO_SCHEDULE_INTERVAL_SECONDS = float(os.getenv("AUTO_SCHEDULE_INTERVAL_SECONDS", "0"))  # 0 = off
+
+# Live post updates (GET /api/events/posts)
+POST_EVENTS_BUFFER = int(os.getenv("POST_EVENTS_BUFFER", "1000"))
+POST_EVENTS_QUEUE_SIZE = int(os.getenv("POST_EVENTS_QUEUE_SIZE", "256"))
+POST_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("POST_EVENTS_HEARTBEAT_SECONDS", "15"))
+POST_EVENTS_POLL_SECONDS = float(os.getenv("POST_EVENTS_POLL_SECONDS", "5"))
+
+# Response compression (brotli when installed, else gzip)
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Outbound HTTP
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+
+# Publish retries
+PUBLISH_MAX_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "30"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "3600"))
+
+# Image processing
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+LINKEDIN_IMAGE_CACHE_DAYS = int(os.getenv("LINKEDIN_IMAGE_CACHE_DAYS", "30"))
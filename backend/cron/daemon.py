@@ -0,0 +1,262 @@
+"""Long-running publisher: sleep until the next scheduled_time, then publish.
+
+Keeps a min-heap of upcoming `scheduled_time`s for scheduled posts and wakes
+exactly at the earliest one. Changes to `post_queue` wake it early, via a
+change stream when MongoDB runs as a replica set, otherwise by polling.
+SIGTERM/SIGINT drain gracefully: the post in flight finishes, nothing new starts.
+
+Alongside, a lookahead loop pre-stages posts due within the next
+PRESTAGE_HORIZON_SECONDS (see cron.prestager), so the work left at the
+slot itself is the create call. With AUTO_SCHEDULE_INTERVAL_SECONDS set it
+also assigns open slots to drafts on that interval.
+
+Run with `python -m cron.daemon`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import os
+import signal
+import sys
+from datetime import datetime, timezone
+
+# Ensure the app root is on sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo.errors import OperationFailure, PyMongoError  # noqa: E402
+
+import config  # noqa: E402
+from src.database import get_db, close_client  # noqa: E402
+from src.http_clients import close_http_clients  # noqa: E402
+from src import scheduler  # noqa: E402
+from src.publishing import new_worker_id  # noqa: E402
+from cron import prestager, publisher  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Timers may fire a hair early; never wake before the deadline itself.
+WAKE_SLACK_SECONDS = 0.05
+
+
+def _as_utc(dt: datetime) -> datetime:
+    """Mongo hands back naive UTC datetimes; make them comparable with now()."""
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def _deadline_of(doc: dict) -> datetime | None:
+    """When a post next needs the publisher's attention, if ever."""
+    if doc.get("status") == "publishing":
+        return doc.get("lease_expires_at")
+    if doc.get("status") != "scheduled" or not doc.get("scheduled_time"):
+        return None
+    if doc.get("next_attempt_at"):
+        return max(_as_utc(doc["scheduled_time"]), _as_utc(doc["next_attempt_at"]))
+    return doc["scheduled_time"]
+
+
+class PublisherDaemon:
+    def __init__(self) -> None:
+        self._heap: list[tuple[datetime, str]] = []
+        self._deadlines: dict[str, datetime] = {}
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._blocked_until: datetime | None = None
+        self._last_resync: datetime | None = None
+        self._worker_id = new_worker_id()
+
+    # --- Heap maintenance ---
+
+    def _track(self, post_id: str, scheduled_time: datetime) -> None:
+        scheduled_time = _as_utc(scheduled_time)
+        if self._deadlines.get(post_id) == scheduled_time:
+            return
+        self._deadlines[post_id] = scheduled_time
+        heapq.heappush(self._heap, (scheduled_time, post_id))
+
+    def _forget(self, post_id: str) -> None:
+        # Heap entries are dropped lazily once they surface at the top.
+        self._deadlines.pop(post_id, None)
+
+    def _next_deadline(self) -> datetime | None:
+        while self._heap:
+            when, post_id = self._heap[0]
+            if self._deadlines.get(post_id) == when:
+                return when
+            heapq.heappop(self._heap)
+        return None
+
+    async def _resync(self) -> None:
+        """Rebuild the heap from the earliest deadlines in Mongo.
+
+        A deadline is a scheduled post's `scheduled_time`, or the lease expiry
+        of a post another worker is publishing (so a crashed claim is retried).
+        """
+        db = get_db()
+        self._heap = []
+        self._deadlines = {}
+        projection = {"status": 1, "scheduled_time": 1, "next_attempt_at": 1, "lease_expires_at": 1}
+        for status, field in (("scheduled", "scheduled_time"), ("publishing", "lease_expires_at")):
+            cursor = (
+                db.post_queue.find({"status": status, field: {"$ne": None}}, projection)
+                .sort(field, 1)
+                .limit(config.PUBLISHER_HEAP_LIMIT)
+            )
+            async for doc in cursor:
+                self._track(str(doc["_id"]), _deadline_of(doc))
+        self._last_resync = datetime.now(timezone.utc)
+
+    def _apply_change(self, change: dict) -> None:
+        post_id = str(change["documentKey"]["_id"])
+        deadline = _deadline_of(change.get("fullDocument") or {})
+        if deadline:
+            self._track(post_id, deadline)
+        else:
+            self._forget(post_id)
+        self._blocked_until = None
+        self._wake.set()
+
+    # --- Change feed ---
+
+    async def _watch(self) -> None:
+        """Feed post_queue changes into the heap; fall back to polling."""
+        db = get_db()
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        try:
+            async with db.post_queue.watch(pipeline, full_document="updateLookup") as stream:
+                logger.info("Watching post_queue change stream")
+                async for change in stream:
+                    self._apply_change(change)
+        except OperationFailure as e:
+            # Standalone servers (the default compose setup) have no change streams.
+            logger.info(f"Change stream unavailable ({e.code}), polling every {config.PUBLISHER_POLL_SECONDS}s")
+        except PyMongoError as e:
+            logger.warning(f"Change stream failed, polling instead: {e}")
+
+        while not self._stopping.is_set():
+            await asyncio.sleep(config.PUBLISHER_POLL_SECONDS)
+            before = self._next_deadline()
+            try:
+                await self._resync()
+            except PyMongoError as e:
+                logger.warning(f"Queue poll failed: {e}")
+                continue
+            if self._next_deadline() != before:
+                self._blocked_until = None
+                self._wake.set()
+
+    # --- Background jobs ---
+
+    async def _every(self, seconds: float, job, name: str) -> None:
+        """Run `job()` every `seconds` until shutdown."""
+        while not self._stopping.is_set():
+            try:
+                await job()
+            except Exception as e:
+                logger.error(f"{name} failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _auto_schedule(self) -> None:
+        scheduled = await scheduler.auto_schedule_drafts(config.AUTO_SCHEDULE_DAYS)
+        if scheduled:
+            logger.info(f"Auto-scheduled {scheduled} drafts")
+
+    # --- Main loop ---
+
+    def _seconds_until_wake(self, now: datetime) -> float:
+        wake_at = self._next_deadline()
+        if wake_at is not None and self._blocked_until is not None:
+            wake_at = max(wake_at, self._blocked_until)
+        delay = config.PUBLISHER_RESYNC_SECONDS
+        if wake_at is not None:
+            delay = min(delay, (wake_at - now).total_seconds() + WAKE_SLACK_SECONDS)
+        return max(delay, 0.0)
+
+    def stop(self) -> None:
+        if not self._stopping.is_set():
+            logger.info("Shutdown requested, draining...")
+            self._stopping.set()
+            self._wake.set()
+
+    async def serve(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+
+        await self._resync()
+        watcher = asyncio.create_task(self._watch())
+        jobs = [
+            asyncio.create_task(
+                self._every(
+                    config.PRESTAGE_INTERVAL_SECONDS,
+                    lambda: prestager.run(stop=self._stopping),
+                    "Pre-staging pass",
+                )
+            )
+        ]
+        if config.AUTO_SCHEDULE_INTERVAL_SECONDS > 0:
+            jobs.append(asyncio.create_task(
+                self._every(config.AUTO_SCHEDULE_INTERVAL_SECONDS, self._auto_schedule, "Auto-scheduling")
+            ))
+        logger.info(f"Publisher daemon {self._worker_id} started, tracking {len(self._deadlines)} posts")
+
+        try:
+            while not self._stopping.is_set():
+                now = datetime.now(timezone.utc)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self._seconds_until_wake(now))
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                if self._stopping.is_set():
+                    break
+
+                now = datetime.now(timezone.utc)
+                if (now - self._last_resync).total_seconds() >= config.PUBLISHER_RESYNC_SECONDS:
+                    await self._resync()
+
+                deadline = self._next_deadline()
+                if deadline is None or deadline > now:
+                    continue
+                if self._blocked_until is not None and self._blocked_until > now:
+                    continue
+
+                try:
+                    await publisher.run(stop=self._stopping, worker_id=self._worker_id)
+                    await self._resync()
+                except PyMongoError as e:
+                    logger.error(f"Publish pass failed: {e}")
+
+                # Still-due posts mean the pass was held back (daily cap, no
+                # tokens, stop requested). Do not spin on them.
+                deadline = self._next_deadline()
+                now = datetime.now(timezone.utc)
+                if deadline is not None and deadline <= now:
+                    self._blocked_until = datetime.fromtimestamp(
+                        now.timestamp() + config.PUBLISHER_BLOCKED_RETRY_SECONDS, tz=timezone.utc
+                    )
+                else:
+                    self._blocked_until = None
+        finally:
+            for task in (watcher, *jobs):
+                task.cancel()
+            await asyncio.gather(watcher, *jobs, return_exceptions=True)
+            logger.info("Publisher daemon stopped")
+
+
+async def main() -> None:
+    try:
+        await PublisherDaemon().serve()
+    finally:
+        await close_http_clients()
+        close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
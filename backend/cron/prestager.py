@@ -0,0 +1,95 @@
+"""Lookahead stage: prepare scheduled posts before their slot fires.
+
+For every scheduled post due within PRESTAGE_HORIZON_SECONDS this checks
+the content, makes sure the LinkedIn token will still be valid at the slot
+(refreshing it now if not), and uploads the image to LinkedIn ahead of time.
+The image URN lands in the content-addressed URN cache, so at slot time the
+publisher only has to create the post.
+
+Problems surface here instead of at the slot: over-long content fails the
+post immediately; an image that will not upload is recorded on the post's
+`error` and retried at the slot.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+import config
+from src import etags, slot_reservations
+from src.database import get_db
+from src.token_store import get_tokens, refresh_if_needed
+from src.publishing import ensure_linkedin_image
+
+logger = logging.getLogger(__name__)
+
+MAX_CONTENT_LENGTH = 3000  # LinkedIn commentary limit, as in PostCreate
+
+
+async def _fail_early(post: dict, error: str) -> None:
+    result = await get_db().post_queue.update_one(
+        {"_id": post["_id"], "status": "scheduled"},
+        {"$set": {"status": "failed", "error": error, "updated_at": datetime.now(timezone.utc)}},
+    )
+    if result.modified_count:
+        await etags.bump("post_queue")
+        await slot_reservations.release(post["_id"])
+
+
+async def _mark_staged(post: dict, error: str | None = None) -> None:
+    now = datetime.now(timezone.utc)
+    fields = {"prestaged_at": now, "updated_at": now}
+    if error is not None:
+        fields["error"] = error
+    result = await get_db().post_queue.update_one({"_id": post["_id"], "status": "scheduled"}, {"$set": fields})
+    if result.modified_count:
+        await etags.bump("post_queue")
+
+
+async def run(stop: asyncio.Event | None = None) -> int:
+    """Pre-stage posts entering the lookahead window. Returns how many."""
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    horizon = now + timedelta(seconds=config.PRESTAGE_HORIZON_SECONDS)
+
+    posts = await db.post_queue.find(
+        {
+            "status": "scheduled",
+            "scheduled_time": {"$gt": now, "$lte": horizon},
+            "prestaged_at": None,
+        },
+        {"content": 1, "scheduled_time": 1, "image_hash": 1, "image_id": 1, "image_size": 1, "image_content_type": 1},
+    ).sort("scheduled_time", 1).to_list(length=None)
+    if not posts:
+        return 0
+
+    tokens = await get_tokens()
+    if not tokens:
+        logger.warning(f"{len(posts)} posts due within the lookahead window but LinkedIn is not connected")
+        return 0
+    latest_slot = max(post["scheduled_time"] for post in posts)
+    if latest_slot.tzinfo is None:
+        latest_slot = latest_slot.replace(tzinfo=timezone.utc)
+    tokens = await refresh_if_needed(tokens, needed_until=latest_slot)
+
+    staged = 0
+    for post in posts:
+        if stop is not None and stop.is_set():
+            break
+        if len(post["content"]) > MAX_CONTENT_LENGTH:
+            await _fail_early(post, f"Content is {len(post['content'])} characters (max {MAX_CONTENT_LENGTH})")
+            continue
+        try:
+            await ensure_linkedin_image(post, tokens["access_token"], tokens["person_urn"])
+        except Exception as e:
+            logger.warning(f"Pre-staging image for post {post['_id']} failed: {e}")
+            await _mark_staged(post, error=f"Image pre-upload failed, will retry at publish time: {e}")
+            continue
+        await _mark_staged(post)
+        staged += 1
+
+    if staged:
+        logger.info(f"Pre-staged {staged} posts")
+    return staged
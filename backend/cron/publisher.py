@@ -1,6 +1,7 @@
-"""Cron script: check queue and publish due posts.
+"""Publish pass: check queue and publish due posts.
 
-Runs every 5 minutes via cron. Also handles proactive token refresh.
+Driven by the long-running daemon in `cron.daemon`; can still be run once
+by hand with `python -m cron.publisher`. Also handles proactive token refresh.
 """
 
 from __future__ import annotations
@@ -15,13 +16,16 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import config  # noqa: E402
 from src.database import get_db, close_client  # noqa: E402
-from src.token_store import get_tokens, update_tokens  # noqa: E402
-from src.linkedin_oauth import refresh_access_token  # noqa: E402
-from src.linkedin_api import (  # noqa: E402
-    publish_text_post,
-    initialize_image_upload,
-    upload_image_binary,
-    publish_image_post,
+from src.http_clients import close_http_clients  # noqa: E402
+from src.token_store import get_tokens, refresh_if_needed  # noqa: E402
+from src.publishing import (  # noqa: E402
+    new_worker_id,
+    claim_next_due,
+    stage_image,
+    create_claimed,
+    defer_claim,
+    recover_stranded,
+    PublishDeferred,
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -30,54 +34,72 @@ logger = logging.getLogger(__name__)
 DAILY_CAP = 10
 
 
-async def _refresh_token_if_needed(tokens: dict) -> dict:
-    """Proactively refresh token if within 7 days of expiry."""
-    from datetime import datetime, timezone, timedelta
-
-    if not tokens.get("expires_at") or not tokens.get("refresh_token"):
-        return tokens
-
-    days_until_expiry = (tokens["expires_at"] - datetime.now(timezone.utc)).days
-    if days_until_expiry <= 7:
-        logger.info(f"Token expires in {days_until_expiry} days, refreshing...")
+async def _run_lane(
+    lane: asyncio.Queue,
+    slots: asyncio.Semaphore,
+    throttle: dict,
+    worker_id: str,
+    access_token: str,
+    person_urn: str,
+) -> int:
+    """Create one account's posts strictly in claim (scheduled_time) order.
+
+    Image staging for later posts is already running while this waits.
+    Once LinkedIn throttles the account, the rest of the lane is handed back
+    untried until the throttle lifts; once a post is deferred for a retry,
+    the rest is handed back until that retry, so nothing overtakes it.
+    """
+    published = 0
+    held_until = None
+    while True:
+        item = await lane.get()
+        if item is None:
+            return published
+        post, staging = item
+        post_id = post["_id"]
         try:
-            new_data = await refresh_access_token(tokens["refresh_token"])
-            await update_tokens(
-                tokens["person_urn"],
-                new_data["access_token"],
-                new_data.get("refresh_token"),
-                new_data.get("expires_in", 5184000),
-            )
-            tokens["access_token"] = new_data["access_token"]
-            logger.info("Token refreshed successfully")
+            image_urn = await staging
+            if throttle.get("until"):
+                await defer_claim(
+                    post, worker_id, throttle["until"], "Deferred: LinkedIn is throttling", refund_attempt=True
+                )
+                continue
+            if held_until is not None:
+                await defer_claim(
+                    post, worker_id, held_until, "Deferred: waiting for an earlier post's retry", refund_attempt=True
+                )
+                continue
+            result = await create_claimed(post, worker_id, access_token, person_urn, image_urn)
+            published += 1
+            logger.info(f"Published post {post_id} -> {result.get('post_id')}")
+        except PublishDeferred as e:
+            if e.throttled:
+                throttle["until"] = max(throttle.get("until") or e.retry_at, e.retry_at)
+            held_until = max(held_until or e.retry_at, e.retry_at)
+            logger.warning(f"Deferred post {post_id}: {e}")
         except Exception as e:
-            logger.error(f"Token refresh failed: {e}")
-
-    return tokens
-
+            logger.error(f"Failed to publish post {post_id}: {e}")
+        finally:
+            slots.release()
 
-async def _publish_post(post: dict, access_token: str, person_urn: str) -> dict:
-    """Publish a single post and return the result."""
-    if post.get("image_data"):
-        init = await initialize_image_upload(access_token, person_urn)
-        await upload_image_binary(
-            init["upload_url"],
-            access_token,
-            post["image_data"],
-            post.get("image_content_type", "image/jpeg"),
-        )
-        return await publish_image_post(
-            access_token, person_urn, post["content"], init["image_urn"]
-        )
-    else:
-        return await publish_text_post(access_token, person_urn, post["content"])
 
+async def run(stop: asyncio.Event | None = None, worker_id: str | None = None) -> int:
+    """Publish every due post once. Returns the number published.
 
-async def run():
+    Posts are claimed one at a time under a lease, so several passes (or
+    replicas) can run concurrently without double-publishing. Up to
+    PUBLISH_CONCURRENCY claimed posts are in flight at once: image uploads
+    overlap freely, while each account's create calls go out in order.
+    If `stop` is set mid-pass, posts in flight finish and no new ones start;
+    a 429 from LinkedIn likewise ends the pass early.
+    """
     from datetime import datetime, timezone
 
     db = get_db()
     now = datetime.now(timezone.utc)
+    worker_id = worker_id or new_worker_id()
+
+    await recover_stranded()
 
     # Check daily cap
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -87,69 +109,70 @@ async def run():
     })
     if published_today >= DAILY_CAP:
         logger.info(f"Daily cap reached ({published_today}/{DAILY_CAP}), skipping")
-        return
+        return 0
 
     # Get LinkedIn tokens
     tokens = await get_tokens()
     if not tokens:
         logger.warning("No LinkedIn tokens found, skipping")
-        return
+        return 0
 
-    tokens = await _refresh_token_if_needed(tokens)
+    tokens = await refresh_if_needed(tokens)
     access_token = tokens["access_token"]
     person_urn = tokens["person_urn"]
 
-    # Find due posts
-    due_posts = db.post_queue.find({
-        "status": "scheduled",
-        "scheduled_time": {"$lte": now},
-    }).sort("scheduled_time", 1).limit(DAILY_CAP - published_today)
-
-    published = 0
-    async for post in due_posts:
-        post_id = post["_id"]
-        logger.info(f"Publishing post {post_id}...")
-
-        # Mark as publishing
-        await db.post_queue.update_one(
-            {"_id": post_id},
-            {"$set": {"status": "publishing", "updated_at": now}},
-        )
-
-        try:
-            result = await _publish_post(post, access_token, person_urn)
-            await db.post_queue.update_one(
-                {"_id": post_id},
-                {
-                    "$set": {
-                        "status": "published",
-                        "linkedin_post_id": result.get("post_id"),
-                        "published_at": datetime.now(timezone.utc),
-                        "error": None,
-                        "updated_at": datetime.now(timezone.utc),
-                    },
-                    "$unset": {"image_data": ""},
-                },
-            )
-            published += 1
-            logger.info(f"Published post {post_id} -> {result.get('post_id')}")
-
-        except Exception as e:
-            logger.error(f"Failed to publish post {post_id}: {e}")
-            await db.post_queue.update_one(
-                {"_id": post_id},
-                {
-                    "$set": {
-                        "status": "failed",
-                        "error": str(e),
-                        "updated_at": datetime.now(timezone.utc),
-                    }
-                },
-            )
-
-    logger.info(f"Cron complete: {published} posts published")
+    # Bounds claimed-but-unfinished posts, so leases are not taken out
+    # faster than they can be worked off.
+    slots = asyncio.Semaphore(config.PUBLISH_CONCURRENCY)
+    # One lane per LinkedIn account keeps that account's posts in order.
+    lanes: dict[str, tuple[asyncio.Queue, asyncio.Task]] = {}
+    throttle: dict = {}
+    claimed = 0
+
+    try:
+        while published_today + claimed < DAILY_CAP:
+            await slots.acquire()
+            if stop is not None and stop.is_set():
+                slots.release()
+                logger.info("Stop requested, leaving remaining posts for the next pass")
+                break
+            if throttle.get("until"):
+                slots.release()
+                logger.warning(f"LinkedIn is throttling until {throttle['until'].isoformat()}, ending pass")
+                break
+
+            post = await claim_next_due(worker_id)
+            if post is None:
+                slots.release()
+                break
+            claimed += 1
+            logger.info(f"Publishing post {post['_id']} as {worker_id}...")
+
+            if person_urn not in lanes:
+                lane: asyncio.Queue = asyncio.Queue()
+                task = asyncio.create_task(
+                    _run_lane(lane, slots, throttle, worker_id, access_token, person_urn)
+                )
+                lanes[person_urn] = (lane, task)
+            staging = asyncio.create_task(stage_image(post, worker_id, access_token, person_urn))
+            lanes[person_urn][0].put_nowait((post, staging))
+    finally:
+        for lane, _ in lanes.values():
+            lane.put_nowait(None)
+        results = await asyncio.gather(*(task for _, task in lanes.values()))
+
+    published = sum(results)
+    logger.info(f"Publish pass complete: {published} posts published")
+    return published
+
+
+async def main() -> None:
+    try:
+        await run()
+    finally:
+        await close_http_clients()
+        close_client()
 
 
 if __name__ == "__main__":
-    asyncio.run(run())
-    close_client()
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""Background AI generation: submit jobs, then poll them for the result.
+
+Unlike /api/generate, the work happens in src.ai_jobs' worker pool, so the
+request returns at once and the result survives a closed tab.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+
+from bson import ObjectId
+from fastapi import APIRouter, Request, HTTPException
+
+from routers.auth import require_auth
+from src import ai_jobs
+from src.schemas import GenerateBatchRequest, GenerateRequest, ImproveRequest
+from src.serialization import JSONResponse
+
+router = APIRouter(prefix="/api/generate/jobs", tags=["generate"])
+
+
+def _object_id(value: str, what: str) -> ObjectId:
+    if not ObjectId.is_valid(value):
+        raise HTTPException(status_code=404, detail=f"{what} not found")
+    return ObjectId(value)
+
+
+def _job_out(job: dict) -> dict:
+    return {field: job.get(field) for field in ("_id", *ai_jobs.JOB_PROJECTION)}
+
+
+@router.post("", status_code=202)
+async def submit_generate(request: Request, body: GenerateRequest):
+    """Queue a generation. The job's result is {"variants": [...]}."""
+    require_auth(request)
+    job = await ai_jobs.submit("generate", body.model_dump(mode="json"))
+    return JSONResponse(_job_out(job), status_code=202)
+
+
+@router.post("/improve", status_code=202)
+async def submit_improve(request: Request, body: ImproveRequest):
+    """Queue an improvement. The job's result is {"improved": ...}."""
+    require_auth(request)
+    job = await ai_jobs.submit("improve", body.model_dump(mode="json"))
+    return JSONResponse(_job_out(job), status_code=202)
+
+
+@router.post("/batch", status_code=202)
+async def submit_batch(request: Request, body: GenerateBatchRequest):
+    """Queue one generation per topic, e.g. a week of drafts.
+
+    With `save_draft` each finished job adds its first variant to the queue
+    as a draft and reports it as `post_id` in its result.
+    """
+    require_auth(request)
+    topics = [t.strip() for t in body.topics if t.strip()]
+    if not topics:
+        raise HTTPException(status_code=400, detail="No topics given")
+    shared = body.model_dump(mode="json", exclude={"topics"})
+    batch_id, jobs = await ai_jobs.submit_batch("generate", [{"topic": t, **shared} for t in topics])
+    return JSONResponse({"batch_id": batch_id, "jobs": [_job_out(j) for j in jobs]}, status_code=202)
+
+
+@router.get("/batches/{batch_id}")
+async def get_batch(request: Request, batch_id: str):
+    """Every job of a batch, with a count per status."""
+    require_auth(request)
+    jobs = await ai_jobs.get_batch(_object_id(batch_id, "Batch"))
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    counts = Counter(job["status"] for job in jobs)
+    return JSONResponse({"batch_id": batch_id, "counts": counts, "jobs": jobs})
+
+
+@router.get("/{job_id}")
+async def get_job(request: Request, job_id: str):
+    """The job, with `result` once its status is `done` (or `error` if `failed`)."""
+    require_auth(request)
+    job = await ai_jobs.get_job(_object_id(job_id, "Job"))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(job)
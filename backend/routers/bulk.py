@@ -0,0 +1,219 @@
+"""Bulk post operations and streaming NDJSON/CSV import.
+
+Each request is handled in a fixed number of database round trips (see
+src.post_ops) and answers with one result per input row, in input order.
+"""
+
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import json
+import logging
+import tempfile
+from typing import AsyncIterator
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import UploadFile
+from pydantic import ValidationError
+
+from routers.auth import require_auth
+from src import post_ops
+from src.schemas import PostBulkCreate, PostBulkIds, PostBulkStatus, PostBulkUpdate, PostCreate
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/posts", tags=["posts"])
+
+IMPORT_BATCH_SIZE = 500
+MAX_ROW_BYTES = 64 * 1024
+# Uploads larger than this are spooled to a temporary file
+SPOOL_BYTES = 1024 * 1024
+CHUNK_BYTES = 64 * 1024
+MAX_IMPORT_BYTES = 50 * 1024 * 1024
+_TOO_LARGE = f"Import too large (max {MAX_IMPORT_BYTES // (1024 * 1024)} MB)"
+
+
+def _object_ids(ids: list[str]) -> list[ObjectId]:
+    try:
+        return [ObjectId(i) for i in ids]
+    except InvalidId as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/bulk")
+async def bulk_create(request: Request, body: PostBulkCreate):
+    require_auth(request)
+    return {"results": await post_ops.create_posts(body.posts)}
+
+
+@router.patch("/bulk")
+async def bulk_update(request: Request, body: PostBulkUpdate):
+    require_auth(request)
+    ids = _object_ids([item.id for item in body.updates])
+    changes = [(post_id, post_ops.changed_fields(item)) for post_id, item in zip(ids, body.updates)]
+    return {"results": await post_ops.update_posts(changes)}
+
+
+@router.post("/bulk/delete")
+async def bulk_delete(request: Request, body: PostBulkIds):
+    require_auth(request)
+    return {"results": await post_ops.delete_posts(_object_ids(body.ids))}
+
+
+@router.post("/bulk/status")
+async def bulk_status(request: Request, body: PostBulkStatus):
+    require_auth(request)
+    changes = [(post_id, {"status": body.status.value}) for post_id in _object_ids(body.ids)]
+    return {"results": await post_ops.update_posts(changes)}
+
+
+# --- Import ---
+
+async def _read_chunks(upload: UploadFile) -> AsyncIterator[bytes]:
+    try:
+        while chunk := await upload.read(CHUNK_BYTES):
+            yield chunk
+    finally:
+        await upload.close()
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a UTF-8 byte stream into lines without holding more than one."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+        if len(pending) > MAX_ROW_BYTES:
+            raise ValueError("Row too long")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def _ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict | str]:
+    """Yield each row as a dict, or an error message for a bad row."""
+    async for line in _lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield f"Invalid JSON: {e.msg}"
+            continue
+        yield row if isinstance(row, dict) else "Row is not a JSON object"
+
+
+async def _csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict | str]:
+    """Like _ndjson_rows for CSV with a header row. Quoted fields may span lines."""
+    header = None
+    record = ""
+    async for line in _lines(chunks):
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            if len(record) > MAX_ROW_BYTES:
+                raise ValueError("Row too long")
+            continue  # inside a quoted field
+        fields, record = next(csv.reader(io.StringIO(record)), []), ""
+        if header is None:
+            header = [name.strip() for name in fields]
+            continue
+        if not any(fields):
+            continue
+        yield {name: value for name, value in zip(header, fields) if value != ""}
+    if record:
+        yield "Unterminated quoted field"
+
+
+def _to_post(row: dict) -> PostCreate:
+    if row.get("scheduled_time") and "status" not in row:
+        row = {**row, "status": "scheduled"}
+    return PostCreate(**row)
+
+
+async def _import(rows: AsyncIterator[dict | str]) -> AsyncIterator[bytes]:
+    created = failed = 0
+    row_no = 0
+    batch: list[tuple[int, PostCreate | str]] = []
+
+    async def flush() -> AsyncIterator[bytes]:
+        nonlocal created, failed
+        valid = [item for _, item in batch if not isinstance(item, str)]
+        try:
+            results = iter(await post_ops.create_posts(valid))
+        except Exception as e:
+            # The response has started; report the batch instead of breaking it off
+            logger.exception(f"Import of rows {batch[0][0]}-{batch[-1][0]} failed")
+            error = f"Could not save this batch: {str(e) or type(e).__name__}"
+            results = iter([{"ok": False, "error": error}] * len(valid))
+        for n, item in batch:
+            result = {"ok": False, "error": item} if isinstance(item, str) else next(results)
+            created += result["ok"]
+            failed += not result["ok"]
+            yield (json.dumps({"row": n, **result}) + "\n").encode()
+        batch.clear()
+
+    aborted = None
+    try:
+        async for row in rows:
+            row_no += 1
+            if isinstance(row, str):
+                batch.append((row_no, row))
+            else:
+                try:
+                    batch.append((row_no, _to_post(row)))
+                except ValidationError as e:
+                    error = e.errors()[0]
+                    batch.append((row_no, f"{'.'.join(map(str, error['loc']))}: {error['msg']}"))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                async for line in flush():
+                    yield line
+    except ValueError as e:
+        # Unparseable input: keep what was read so far, report where it stopped
+        aborted = f"Row {row_no + 1}: {e}"
+    async for line in flush():
+        yield line
+    logger.info(f"Imported {created} posts, {failed} rows failed")
+    summary = {"done": True, "created": created, "failed": failed}
+    if aborted:
+        summary["error"] = aborted
+    yield (json.dumps(summary) + "\n").encode()
+
+
+@router.post("/import")
+async def import_posts(request: Request, format: str | None = Query(None, pattern="^(ndjson|csv)$")):
+    """Import posts from NDJSON or CSV (`content`, optional `scheduled_time`,
+    `status`, `post_type`), streamed in and processed in batches.
+
+    The response is NDJSON: one `{"row": n, "ok": ...}` line per input row,
+    then a `{"done": true, ...}` summary. Bodies over MAX_IMPORT_BYTES get a
+    413, whether or not they declare their length.
+    """
+    require_auth(request)
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > MAX_IMPORT_BYTES:
+        raise HTTPException(status_code=413, detail=_TOO_LARGE)
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+    parse = _csv_rows if format == "csv" else _ndjson_rows
+    # The body is read before the response starts: a StreamingResponse listens
+    # for client disconnects on the same receive channel the body arrives on.
+    # UploadFile moves file I/O to a thread once the spool has rolled over to disk
+    upload = UploadFile(tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES))
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_IMPORT_BYTES:
+            await upload.close()
+            raise HTTPException(status_code=413, detail=_TOO_LARGE)
+        await upload.write(chunk)
+    await upload.seek(0)
+    return StreamingResponse(_import(parse(_read_chunks(upload))), media_type="application/x-ndjson")
@@ -0,0 +1,57 @@
+"""Server-sent events: post changes pushed as they happen."""
+
+from __future__ import annotations
+
+import asyncio
+
+from fastapi import APIRouter, Header, Request
+from fastapi.responses import StreamingResponse
+
+import config
+from routers.auth import require_auth
+from src.post_events import hub
+from src.serialization import dumps, post_out
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+# How soon browsers reconnect after the stream drops
+RECONNECT_MS = 3000
+
+
+def _format(event_id: str, event: dict) -> str:
+    if event["type"] == "post":
+        event = {**event, "post": post_out(event["post"])}
+    return f"id: {event_id}\ndata: {dumps(event).decode()}\n\n"
+
+
+@router.get("/posts")
+async def post_events(request: Request, last_event_id: str | None = Header(None)):
+    """Stream post changes (created, edited, published, failed, deleted).
+
+    Browsers reconnect on their own and send `Last-Event-ID`, which replays
+    what was missed; a `resync` event means reload instead.
+    """
+    require_auth(request)
+    sub = hub.subscribe(last_event_id)
+
+    async def stream():
+        try:
+            yield f"retry: {RECONNECT_MS}\n\n"
+            while True:
+                try:
+                    event_id, event = await asyncio.wait_for(
+                        sub.queue.get(), timeout=config.POST_EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ": ping\n\n"
+                    continue
+                yield _format(event_id, event)
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,14 +1,23 @@
-"""AI content generation endpoints."""
+"""AI content generation endpoints.
+
+The /stream variants send server-sent events as the model writes (see
+src.ai_generator.stream_posts), so the first words show up in about a
+second instead of after the whole generation.
+"""
 
 from __future__ import annotations
 
 import logging
+from typing import AsyncIterator
 
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import StreamingResponse
 
 from routers.auth import require_auth
+from src import ai_cache, ai_providers
 from src.schemas import GenerateRequest, ImproveRequest
-from src.ai_generator import generate_posts, improve_post
+from src.ai_generator import generate_posts, improve_post, stream_improved, stream_posts
+from src.serialization import dumps
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +33,8 @@ async def generate(request: Request, body: GenerateRequest):
             tone=body.tone.value,
             post_type=body.post_type.value,
             additional_context=body.additional_context,
+            count=body.variants,
+            use_cache=not body.no_cache,
         )
         return {"variants": variants}
     except Exception as e:
@@ -38,8 +49,62 @@ async def improve(request: Request, body: ImproveRequest):
         improved = await improve_post(
             content=body.content,
             instructions=body.instructions,
+            use_cache=not body.no_cache,
         )
         return {"improved": improved}
     except Exception as e:
         logger.error(f"AI improve failed: {e}")
         raise HTTPException(status_code=500, detail=f"Improve failed: {e}")
+
+
+def _event_stream(events: AsyncIterator[dict], action: str) -> StreamingResponse:
+    async def stream():
+        try:
+            async for event in events:
+                yield f"data: {dumps(event).decode()}\n\n"
+        except Exception as e:
+            # Headers are already sent, so failures are reported in-band
+            logger.error(f"AI {action} stream failed: {e}")
+            yield f"data: {dumps({'type': 'error', 'detail': f'{action.capitalize()} failed: {e}'}).decode()}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/stream")
+async def generate_stream(request: Request, body: GenerateRequest):
+    """`delta`, `variant` and `done` events; see stream_posts."""
+    require_auth(request)
+    events = stream_posts(
+        topic=body.topic,
+        tone=body.tone.value,
+        post_type=body.post_type.value,
+        additional_context=body.additional_context,
+        count=body.variants,
+        use_cache=not body.no_cache,
+    )
+    return _event_stream(events, "generation")
+
+
+@router.post("/improve/stream")
+async def improve_stream(request: Request, body: ImproveRequest):
+    require_auth(request)
+    events = stream_improved(content=body.content, instructions=body.instructions, use_cache=not body.no_cache)
+    return _event_stream(events, "improve")
+
+
+@router.get("/cache")
+async def cache_stats(request: Request):
+    """Hit, miss, coalesced and bypassed counts for this process."""
+    require_auth(request)
+    return ai_cache.stats()
+
+
+@router.get("/providers")
+async def provider_stats(request: Request):
+    """Calls, errors, timeouts, failovers, hedges and p95 latency per provider, for this process."""
+    require_auth(request)
+    return ai_providers.stats()
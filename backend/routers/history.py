@@ -2,43 +2,44 @@
 
 from __future__ import annotations
 
-from bson import Binary
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 
 from routers.auth import require_auth
+from src import etags, pagination
 from src.database import get_db
+from src.serialization import JSONResponse, POST_PROJECTION, post_out
 
 router = APIRouter(prefix="/api/history", tags=["history"])
 
 
-def _serialize(doc: dict) -> dict:
-    doc["_id"] = str(doc["_id"])
-    if isinstance(doc.get("image_data"), (bytes, Binary)):
-        doc["has_image"] = True
-        del doc["image_data"]
-    else:
-        doc["has_image"] = bool(doc.get("image_urn"))
-    for field in ("scheduled_time", "published_at", "created_at", "updated_at"):
-        if doc.get(field):
-            doc[field] = doc[field].isoformat()
-    return doc
+HISTORY_QUERY = {"status": {"$in": ["published", "failed"]}}
 
 
 @router.get("")
-async def list_history(request: Request, skip: int = 0, limit: int = 50):
+async def list_history(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    total: bool = False,
+):
+    """Newest first. Pass `next_cursor` back as `cursor` for the next page.
+
+    `total=true` adds the overall count, which costs an extra query.
+    """
     require_auth(request)
+    etag = etags.make_etag(request, *await etags.collection_version("post_queue"))
+    if cached := etags.not_modified(request, etag):
+        return cached
+    etags.set_etag(response, etag)
     db = get_db()
-    cursor = (
-        db.post_queue.find(
-            {"status": {"$in": ["published", "failed"]}},
-            {"image_data": 0},
+    try:
+        docs, next_cursor = await pagination.page(
+            db.post_queue, HISTORY_QUERY, "published_at", -1, limit, cursor, POST_PROJECTION
         )
-        .sort("published_at", -1)
-        .skip(skip)
-        .limit(limit)
-    )
-    posts = [_serialize(doc) async for doc in cursor]
-    total = await db.post_queue.count_documents(
-        {"status": {"$in": ["published", "failed"]}}
-    )
-    return {"posts": posts, "total": total}
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = {"posts": [post_out(doc) for doc in docs], "next_cursor": next_cursor}
+    if total:
+        result["total"] = await db.post_queue.count_documents(HISTORY_QUERY)
+    return JSONResponse(result, headers=dict(response.headers))
@@ -1,171 +1,323 @@
-"""Post queue CRUD, image upload, publish-now, and reorder."""
+"""Post queue CRUD, image upload (direct or resumable), publish-now, reorder and move."""
 
 from __future__ import annotations
 
 import logging
 from datetime import datetime, timezone
+from typing import AsyncIterator
 
-from bson import ObjectId, Binary
-from fastapi import APIRouter, Request, HTTPException, UploadFile, File
+from bson import ObjectId
+from pymongo import ReturnDocument
+from fastapi import APIRouter, Request, Response, HTTPException, Header, Query
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.requests import ClientDisconnect
 
 from routers.auth import require_auth
 from src.database import get_db
-from src.schemas import PostCreate, PostUpdate, PostReorder
+from src import etags, image_store, image_processing, pagination, post_ops, queue_order, slot_reservations, upload_sessions
+from src.schemas import PostStatus, PostCreate, PostUpdate, PostReorder, PostMove, ImageUploadCreate
+from src.serialization import JSONResponse, POST_PROJECTION, post_out
 from src.token_store import get_tokens
-from src.linkedin_api import (
-    publish_text_post,
-    initialize_image_upload,
-    upload_image_binary,
-    publish_image_post,
-)
+from src.publishing import new_worker_id, claim_post, publish_claimed, PublishDeferred
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/posts", tags=["posts"])
 
-
-def _serialize(doc: dict) -> dict:
-    doc["_id"] = str(doc["_id"])
-    if isinstance(doc.get("image_data"), (bytes, Binary)):
-        doc["has_image"] = True
-        del doc["image_data"]
-    else:
-        doc["has_image"] = bool(doc.get("image_urn"))
-    if doc.get("scheduled_time"):
-        doc["scheduled_time"] = doc["scheduled_time"].isoformat()
-    if doc.get("published_at"):
-        doc["published_at"] = doc["published_at"].isoformat()
-    if doc.get("created_at"):
-        doc["created_at"] = doc["created_at"].isoformat()
-    if doc.get("updated_at"):
-        doc["updated_at"] = doc["updated_at"].isoformat()
-    return doc
+# Lease owner id for publish-now claims made by this API process
+_worker_id = new_worker_id()
 
 
 @router.get("/queue")
-async def list_queue(request: Request):
+async def list_queue(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = None,
+    status: PostStatus | None = None,
+    total: bool = False,
+):
+    """Drafts and scheduled posts in queue order, a page at a time.
+
+    Pass `next_cursor` back as `cursor` for the next page; `status` narrows
+    to drafts or scheduled posts; `total=true` adds the count.
+    """
     require_auth(request)
+    etag = etags.make_etag(request, *await etags.collection_version("post_queue"))
+    if cached := etags.not_modified(request, etag):
+        return cached
+    etags.set_etag(response, etag)
     db = get_db()
-    cursor = db.post_queue.find(
-        {"status": {"$in": ["draft", "scheduled"]}},
-        {"image_data": 0},
-    ).sort("queue_order", 1)
-    posts = [_serialize(doc) async for doc in cursor]
-    return {"posts": posts}
+    query = {"status": status.value if status else {"$in": queue_order.QUEUED}}
+    try:
+        docs, next_cursor = await pagination.page(
+            db.post_queue, query, "queue_order", 1, limit, cursor, POST_PROJECTION
+        )
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = {"posts": [post_out(doc) for doc in docs], "next_cursor": next_cursor}
+    if total:
+        result["total"] = await db.post_queue.count_documents(query)
+    return JSONResponse(result, headers=dict(response.headers))
+
+
+@router.get("/{post_id}")
+async def get_post(request: Request, post_id: str):
+    require_auth(request)
+    doc = await get_db().post_queue.find_one({"_id": ObjectId(post_id)}, POST_PROJECTION)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return JSONResponse(post_out(doc))
 
 
 @router.post("")
 async def create_post(request: Request, body: PostCreate):
     require_auth(request)
-    db = get_db()
-    now = datetime.now(timezone.utc)
-
-    # Get max queue_order
-    last = await db.post_queue.find_one(
-        {"status": {"$in": ["draft", "scheduled"]}},
-        sort=[("queue_order", -1)],
-    )
-    next_order = (last.get("queue_order", 0) + 1) if last else 1
-
-    doc = {
-        "content": body.content,
-        "post_type": body.post_type.value,
-        "status": body.status.value,
-        "scheduled_time": body.scheduled_time,
-        "queue_order": next_order,
-        "image_urn": None,
-        "linkedin_post_id": None,
-        "error": None,
-        "created_at": now,
-        "updated_at": now,
-    }
-    result = await db.post_queue.insert_one(doc)
-    doc["_id"] = result.inserted_id
-    return _serialize(doc)
+    [result] = await post_ops.create_posts([body])
+    if not result["ok"]:
+        raise HTTPException(status_code=409, detail=result["error"])
+    doc = await get_db().post_queue.find_one({"_id": ObjectId(result["_id"])}, POST_PROJECTION)
+    return JSONResponse(post_out(doc))
 
 
 @router.put("/reorder")
 async def reorder_queue(request: Request, body: PostReorder):
+    """Set the order of the whole queue. Prefer POST /{post_id}/move for a single move."""
     require_auth(request)
-    db = get_db()
-    for i, pid in enumerate(body.post_ids):
-        await db.post_queue.update_one(
-            {"_id": ObjectId(pid)},
-            {"$set": {"queue_order": i + 1, "updated_at": datetime.now(timezone.utc)}},
-        )
+    await queue_order.renumber([ObjectId(pid) for pid in body.post_ids])
     return {"ok": True}
 
 
+@router.post("/{post_id}/move")
+async def move_post(request: Request, post_id: str, body: PostMove):
+    """Place a post between two neighbours, rewriting only that post."""
+    require_auth(request)
+    try:
+        rank = await queue_order.move(
+            ObjectId(post_id),
+            ObjectId(body.after) if body.after else None,
+            ObjectId(body.before) if body.before else None,
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except queue_order.NotAdjacent as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"ok": True, "queue_order": rank}
+
+
 @router.put("/{post_id}")
 async def update_post(request: Request, post_id: str, body: PostUpdate):
     require_auth(request)
-    db = get_db()
 
-    update_fields = body.model_dump(exclude_none=True)
+    update_fields = post_ops.changed_fields(body)
     if not update_fields:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    # Convert enum values
-    if "post_type" in update_fields:
-        update_fields["post_type"] = update_fields["post_type"].value
-    if "status" in update_fields:
-        update_fields["status"] = update_fields["status"].value
+    [result] = await post_ops.update_posts([(ObjectId(post_id), update_fields)])
+    if not result["ok"]:
+        status_code = 404 if result["error"] == post_ops.NOT_FOUND else 409
+        raise HTTPException(status_code=status_code, detail=result["error"])
 
-    update_fields["updated_at"] = datetime.now(timezone.utc)
-
-    result = await db.post_queue.update_one(
-        {"_id": ObjectId(post_id)},
-        {"$set": update_fields},
-    )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    doc = await db.post_queue.find_one({"_id": ObjectId(post_id)}, {"image_data": 0})
-    return _serialize(doc)
+    doc = await get_db().post_queue.find_one({"_id": ObjectId(post_id)}, POST_PROJECTION)
+    return JSONResponse(post_out(doc))
 
 
 @router.delete("/{post_id}")
 async def delete_post(request: Request, post_id: str):
     require_auth(request)
-    db = get_db()
-    result = await db.post_queue.delete_one({"_id": ObjectId(post_id)})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Post not found")
+    [result] = await post_ops.delete_posts([ObjectId(post_id)])
+    if not result["ok"]:
+        raise HTTPException(status_code=404, detail=result["error"])
     return {"ok": True}
 
 
-@router.post("/{post_id}/image")
-async def upload_image(request: Request, post_id: str, file: UploadFile = File(...)):
-    require_auth(request)
-    db = get_db()
+async def _attach_image(
+    post_id: str, upload_id: ObjectId, digest: str, size: int, content_type: str
+) -> None:
+    """Optimize a finished upload and point the post at it.
 
-    post = await db.post_queue.find_one({"_id": ObjectId(post_id)})
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+    The result is stored content-addressed, so identical images share one
+    copy. The image the post had before is released.
+    """
+    db = get_db()
 
-    image_data = await file.read()
-    if len(image_data) > 10 * 1024 * 1024:  # 10 MB limit
-        raise HTTPException(status_code=400, detail="Image too large (max 10 MB)")
+    raw = b"".join([chunk async for chunk in image_store.stream_image(upload_id)])
+    try:
+        data, content_type = await image_processing.optimize_image(raw, content_type)
+    except image_processing.InvalidImage as e:
+        await image_store.delete_image(upload_id)
+        raise HTTPException(status_code=400, detail=str(e))
+    if data != raw:
+        logger.info(f"Optimized image for post {post_id}: {len(raw)} -> {len(data)} bytes")
+        await image_store.delete_image(upload_id)
+        fields = await image_store.store_image(data, content_type)
+    else:
+        fields = await image_store.adopt_file(upload_id, digest, size, content_type)
 
-    await db.post_queue.update_one(
+    previous = await db.post_queue.find_one_and_update(
         {"_id": ObjectId(post_id)},
         {
             "$set": {
-                "image_data": Binary(image_data),
-                "image_content_type": file.content_type,
+                **fields,
                 "post_type": "image",
                 "updated_at": datetime.now(timezone.utc),
-            }
+            },
+            "$unset": {"prestaged_at": ""},
         },
+        projection={"image_id": 1, "image_hash": 1},
+        return_document=ReturnDocument.BEFORE,
     )
+    if previous is None:
+        # Deleted while we were uploading
+        await image_store.release_image(fields["image_hash"])
+        raise HTTPException(status_code=404, detail="Post not found")
+    await etags.bump("post_queue")
+    await image_store.release_post_image(previous)
+
+
+# Room for the multipart boundaries and part headers around the image
+_MULTIPART_OVERHEAD = 64 * 1024
+_TOO_LARGE = f"Image too large (max {image_store.MAX_IMAGE_BYTES // (1024 * 1024)} MB)"
+
+
+class _BodyTooLarge(MultiPartException):
+    pass
+
+
+async def _limited(stream: AsyncIterator[bytes], limit: int) -> AsyncIterator[bytes]:
+    """`stream`, aborting as soon as more than `limit` bytes have arrived."""
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > limit:
+            raise _BodyTooLarge(_TOO_LARGE)
+        yield chunk
+
+
+@router.post("/{post_id}/image")
+async def upload_image(request: Request, post_id: str):
+    """Multipart upload of a whole image in field `file`.
+
+    The form is parsed here rather than by a `File()` parameter so that
+    unauthenticated or oversized requests are refused before the body is read.
+    The body must declare its Content-Length, and is cut off with a 413 as
+    soon as it exceeds the limit, whatever it declared.
+    """
+    require_auth(request)
+    db = get_db()
+
+    limit = image_store.MAX_IMAGE_BYTES + _MULTIPART_OVERHEAD
+    declared = request.headers.get("content-length")
+    if declared is None or not declared.isdigit():
+        raise HTTPException(status_code=411, detail="Content-Length required")
+    if int(declared) > limit:
+        raise HTTPException(status_code=413, detail=_TOO_LARGE)
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=400, detail="No file uploaded")
+
+    post = await db.post_queue.find_one({"_id": ObjectId(post_id)}, {"_id": 1})
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    parser = MultiPartParser(request.headers, _limited(request.stream(), limit), max_files=1, max_fields=1)
+    try:
+        form = await parser.parse()
+    except _BodyTooLarge as e:
+        raise HTTPException(status_code=413, detail=e.message)
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    file = form.get("file")
+    if not isinstance(file, UploadFile):
+        await form.close()
+        raise HTTPException(status_code=400, detail="No file uploaded")
+
+    writer = image_store.ImageWriter()
+    try:
+        while chunk := await file.read(image_store.CHUNK_SIZE):
+            await writer.write(chunk)
+    except image_store.ImageTooLarge as e:
+        await writer.abort()
+        raise HTTPException(status_code=413, detail=str(e))
+    finally:
+        await form.close()
+
+    content_type = file.content_type or "image/jpeg"
+    digest = await writer.finish(content_type, filename=post_id)
+    await _attach_image(post_id, writer.file_id, digest, writer.offset, content_type)
     return {"ok": True, "has_image": True}
 
 
+def _session_response(session: dict) -> dict:
+    return {
+        "upload_id": str(session["_id"]),
+        "offset": session["offset"],
+        "size": session["size"],
+        "complete": session["offset"] == session["size"],
+    }
+
+
+@router.post("/{post_id}/image/uploads")
+async def create_image_upload(request: Request, post_id: str, body: ImageUploadCreate):
+    """Start a resumable upload; send the bytes with PATCH to the returned id."""
+    require_auth(request)
+    db = get_db()
+    if not await db.post_queue.find_one({"_id": ObjectId(post_id)}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Post not found")
+    session = await upload_sessions.create_session(ObjectId(post_id), body.size, body.content_type)
+    return _session_response(session)
+
+
+@router.get("/{post_id}/image/uploads/{upload_id}")
+async def get_image_upload(request: Request, post_id: str, upload_id: str):
+    """Report how many bytes were stored, i.e. where to resume from."""
+    require_auth(request)
+    session = await upload_sessions.get_session(ObjectId(post_id), ObjectId(upload_id))
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return _session_response(session)
+
+
+@router.patch("/{post_id}/image/uploads/{upload_id}")
+async def append_image_upload(
+    request: Request,
+    post_id: str,
+    upload_id: str,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+):
+    """Append the raw request body at `Upload-Offset`, streaming it to storage.
+
+    The image is attached to the post once the declared size is reached.
+    """
+    require_auth(request)
+    session = await upload_sessions.get_session(ObjectId(post_id), ObjectId(upload_id))
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    try:
+        session, writer = await upload_sessions.append(session, upload_offset, request.stream())
+    except upload_sessions.SessionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except image_store.ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ClientDisconnect:
+        # Received bytes are kept; the client resumes from GET's offset
+        return _session_response(await upload_sessions.get_session(ObjectId(post_id), ObjectId(upload_id)))
+
+    if writer is not None:
+        digest = await writer.finish(session["content_type"], filename=post_id)
+        await upload_sessions.close_session(session)
+        await _attach_image(post_id, writer.file_id, digest, writer.offset, session["content_type"])
+    return _session_response(session)
+
+
 @router.delete("/{post_id}/image")
 async def delete_image(request: Request, post_id: str):
     require_auth(request)
     db = get_db()
-    result = await db.post_queue.update_one(
+    previous = await db.post_queue.find_one_and_update(
         {"_id": ObjectId(post_id)},
         {
             "$set": {
@@ -173,14 +325,21 @@ async def delete_image(request: Request, post_id: str):
                 "updated_at": datetime.now(timezone.utc),
             },
             "$unset": {
+                "image_hash": "",
+                "image_id": "",
+                "image_size": "",
                 "image_data": "",
                 "image_content_type": "",
                 "image_urn": "",
+                "prestaged_at": "",
             },
         },
+        projection={"image_id": 1, "image_hash": 1},
     )
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Post not found")
+    await etags.bump("post_queue")
+    await image_store.release_post_image(previous)
     return {"ok": True}
 
 
@@ -189,7 +348,7 @@ async def publish_now(request: Request, post_id: str):
     require_auth(request)
     db = get_db()
 
-    post = await db.post_queue.find_one({"_id": ObjectId(post_id)})
+    post = await db.post_queue.find_one({"_id": ObjectId(post_id)}, {"status": 1})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     if post["status"] in ("published", "publishing"):
@@ -199,56 +358,25 @@ async def publish_now(request: Request, post_id: str):
     if not tokens:
         raise HTTPException(status_code=400, detail="LinkedIn not connected")
 
-    access_token = tokens["access_token"]
-    person_urn = tokens["person_urn"]
-
-    # Mark as publishing
-    await db.post_queue.update_one(
-        {"_id": ObjectId(post_id)},
-        {"$set": {"status": "publishing", "updated_at": datetime.now(timezone.utc)}},
-    )
+    # Atomic claim: loses cleanly to the publisher (or another click) racing us
+    post = await claim_post(ObjectId(post_id), _worker_id)
+    if not post:
+        raise HTTPException(status_code=409, detail="Post is already being published")
 
     try:
-        if post.get("image_data"):
-            # 3-step image upload
-            init = await initialize_image_upload(access_token, person_urn)
-            await upload_image_binary(
-                init["upload_url"],
-                access_token,
-                post["image_data"],
-                post.get("image_content_type", "image/jpeg"),
-            )
-            result = await publish_image_post(
-                access_token, person_urn, post["content"], init["image_urn"]
-            )
-        else:
-            result = await publish_text_post(access_token, person_urn, post["content"])
-
-        await db.post_queue.update_one(
-            {"_id": ObjectId(post_id)},
-            {
-                "$set": {
-                    "status": "published",
-                    "linkedin_post_id": result.get("post_id"),
-                    "published_at": datetime.now(timezone.utc),
-                    "error": None,
-                    "updated_at": datetime.now(timezone.utc),
-                },
-                "$unset": {"image_data": ""},
-            },
+        result = await publish_claimed(
+            post, _worker_id, tokens["access_token"], tokens["person_urn"]
         )
+        slot = post.get("scheduled_time")
+        if slot and slot.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc):
+            # Went out early; its slot is free for another post
+            await slot_reservations.release(post["_id"])
         return {"ok": True, "post_id": result.get("post_id")}
-
+    except PublishDeferred as e:
+        # Rescheduled; the publisher picks it up again at e.retry_at
+        logger.warning(f"Publish deferred for {post_id}: {e}")
+        retry_in = max(int((e.retry_at - datetime.now(timezone.utc)).total_seconds()), 1)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(retry_in)})
     except Exception as e:
         logger.error(f"Publish failed for {post_id}: {e}")
-        await db.post_queue.update_one(
-            {"_id": ObjectId(post_id)},
-            {
-                "$set": {
-                    "status": "failed",
-                    "error": str(e),
-                    "updated_at": datetime.now(timezone.utc),
-                }
-            },
-        )
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,64 @@
+"""Auto-scheduling and the slot calendar."""
+
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta, timezone
+
+from fastapi import APIRouter, HTTPException, Query, Request
+
+import config
+from routers.auth import require_auth
+from src import slot_reservations
+from src.database import get_db
+from src.scheduler import auto_schedule_drafts, get_schedule_settings, schedule_zone
+from src.schemas import AutoScheduleRequest
+from src.serialization import POST_PROJECTION, post_out
+
+router = APIRouter(prefix="/api/schedule", tags=["schedule"])
+
+
+async def _calendar(days: int) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    cursor = get_db().post_queue.find(
+        {
+            "status": "scheduled",
+            "scheduled_time": {"$gte": now, "$lt": now + timedelta(days=days)},
+        },
+        POST_PROJECTION,
+    ).sort("scheduled_time", 1)
+    return [post_out(doc) async for doc in cursor]
+
+
+@router.post("/auto")
+async def auto_schedule(request: Request, body: AutoScheduleRequest | None = None):
+    require_auth(request)
+    days = (body.days if body else None) or config.AUTO_SCHEDULE_DAYS
+    scheduled = await auto_schedule_drafts(days)
+    return {"scheduled": scheduled, "calendar": await _calendar(days)}
+
+
+@router.get("/calendar")
+async def month_calendar(request: Request, month: str = Query(..., pattern=r"^\d{4}-\d{2}$")):
+    """Open and reserved slots per local day of `month` (YYYY-MM)."""
+    require_auth(request)
+    settings = await get_schedule_settings()
+    tz = schedule_zone(settings.timezone)
+    try:
+        first = date.fromisoformat(f"{month}-01")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid month")
+    following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+    slots = await slot_reservations.slots_between(
+        datetime.combine(first, time(), tzinfo=tz),
+        datetime.combine(following, time(), tzinfo=tz),
+    )
+    days: dict[str, dict] = {}
+    for slot in slots:
+        local = slot["slot_time"].replace(tzinfo=timezone.utc).astimezone(tz)
+        key = local.date().isoformat()
+        day = days.setdefault(key, {"date": key, "open": 0, "reserved": 0, "slots": []})
+        post_id = slot.get("post_id")
+        day["reserved" if post_id else "open"] += 1
+        day["slots"].append({"time": local.isoformat(), "post_id": str(post_id) if post_id else None})
+    return {"month": month, "timezone": settings.timezone, "days": list(days.values())}
@@ -4,10 +4,12 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Response
 
 from routers.auth import require_auth
+from src import ai_providers, etags
 from src.database import get_db
+from src.scheduler import materialize_schedule
 from src.schemas import ScheduleSettings, AISettings
 
 router = APIRouter(prefix="/api/settings", tags=["settings"])
@@ -24,6 +26,17 @@ async def _get_setting(key: str, default: dict) -> dict:
     return default
 
 
+async def _get_setting_cached(request: Request, response: Response, key: str, default: dict):
+    """_get_setting, or a 304 when the client's copy is current."""
+    doc = await get_db().settings.find_one({"setting_key": key}, {"updated_at": 1, "_id": 0})
+    # Unsaved settings are the defaults, which may change between releases
+    etag = etags.make_etag(request, doc.get("updated_at") if doc else default)
+    if cached := etags.not_modified(request, etag):
+        return cached
+    etags.set_etag(response, etag)
+    return await _get_setting(key, default)
+
+
 async def _set_setting(key: str, data: dict) -> dict:
     db = get_db()
     await db.settings.update_one(
@@ -35,26 +48,31 @@ async def _set_setting(key: str, data: dict) -> dict:
 
 
 @router.get("/schedule")
-async def get_schedule(request: Request):
+async def get_schedule(request: Request, response: Response):
     require_auth(request)
     defaults = ScheduleSettings().model_dump()
-    return await _get_setting("schedule", defaults)
+    return await _get_setting_cached(request, response, "schedule", defaults)
 
 
 @router.put("/schedule")
 async def update_schedule(request: Request, body: ScheduleSettings):
     require_auth(request)
-    return await _set_setting("schedule", body.model_dump())
+    saved = await _set_setting("schedule", body.model_dump())
+    await materialize_schedule(body)
+    return saved
 
 
 @router.get("/ai")
-async def get_ai_settings(request: Request):
+async def get_ai_settings(request: Request, response: Response):
     require_auth(request)
-    defaults = AISettings().model_dump()
-    return await _get_setting("ai", defaults)
+    # Unsaved, the preferred provider is AI_PROVIDER's
+    defaults = AISettings(provider=await ai_providers.preferred()).model_dump()
+    return await _get_setting_cached(request, response, "ai", defaults)
 
 
 @router.put("/ai")
 async def update_ai_settings(request: Request, body: AISettings):
     require_auth(request)
-    return await _set_setting("ai", body.model_dump())
+    saved = await _set_setting("ai", body.model_dump())
+    ai_providers.forget_preferred()
+    return saved
@@ -0,0 +1,184 @@
+"""Cache for AI completions: in-process LRU in front of a Mongo TTL collection.
+
+Keys hash the provider and the normalized request body (model, system and
+user prompts, sampling parameters), so only identical completions share an
+entry. Concurrent identical calls are coalesced: the first one goes
+upstream and the rest wait for its result instead of paying for their own.
+
+With `bypass` a call skips the lookup but still stores what it gets, so
+"regenerate" refreshes the entry. AI_CACHE_TTL_SECONDS=0 turns the cache off.
+
+Documents in `ai_cache`: `_id` (the key), `value`, `created_at`, `expires_at`
+(TTL index).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable
+
+from pymongo.errors import PyMongoError
+
+import config
+from src.database import get_db
+
+logger = logging.getLogger(__name__)
+
+# key -> (value, expires_at), least recently used first
+_memory: OrderedDict[str, tuple[str, datetime]] = OrderedDict()
+# key -> the result of the call currently fetching it
+_inflight: dict[str, asyncio.Future] = {}
+
+counters: Counter[str] = Counter()
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if k != "stream"}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_key(provider: str, body: dict) -> str:
+    """Cache key for a provider request body. Whitespace runs count as one space."""
+    canonical = json.dumps([provider, _normalize(body)], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _enabled() -> bool:
+    return config.AI_CACHE_TTL_SECONDS > 0
+
+
+def _remember(key: str, value: str, expires_at: datetime) -> None:
+    _memory[key] = (value, expires_at)
+    _memory.move_to_end(key)
+    while len(_memory) > config.AI_CACHE_MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+
+async def get(key: str) -> str | None:
+    now = datetime.now(timezone.utc)
+    entry = _memory.get(key)
+    if entry is not None:
+        if entry[1] > now:
+            _memory.move_to_end(key)
+            counters["memory_hits"] += 1
+            return entry[0]
+        del _memory[key]
+    try:
+        doc = await get_db().ai_cache.find_one({"_id": key, "expires_at": {"$gt": now}})
+    except PyMongoError as e:
+        logger.warning(f"AI cache lookup failed: {e}")
+        doc = None
+    if doc is None:
+        counters["misses"] += 1
+        return None
+    counters["mongo_hits"] += 1
+    _remember(key, doc["value"], doc["expires_at"].replace(tzinfo=timezone.utc))
+    return doc["value"]
+
+
+async def put(key: str, value: str) -> None:
+    if not value:
+        return
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=config.AI_CACHE_TTL_SECONDS)
+    _remember(key, value, expires_at)
+    try:
+        await get_db().ai_cache.update_one(
+            {"_id": key},
+            {"$set": {"value": value, "created_at": now, "expires_at": expires_at}},
+            upsert=True,
+        )
+    except PyMongoError as e:
+        logger.warning(f"AI cache write failed: {e}")
+
+
+async def _join(key: str) -> str | None:
+    """Wait for an identical call in flight. None if there is none, or it failed."""
+    pending = _inflight.get(key)
+    if pending is None:
+        return None
+    counters["coalesced"] += 1
+    try:
+        return await asyncio.shield(pending)
+    except Exception:
+        return None  # the other call's failure is its own; try again
+
+
+def _fail(future: asyncio.Future, error: BaseException) -> None:
+    # Waiters retry on their own; cancellation must not cancel them too
+    future.set_exception(error if isinstance(error, Exception) else RuntimeError("Call abandoned"))
+    future.exception()  # mark retrieved, so an unshared failure is not logged
+
+
+async def cached_call(key: str, call: Callable[[], Awaitable[str]], bypass: bool = False) -> str:
+    """`call()`'s result, from the cache or shared with an identical call in flight."""
+    if not _enabled():
+        return await call()
+    if bypass:
+        counters["bypassed"] += 1
+    else:
+        if (value := await get(key)) is not None or (value := await _join(key)) is not None:
+            return value
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        try:
+            value = await call()
+        except BaseException as e:
+            _fail(future, e)
+            raise
+        future.set_result(value)
+        await put(key, value)  # in memory before its first await, so no gap for a new miss
+        return value
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+async def cached_stream(
+    key: str, stream: Callable[[], AsyncIterator[str]], bypass: bool = False
+) -> AsyncIterator[str]:
+    """Like cached_call for a stream of text. Cached and shared results arrive as one chunk."""
+    if not _enabled():
+        async for text in stream():
+            yield text
+        return
+    if bypass:
+        counters["bypassed"] += 1
+    else:
+        if (value := await get(key)) is not None or (value := await _join(key)) is not None:
+            yield value
+            return
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    parts: list[str] = []
+    try:
+        try:
+            async for text in stream():
+                parts.append(text)
+                yield text
+        except BaseException as e:
+            _fail(future, e)
+            raise
+        value = "".join(parts)
+        future.set_result(value)
+        await put(key, value)
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+def stats() -> dict:
+    return {**counters, "memory_entries": len(_memory)}
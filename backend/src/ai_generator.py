@@ -1,15 +1,54 @@
-"""Provider-agnostic AI content generation (OpenAI or Anthropic)."""
+"""Provider-agnostic AI content generation (OpenAI or Anthropic).
+
+Calls go to the provider picked in the AI settings, falling back to (or
+hedging with) the other one; see src.ai_providers.
+
+Each operation comes in two forms: one that returns the finished result and
+one that streams it (`stream_posts`, `stream_improved`) as events while the
+provider generates tokens.
+
+Post variants are generated in parallel by default (AI_VARIANT_MODE
+"parallel"): one short completion per variant, each told to take a
+different angle, all in flight at once, so the wait is about that of a
+single post. "single" asks one completion for every variant separated by
+'---' and splits them as the separators arrive.
+
+Completions go through src.ai_cache, so repeating a request costs nothing.
+"""
 
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
-
-import httpx
+import random
+import zlib
+from typing import AsyncIterator
 
 import config
+from src import ai_cache, ai_providers
+from src.http_clients import get_http_client
 
 logger = logging.getLogger(__name__)
 
+OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+ANTHROPIC_URL = "https://api.anthropic.com/v1/messages"
+
+VARIANT_SEPARATOR = "---"
+
+MAX_TOKENS = 4000
+# One post is under 3000 characters, well within this
+VARIANT_MAX_TOKENS = 1200
+
+# Each parallel variant takes the next angle, so they differ in more than wording
+VARIANT_ANGLES = [
+    "Open with a bold, specific claim or a surprising number.",
+    "Open with a short personal story or a concrete moment.",
+    "Open with a common mistake or a contrarian take, then explain.",
+    "Open with a direct question to the reader.",
+    "Structure it as a short list of practical takeaways.",
+]
+
 SYSTEM_PROMPT = """You are an expert LinkedIn content writer. You create engaging, professional posts that drive engagement and grow personal brand visibility.
 
 Guidelines:
@@ -40,7 +79,7 @@ def _type_instruction(post_type: str) -> str:
     }.get(post_type, "Write a standard text post.")
 
 
-def _build_prompt(topic: str, tone: str, post_type: str, additional_context: str | None) -> str:
+def _brief(topic: str, tone: str, post_type: str, additional_context: str | None) -> list[str]:
     parts = [
         f"Topic: {topic}",
         f"Tone: {_tone_instruction(tone)}",
@@ -48,7 +87,23 @@ def _build_prompt(topic: str, tone: str, post_type: str, additional_context: str
     ]
     if additional_context:
         parts.append(f"Additional context: {additional_context}")
-    parts.append("Generate 3 different LinkedIn post variants. Separate each variant with '---'.")
+    return parts
+
+
+def _build_prompt(
+    topic: str, tone: str, post_type: str, additional_context: str | None, count: int = 3
+) -> str:
+    parts = _brief(topic, tone, post_type, additional_context)
+    parts.append(f"Generate {count} different LinkedIn post variants. Separate each variant with '---'.")
+    return "\n\n".join(parts)
+
+
+def _build_variant_prompt(
+    topic: str, tone: str, post_type: str, additional_context: str | None, angle: str
+) -> str:
+    parts = _brief(topic, tone, post_type, additional_context)
+    parts.append(f"Angle: {angle}")
+    parts.append("Write one LinkedIn post. Return the post only, with no title or separators.")
     return "\n\n".join(parts)
 
 
@@ -63,71 +118,374 @@ def _build_improve_prompt(content: str, instructions: str | None) -> str:
     return "\n\n".join(parts)
 
 
-async def _generate_openai(prompt: str) -> str:
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            json={
-                "model": "gpt-4o",
-                "messages": [
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": prompt},
-                ],
-                "temperature": 0.8,
-                "max_tokens": 4000,
-            },
-            headers={
-                "Authorization": f"Bearer {config.OPENAI_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            timeout=60,
-        )
-        resp.raise_for_status()
-        return resp.json()["choices"][0]["message"]["content"]
-
-
-async def _generate_anthropic(prompt: str) -> str:
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            "https://api.anthropic.com/v1/messages",
-            json={
-                "model": "claude-sonnet-4-5-20250929",
-                "max_tokens": 4000,
-                "system": SYSTEM_PROMPT,
-                "messages": [{"role": "user", "content": prompt}],
-            },
-            headers={
-                "x-api-key": config.ANTHROPIC_API_KEY,
-                "anthropic-version": "2023-06-01",
-                "Content-Type": "application/json",
-            },
-            timeout=60,
-        )
-        resp.raise_for_status()
-        return resp.json()["content"][0]["text"]
+def _openai_request(
+    prompt: str, stream: bool = False, max_tokens: int = MAX_TOKENS, seed: int | None = None
+) -> dict:
+    body = {
+        "model": "gpt-4o",
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.8,
+        "max_tokens": max_tokens,
+    }
+    if seed is not None:
+        body["seed"] = seed
+    if stream:
+        body["stream"] = True
+    return {
+        "json": body,
+        "headers": {
+            "Authorization": f"Bearer {config.OPENAI_API_KEY}",
+            "Content-Type": "application/json",
+        },
+    }
+
+
+def _anthropic_request(
+    prompt: str, stream: bool = False, max_tokens: int = MAX_TOKENS, seed: int | None = None
+) -> dict:
+    # No seed parameter in this API; the per-variant angle provides the diversity
+    body = {
+        "model": "claude-sonnet-4-5-20250929",
+        "max_tokens": max_tokens,
+        "system": SYSTEM_PROMPT,
+        "messages": [{"role": "user", "content": prompt}],
+    }
+    if stream:
+        body["stream"] = True
+    return {
+        "json": body,
+        "headers": {
+            "x-api-key": config.ANTHROPIC_API_KEY,
+            "anthropic-version": "2023-06-01",
+            "Content-Type": "application/json",
+        },
+    }
+
+
+async def _generate_openai(prompt: str, **options) -> str:
+    resp = await get_http_client(OPENAI_URL).post(OPENAI_URL, **_openai_request(prompt, **options))
+    resp.raise_for_status()
+    return resp.json()["choices"][0]["message"]["content"]
+
+
+async def _generate_anthropic(prompt: str, **options) -> str:
+    resp = await get_http_client(ANTHROPIC_URL).post(ANTHROPIC_URL, **_anthropic_request(prompt, **options))
+    resp.raise_for_status()
+    return resp.json()["content"][0]["text"]
+
+
+_COMPLETE = {"openai": _generate_openai, "anthropic": _generate_anthropic}
+
+
+def _cache_key(provider: str, prompt: str, options: dict) -> str:
+    build = _anthropic_request if provider == "anthropic" else _openai_request
+    return ai_cache.make_key(provider, build(prompt, **options)["json"])
+
+
+def _latency_kind(options: dict) -> str:
+    # Completion time grows with the length asked for, so each limit has its own p95
+    return f"completion_{options.get('max_tokens', MAX_TOKENS)}"
+
+
+async def _generate(prompt: str, use_cache: bool = True, **options) -> str:
+    """A completion from the preferred provider, or its fallback. `options`: max_tokens, seed."""
+    preferred = await ai_providers.preferred()
+    # Keyed by the preferred provider's request, whichever provider answers it
+    return await ai_cache.cached_call(
+        _cache_key(preferred, prompt, options),
+        lambda: ai_providers.complete(
+            preferred, lambda provider: _COMPLETE[provider](prompt, **options), _latency_kind(options)
+        ),
+        bypass=not use_cache,
+    )
+
+
+# --- Streaming ---
+
+async def _sse_data(url: str, request: dict) -> AsyncIterator[dict]:
+    """POST with streaming on and yield each server-sent event's JSON data."""
+    async with get_http_client(url).stream("POST", url, **request) as resp:
+        if resp.is_error:
+            await resp.aread()
+            resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            yield json.loads(data)
+
+
+async def _stream_openai(prompt: str, **options) -> AsyncIterator[str]:
+    async for data in _sse_data(OPENAI_URL, _openai_request(prompt, stream=True, **options)):
+        for choice in data.get("choices", []):
+            if text := (choice.get("delta") or {}).get("content"):
+                yield text
+
 
+async def _stream_anthropic(prompt: str, **options) -> AsyncIterator[str]:
+    async for data in _sse_data(ANTHROPIC_URL, _anthropic_request(prompt, stream=True, **options)):
+        if data.get("type") == "content_block_delta" and data["delta"].get("type") == "text_delta":
+            yield data["delta"]["text"]
+        elif data.get("type") == "error":
+            raise RuntimeError(data["error"].get("message", "Anthropic stream error"))
+        elif data.get("type") == "message_stop":
+            return
 
-async def _generate(prompt: str) -> str:
-    provider = config.AI_PROVIDER.lower()
-    if provider == "anthropic":
-        return await _generate_anthropic(prompt)
-    return await _generate_openai(prompt)
 
+_STREAM = {"openai": _stream_openai, "anthropic": _stream_anthropic}
 
-async def generate_posts(topic: str, tone: str, post_type: str, additional_context: str | None = None) -> list[str]:
-    """Generate 3 post variants for a given topic."""
-    prompt = _build_prompt(topic, tone, post_type, additional_context)
-    raw = await _generate(prompt)
 
-    # Split on '---' separator
-    variants = [v.strip() for v in raw.split("---") if v.strip()]
+async def _stream(prompt: str, use_cache: bool = True, **options) -> AsyncIterator[str]:
+    """Text deltas from the preferred provider (or its fallback), as they are generated.
+
+    A cached completion arrives as a single delta.
+    """
+    preferred = await ai_providers.preferred()
+    stream = ai_cache.cached_stream(
+        _cache_key(preferred, prompt, options),
+        lambda: ai_providers.stream(preferred, lambda provider: _STREAM[provider](prompt, **options)),
+        bypass=not use_cache,
+    )
+    try:
+        async for text in stream:
+            yield text
+    finally:
+        await stream.aclose()
+
+
+class VariantSplitter:
+    """Split streamed text into variants on VARIANT_SEPARATOR as it arrives.
+
+    `feed` returns the events for the text so far: a delta for new text of
+    the variant being written, and a variant event once one is complete.
+    Text that could be the start of a separator is held back until it is not.
+    """
+
+    def __init__(self) -> None:
+        self.raw = ""
+        self.variants: list[str] = []
+        self._pending = ""  # text of the current variant
+        self._sent = 0      # how much of it went out as deltas
+
+    def _delta(self, end: int, events: list[dict]) -> None:
+        if end > self._sent:
+            events.append({"type": "delta", "index": len(self.variants), "text": self._pending[self._sent:end]})
+            self._sent = end
+
+    def _complete(self, events: list[dict]) -> None:
+        self._delta(len(self._pending), events)
+        if self._pending.strip():
+            self.variants.append(self._pending.strip())
+            events.append({"type": "variant", "index": len(self.variants) - 1, "content": self.variants[-1]})
+        self._pending, self._sent = "", 0
+
+    def feed(self, text: str) -> list[dict]:
+        self.raw += text
+        self._pending += text
+        events: list[dict] = []
+        while (end := self._pending.find(VARIANT_SEPARATOR)) != -1:
+            self._pending, rest = self._pending[:end], self._pending[end + len(VARIANT_SEPARATOR):]
+            self._complete(events)
+            self._pending = rest
+        safe = len(self._pending)
+        for size in range(len(VARIANT_SEPARATOR) - 1, 0, -1):
+            if self._pending.endswith(VARIANT_SEPARATOR[:size]):
+                safe -= size
+                break
+        self._delta(safe, events)
+        return events
+
+    def finish(self) -> list[dict]:
+        events: list[dict] = []
+        self._complete(events)
+        return events
+
+
+def _final_variants(raw: str, variants: list[str], count: int) -> list[str]:
     # If splitting didn't work well, return the whole thing as one variant
     if len(variants) < 2:
-        variants = [raw.strip()]
-    return variants[:3]
+        return [raw.strip()]
+    return variants[:count]
+
+
+def _clean_variant(text: str) -> str:
+    """A single-variant completion, minus any separators the model added anyway."""
+    parts = [part.strip() for part in text.split(VARIANT_SEPARATOR) if part.strip()]
+    return max(parts, key=len) if parts else ""
+
+
+def _merge(variants: list[str]) -> list[str]:
+    """Drop empty and duplicate variants, keeping their order."""
+    seen: set[str] = set()
+    merged = []
+    for variant in variants:
+        key = " ".join(variant.lower().split())
+        if variant and key not in seen:
+            seen.add(key)
+            merged.append(variant)
+    return merged
+
+
+def _variant_requests(
+    topic: str, tone: str, post_type: str, additional_context: str | None, count: int, use_cache: bool
+) -> list[tuple[str, dict]]:
+    """(prompt, options) for each of `count` parallel variants."""
+    if use_cache:
+        # The same brief gets the same seeds, so a repeated request can be served from the cache
+        brief = "\n".join(_brief(topic, tone, post_type, additional_context))
+        base_seed = zlib.crc32(brief.encode()) & 0x3FFFFFFF
+    else:
+        base_seed = random.randrange(2**30)
+    return [
+        (
+            _build_variant_prompt(
+                topic, tone, post_type, additional_context, VARIANT_ANGLES[i % len(VARIANT_ANGLES)]
+            ),
+            {"max_tokens": VARIANT_MAX_TOKENS, "seed": base_seed + i, "use_cache": use_cache},
+        )
+        for i in range(count)
+    ]
 
 
-async def improve_post(content: str, instructions: str | None = None) -> str:
+def _parallel() -> bool:
+    return config.AI_VARIANT_MODE.lower() != "single"
+
+
+async def generate_posts(
+    topic: str,
+    tone: str,
+    post_type: str,
+    additional_context: str | None = None,
+    count: int | None = None,
+    use_cache: bool = True,
+) -> list[str]:
+    """Generate `count` post variants (default AI_VARIANT_COUNT) for a given topic.
+
+    `use_cache=False` always asks the model, for fresh variants.
+    """
+    count = count or config.AI_VARIANT_COUNT
+    if not _parallel():
+        prompt = _build_prompt(topic, tone, post_type, additional_context, count)
+        raw = await _generate(prompt, use_cache=use_cache)
+        variants = [v.strip() for v in raw.split(VARIANT_SEPARATOR) if v.strip()]
+        return _final_variants(raw, variants, count)
+
+    requests = _variant_requests(topic, tone, post_type, additional_context, count, use_cache)
+    results = await asyncio.gather(
+        *(_generate(prompt, **options) for prompt, options in requests), return_exceptions=True
+    )
+    failures = [r for r in results if isinstance(r, BaseException)]
+    variants = _merge([_clean_variant(r) for r in results if not isinstance(r, BaseException)])
+    if not variants:
+        raise failures[0] if failures else RuntimeError("The model returned no content")
+    if failures:
+        logger.warning(f"{len(failures)} of {count} variants failed: {failures[0]}")
+    return variants
+
+
+async def stream_posts(
+    topic: str,
+    tone: str,
+    post_type: str,
+    additional_context: str | None = None,
+    count: int | None = None,
+    use_cache: bool = True,
+) -> AsyncIterator[dict]:
+    """Like generate_posts, as events while the model writes:
+
+    {"type": "delta", "index": i, "text": ...} for new text of variant i,
+    {"type": "variant", "index": i, "content": ...} when variant i is done,
+    {"type": "done", "variants": [...]} with the same result generate_posts gives.
+
+    In parallel mode variants are written at the same time, so their deltas
+    interleave; a variant that fails sends {"type": "variant_failed", "index": i}.
+    """
+    count = count or config.AI_VARIANT_COUNT
+    if _parallel():
+        async for event in _stream_parallel(
+            _variant_requests(topic, tone, post_type, additional_context, count, use_cache)
+        ):
+            yield event
+        return
+
+    splitter = VariantSplitter()
+    stream = _stream(_build_prompt(topic, tone, post_type, additional_context, count), use_cache=use_cache)
+    try:
+        async for text in stream:
+            for event in splitter.feed(text):
+                yield event
+            if len(splitter.variants) >= count:
+                # Anything after the last wanted variant is discarded anyway; the
+                # raw text already holds the start of the next one
+                variants = splitter.variants[:count]
+                break
+        else:
+            for event in splitter.finish():
+                yield event
+            variants = _final_variants(splitter.raw, splitter.variants, count)
+    finally:
+        await stream.aclose()
+    yield {"type": "done", "variants": variants}
+
+
+async def _stream_parallel(requests: list[tuple[str, dict]]) -> AsyncIterator[dict]:
+    """Run one stream per variant and interleave their events as they come."""
+    events: asyncio.Queue[dict] = asyncio.Queue()
+    contents: list[str] = [""] * len(requests)
+    failures: list[Exception] = []
+
+    async def run(index: int, prompt: str, options: dict) -> None:
+        parts = []
+        try:
+            async for text in _stream(prompt, **options):
+                parts.append(text)
+                await events.put({"type": "delta", "index": index, "text": text})
+        except Exception as e:
+            logger.warning(f"Variant {index} failed: {e}")
+            failures.append(e)
+            await events.put({"type": "variant_failed", "index": index})
+            return
+        contents[index] = _clean_variant("".join(parts))
+        await events.put({"type": "variant", "index": index, "content": contents[index]})
+
+    tasks = [asyncio.create_task(run(i, prompt, options)) for i, (prompt, options) in enumerate(requests)]
+    try:
+        for _ in range(len(tasks)):
+            while True:
+                event = await events.get()
+                yield event
+                if event["type"] != "delta":
+                    break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    variants = _merge(contents)
+    if not variants:
+        raise failures[0] if failures else RuntimeError("The model returned no content")
+    yield {"type": "done", "variants": variants}
+
+
+async def improve_post(content: str, instructions: str | None = None, use_cache: bool = True) -> str:
     """Improve an existing post draft."""
     prompt = _build_improve_prompt(content, instructions)
-    return (await _generate(prompt)).strip()
+    return (await _generate(prompt, use_cache=use_cache)).strip()
+
+
+async def stream_improved(
+    content: str, instructions: str | None = None, use_cache: bool = True
+) -> AsyncIterator[dict]:
+    """Like improve_post, as {"type": "delta", "text": ...} events, then
+    {"type": "done", "improved": ...}."""
+    prompt = _build_improve_prompt(content, instructions)
+    parts = []
+    async for text in _stream(prompt, use_cache=use_cache):
+        parts.append(text)
+        yield {"type": "delta", "text": text}
+    yield {"type": "done", "improved": "".join(parts).strip()}
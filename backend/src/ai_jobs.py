@@ -0,0 +1,318 @@
+"""Durable queue of AI generation jobs, run by a bounded worker pool.
+
+Generating outside the request means a slow provider does not hold up an
+HTTP worker and a browser refresh does not lose the result: the job and
+its result live in `ai_jobs` until the client picks them up.
+
+Jobs are claimed like posts are for publishing (see src.publishing): one
+atomic `find_one_and_update` flips a job to `running` with a worker id and
+a lease expiry, so any number of API processes can share the queue and a
+job whose worker died is picked up again once its lease runs out.
+
+Each process runs at most AI_JOB_WORKERS jobs at a time. Between them they
+have at most AI_JOB_OPENAI_CONCURRENCY calls open to OpenAI and
+AI_JOB_ANTHROPIC_CONCURRENCY to Anthropic. The limit applies to the provider
+each call really goes to, after failover and hedging, and a job that writes
+variants in parallel uses one slot per call (see src.ai_providers.limit).
+Retryable failures (see src.retry) go back to the queue with a backoff, up
+to AI_JOB_MAX_ATTEMPTS.
+
+Documents in `ai_jobs`: `kind` ("generate" or "improve"), `params`,
+`provider` (preferred when submitted), `status` (queued, running, done, failed), `attempts`,
+`next_attempt_at`, `lease_owner`, `lease_expires_at`, `result`, `error`,
+`batch_id`, `draft_id` (the id its draft is saved under, with
+`save_draft`), `created_at`, `updated_at`, `expires_at` (TTL index, set
+when the job finishes).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+import config
+from src import ai_generator, ai_providers, post_ops
+from src.database import get_db
+from src.publishing import new_worker_id
+from src.retry import classify, backoff_delay
+from src.schemas import PostCreate
+
+logger = logging.getLogger(__name__)
+
+# Public fields of a job; the lease bookkeeping stays internal
+JOB_PROJECTION = {
+    field: 1
+    for field in (
+        "kind", "params", "provider", "status", "attempts", "next_attempt_at",
+        "result", "error", "batch_id", "created_at", "updated_at",
+    )
+}
+
+STRANDED_ERROR = "The worker running this job stopped too many times"
+
+
+def _limits() -> dict[str, int]:
+    return {
+        "openai": config.AI_JOB_OPENAI_CONCURRENCY,
+        "anthropic": config.AI_JOB_ANTHROPIC_CONCURRENCY,
+    }
+
+
+def _new_job(
+    kind: str, params: dict, provider: str, now: datetime, batch_id: ObjectId | None = None
+) -> dict:
+    job = {
+        "_id": ObjectId(),
+        "kind": kind,
+        "params": params,
+        "provider": provider,
+        "status": "queued",
+        "attempts": 0,
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    if batch_id is not None:
+        job["batch_id"] = batch_id
+    if params.get("save_draft"):
+        # Fixed up front, so a retry finds the draft an earlier attempt saved
+        job["draft_id"] = ObjectId()
+    return job
+
+
+async def submit(kind: str, params: dict) -> dict:
+    """Queue one job and return it."""
+    job = _new_job(kind, params, await ai_providers.preferred(), datetime.now(timezone.utc))
+    await get_db().ai_jobs.insert_one(job)
+    runner.wake()
+    return job
+
+
+async def submit_batch(kind: str, params: list[dict]) -> tuple[ObjectId, list[dict]]:
+    """Queue one job per entry of `params` under a shared batch id."""
+    batch_id = ObjectId()
+    now = datetime.now(timezone.utc)
+    provider = await ai_providers.preferred()
+    jobs = [_new_job(kind, p, provider, now, batch_id) for p in params]
+    await get_db().ai_jobs.insert_many(jobs)
+    runner.wake()
+    return batch_id, jobs
+
+
+async def get_job(job_id: ObjectId) -> dict | None:
+    return await get_db().ai_jobs.find_one({"_id": job_id}, JOB_PROJECTION)
+
+
+async def get_batch(batch_id: ObjectId) -> list[dict]:
+    cursor = get_db().ai_jobs.find({"batch_id": batch_id}, JOB_PROJECTION).sort("_id", 1)
+    return await cursor.to_list(length=None)
+
+
+# --- Claims ---
+
+async def claim_next(worker_id: str) -> dict | None:
+    """Claim the oldest runnable job (or one whose lease expired)."""
+    now = datetime.now(timezone.utc)
+    return await get_db().ai_jobs.find_one_and_update(
+        {
+            "$or": [
+                {
+                    "status": "queued",
+                    "$or": [{"next_attempt_at": None}, {"next_attempt_at": {"$lte": now}}],
+                },
+                {"status": "running", "lease_expires_at": {"$lt": now}},
+            ],
+        },
+        {
+            "$set": {
+                "status": "running",
+                "lease_owner": worker_id,
+                "lease_expires_at": now + timedelta(seconds=config.AI_JOB_LEASE_SECONDS),
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _finish(job: dict, worker_id: str, fields: dict) -> None:
+    now = datetime.now(timezone.utc)
+    await get_db().ai_jobs.update_one(
+        {"_id": job["_id"], "lease_owner": worker_id},
+        {
+            "$set": {
+                **fields,
+                "updated_at": now,
+                "expires_at": now + timedelta(days=config.AI_JOB_RETENTION_DAYS),
+            },
+            "$unset": {"lease_owner": "", "lease_expires_at": "", "next_attempt_at": ""},
+        },
+    )
+
+
+async def complete_job(job: dict, worker_id: str, result: dict) -> None:
+    await _finish(job, worker_id, {"status": "done", "result": result, "error": None})
+
+
+async def fail_job(job: dict, worker_id: str, error: str) -> None:
+    await _finish(job, worker_id, {"status": "failed", "error": error})
+
+
+async def _retry_job(job: dict, worker_id: str, retry_at: datetime, error: str) -> None:
+    await get_db().ai_jobs.update_one(
+        {"_id": job["_id"], "lease_owner": worker_id},
+        {
+            "$set": {
+                "status": "queued",
+                "next_attempt_at": retry_at,
+                "error": error,
+                "updated_at": datetime.now(timezone.utc),
+            },
+            "$unset": {"lease_owner": "", "lease_expires_at": ""},
+        },
+    )
+
+
+async def release_job(job: dict, worker_id: str) -> None:
+    """Put an interrupted job back in the queue, without counting the attempt."""
+    await get_db().ai_jobs.update_one(
+        {"_id": job["_id"], "lease_owner": worker_id},
+        {
+            "$set": {"status": "queued", "updated_at": datetime.now(timezone.utc)},
+            "$inc": {"attempts": -1},
+            "$unset": {"lease_owner": "", "lease_expires_at": ""},
+        },
+    )
+
+
+async def _record_failure(job: dict, worker_id: str, exc: BaseException) -> None:
+    decision = classify(exc)
+    # A job that outlived its lease is worth another try, like a request timeout
+    retryable = decision.retryable or isinstance(exc, asyncio.TimeoutError)
+    error = str(exc) or type(exc).__name__
+    if not retryable or job["attempts"] >= config.AI_JOB_MAX_ATTEMPTS:
+        await fail_job(job, worker_id, error)
+        logger.warning(f"AI job {job['_id']} failed: {error}")
+        return
+    delay = backoff_delay(job["attempts"], decision.retry_after)
+    await _retry_job(job, worker_id, datetime.now(timezone.utc) + timedelta(seconds=delay), error)
+    logger.warning(f"AI job {job['_id']} attempt {job['attempts']} failed, retrying in {delay:.0f}s: {error}")
+
+
+# --- Execution ---
+
+async def run_job(job: dict) -> dict:
+    """Do the work of a job and return its result."""
+    params = job["params"]
+    if job["kind"] == "improve":
+        improved = await ai_generator.improve_post(
+            content=params["content"],
+            instructions=params.get("instructions"),
+            use_cache=not params.get("no_cache", False),
+        )
+        return {"improved": improved}
+
+    variants = await ai_generator.generate_posts(
+        topic=params["topic"],
+        tone=params["tone"],
+        post_type=params["post_type"],
+        additional_context=params.get("additional_context"),
+        count=params.get("variants"),
+        use_cache=not params.get("no_cache", False),
+    )
+    result: dict = {"variants": variants}
+    if params.get("save_draft"):
+        result["post_id"] = await _save_draft(job, variants[0])
+    return result
+
+
+async def _save_draft(job: dict, content: str) -> ObjectId:
+    """Add the job's draft to the queue, unless an earlier attempt already did."""
+    draft_id = job.get("draft_id") or ObjectId()
+    if await get_db().post_queue.find_one({"_id": draft_id}, {"_id": 1}) is None:
+        await post_ops.create_posts([PostCreate(content=content)], [draft_id])
+    return draft_id
+
+
+class JobRunner:
+    """Claims and runs up to AI_JOB_WORKERS jobs at a time."""
+
+    def __init__(self) -> None:
+        self._worker_id = new_worker_id()
+        self._slots = {provider: asyncio.Semaphore(n) for provider, n in _limits().items()}
+        self._active = 0
+        self._running: set[asyncio.Task] = set()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def wake(self) -> None:
+        """Look for work now instead of at the next poll."""
+        self._wake.set()
+
+    async def _execute(self, job: dict) -> None:
+        # Runs in its own task, so this only caps the calls of jobs
+        ai_providers.limit(self._slots)
+        try:
+            if job["attempts"] > config.AI_JOB_MAX_ATTEMPTS:
+                await fail_job(job, self._worker_id, STRANDED_ERROR)
+                return
+            try:
+                # Give up before the lease runs out and another worker takes over
+                result = await asyncio.wait_for(run_job(job), config.AI_JOB_LEASE_SECONDS - 5)
+            except asyncio.CancelledError:
+                await release_job(job, self._worker_id)
+                raise
+            except Exception as e:
+                await _record_failure(job, self._worker_id, e)
+                return
+            await complete_job(job, self._worker_id, result)
+        except PyMongoError as e:
+            # The lease runs out and the job is retried
+            logger.warning(f"AI job {job['_id']} could not be recorded: {e}")
+        finally:
+            self._active -= 1
+            self.wake()
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            job = None
+            if self._active < config.AI_JOB_WORKERS:
+                try:
+                    job = await claim_next(self._worker_id)
+                except PyMongoError as e:
+                    logger.warning(f"AI job claim failed: {e}")
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), config.AI_JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._active += 1
+            task = asyncio.create_task(self._execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    def start(self) -> None:
+        if self._task is None and config.AI_JOB_WORKERS > 0:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Running up to {config.AI_JOB_WORKERS} AI jobs at a time")
+
+    async def stop(self) -> None:
+        """Stop claiming, and put the jobs still running back in the queue."""
+        tasks = [self._task, *self._running] if self._task is not None else list(self._running)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+
+runner = JobRunner()
@@ -0,0 +1,275 @@
+"""Route AI calls across providers: failover, hedging and latency stats.
+
+The preferred provider is AISettings.provider (the saved `ai` setting), or
+AI_PROVIDER until those settings are saved. With AI_FAILOVER the other
+provider, if it has an API key, backs it up: a call that fails, or takes
+longer than AI_PROVIDER_TIMEOUT_SECONDS (AI_FIRST_TOKEN_TIMEOUT_SECONDS for
+the first text of a stream), is made again on the next provider. A provider
+that failed most of its calls in the last minute goes last until it recovers.
+
+With AI_HEDGE as well, a call still unanswered after the first provider's
+p95 latency is also sent to the next one, and whichever answers first wins;
+the other is cancelled. That caps the slow tail at the cost of a second call
+for about one request in twenty. A provider is only hedged once it has
+AI_HEDGE_MIN_SAMPLES latencies on record for that kind of call.
+
+Streams fail over and hedge on their first text only; once a provider has
+started writing, the rest of the stream comes from it.
+
+A task can cap its concurrent calls per provider with `limit` (the AI job
+workers do). The cap applies to the provider each call actually goes to,
+failovers and hedges included; a call waits for a free slot first.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import math
+import time
+from collections import Counter, deque
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+from pymongo.errors import PyMongoError
+
+import config
+from src.database import get_db
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PROVIDERS = ("openai", "anthropic")
+
+# A provider with at least _HEALTH_MIN_CALLS outcomes in the last
+# _HEALTH_SECONDS, of which at least _UNHEALTHY_ERROR_RATE failed, goes last
+_HEALTH_SECONDS = 60.0
+_HEALTH_MIN_CALLS = 3
+_UNHEALTHY_ERROR_RATE = 0.5
+
+FIRST_TOKEN = "first_token"
+
+# How long the preferred provider is cached; other API processes pick up a
+# change within this
+_PREFERRED_TTL_SECONDS = 30.0
+_preferred: tuple[str, float] | None = None  # (provider, expires at, monotonic)
+
+# Per-provider call slots of the current task, if it is capped (see `limit`)
+_slots: contextvars.ContextVar[dict[str, asyncio.Semaphore] | None] = contextvars.ContextVar(
+    "ai_provider_slots", default=None
+)
+
+
+class ProviderStats:
+    def __init__(self) -> None:
+        self.latencies: dict[str, deque[float]] = {}
+        self.outcomes: deque[tuple[float, bool]] = deque(maxlen=config.AI_LATENCY_WINDOW)
+        self.counts: Counter[str] = Counter()
+
+    def success(self, kind: str, seconds: float) -> None:
+        window = self.latencies.setdefault(kind, deque(maxlen=config.AI_LATENCY_WINDOW))
+        window.append(seconds)
+        self.outcomes.append((time.monotonic(), True))
+        self.counts["calls"] += 1
+
+    def failure(self, exc: BaseException) -> None:
+        self.outcomes.append((time.monotonic(), False))
+        self.counts["calls"] += 1
+        self.counts["timeouts" if isinstance(exc, asyncio.TimeoutError) else "errors"] += 1
+
+    def p95(self, kind: str) -> float | None:
+        """The 95th percentile latency of recent `kind` calls, once there are enough."""
+        window = self.latencies.get(kind)
+        if not window or len(window) < config.AI_HEDGE_MIN_SAMPLES:
+            return None
+        return sorted(window)[math.ceil(0.95 * len(window)) - 1]
+
+    def recent_error_rate(self) -> float | None:
+        since = time.monotonic() - _HEALTH_SECONDS
+        recent = [ok for at, ok in self.outcomes if at >= since]
+        if len(recent) < _HEALTH_MIN_CALLS:
+            return None
+        return recent.count(False) / len(recent)
+
+    def healthy(self) -> bool:
+        rate = self.recent_error_rate()
+        return rate is None or rate < _UNHEALTHY_ERROR_RATE
+
+    def summary(self) -> dict:
+        return {
+            **self.counts,
+            "healthy": self.healthy(),
+            "recent_error_rate": self.recent_error_rate(),
+            "p95_seconds": {kind: self.p95(kind) for kind in self.latencies},
+            "samples": {kind: len(window) for kind, window in self.latencies.items()},
+        }
+
+
+_stats = {provider: ProviderStats() for provider in PROVIDERS}
+
+
+def _has_key(provider: str) -> bool:
+    return bool(config.ANTHROPIC_API_KEY if provider == "anthropic" else config.OPENAI_API_KEY)
+
+
+def _normalize(name: str | None) -> str:
+    return "anthropic" if (name or "").lower() == "anthropic" else "openai"
+
+
+async def preferred() -> str:
+    """The provider picked in the AI settings, or AI_PROVIDER if none is saved.
+
+    Read at most every _PREFERRED_TTL_SECONDS per process; saving the
+    settings here refreshes it at once (see `forget_preferred`).
+    """
+    global _preferred
+    if _preferred is not None and _preferred[1] > time.monotonic():
+        return _preferred[0]
+    try:
+        doc = await get_db().settings.find_one({"setting_key": "ai"}, {"provider": 1})
+    except PyMongoError as e:
+        logger.warning(f"Could not read AI settings, using AI_PROVIDER: {e}")
+        return _normalize(config.AI_PROVIDER)
+    provider = _normalize((doc or {}).get("provider") or config.AI_PROVIDER)
+    _preferred = (provider, time.monotonic() + _PREFERRED_TTL_SECONDS)
+    return provider
+
+
+def forget_preferred() -> None:
+    """Drop the cached preference, after the AI settings change."""
+    global _preferred
+    _preferred = None
+
+
+def limit(slots: dict[str, asyncio.Semaphore]) -> None:
+    """Cap this task's calls (and those of tasks it starts) to `slots` per provider."""
+    _slots.set(slots)
+
+
+def order(preferred_provider: str) -> list[str]:
+    """Providers to try, in order."""
+    if not config.AI_FAILOVER:
+        return [preferred_provider]
+    candidates = [preferred_provider] + [
+        p for p in PROVIDERS if p != preferred_provider and _has_key(p)
+    ]
+    # Stable, so the preference holds among providers in the same state
+    return sorted(candidates, key=lambda p: (not _has_key(p), not _stats[p].healthy()))
+
+
+async def _attempt(provider: str, start: Callable[[str], Awaitable[T]], timeout: float) -> tuple[float, T]:
+    """`start(provider)` once a slot is free, if calls are capped.
+
+    Returns when the call started, so time spent waiting for a slot does not
+    count as the provider's latency.
+    """
+    slots = _slots.get()
+    if slots is None:
+        return time.monotonic(), await asyncio.wait_for(start(provider), timeout)
+    async with slots[provider]:
+        return time.monotonic(), await asyncio.wait_for(start(provider), timeout)
+
+
+async def _race(
+    providers: list[str], start: Callable[[str], Awaitable[T]], kind: str, timeout: float
+) -> tuple[str, T]:
+    """Run `start(provider)` down the list until one succeeds, hedging if enabled.
+
+    Returns the provider that answered and its result; the other calls are
+    cancelled. Raises the last error if every provider failed.
+    """
+    pending: dict[asyncio.Task, tuple[str, float]] = {}
+    errors: list[BaseException] = []
+    remaining = list(providers)
+    hedged_from = None
+
+    def launch() -> None:
+        provider = remaining.pop(0)
+        task = asyncio.ensure_future(_attempt(provider, start, timeout))
+        pending[task] = (provider, time.monotonic())
+
+    launch()
+    try:
+        while pending:
+            hedge_in = None
+            if config.AI_HEDGE and remaining and len(pending) == 1:
+                [(provider, started)] = pending.values()
+                if (p95 := _stats[provider].p95(kind)) is not None:
+                    hedge_in = max(started + p95 - time.monotonic(), 0.0)
+            done, _ = await asyncio.wait(pending, timeout=hedge_in, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                [(slow, _)] = pending.values()
+                logger.info(f"{slow} slower than its p95, hedging with {remaining[0]}")
+                _stats[slow].counts["hedged"] += 1
+                hedged_from = slow
+                launch()
+                continue
+            for task in done:
+                provider, _ = pending.pop(task)
+                try:
+                    started, result = task.result()
+                except Exception as e:
+                    _stats[provider].failure(e)
+                    errors.append(e)
+                    logger.warning(f"AI call to {provider} failed: {str(e) or type(e).__name__}")
+                    continue
+                _stats[provider].success(kind, time.monotonic() - started)
+                if hedged_from is not None and provider != hedged_from:
+                    _stats[provider].counts["hedge_wins"] += 1
+                return provider, result
+            if not pending and remaining:
+                logger.info(f"Failing over to {remaining[0]}")
+                _stats[remaining[0]].counts["failovers"] += 1
+                launch()
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    raise errors[-1]
+
+
+async def complete(
+    preferred_provider: str, call: Callable[[str], Awaitable[str]], kind: str
+) -> str:
+    """`call(provider)` on the first provider that answers. `kind` groups latencies."""
+    _, result = await _race(order(preferred_provider), call, kind, config.AI_PROVIDER_TIMEOUT_SECONDS)
+    return result
+
+
+async def stream(
+    preferred_provider: str, open_stream: Callable[[str], AsyncIterator[str]]
+) -> AsyncIterator[str]:
+    """Text from `open_stream(provider)` of the first provider to start writing."""
+    streams: list[AsyncIterator[str]] = []
+
+    async def first_text(provider: str) -> tuple[AsyncIterator[str], str | None]:
+        iterator = open_stream(provider)
+        streams.append(iterator)
+        try:
+            return iterator, await iterator.__anext__()
+        except StopAsyncIteration:
+            return iterator, None
+
+    iterator = None
+    try:
+        _, (iterator, text) = await _race(
+            order(preferred_provider), first_text, FIRST_TOKEN, config.AI_FIRST_TOKEN_TIMEOUT_SECONDS
+        )
+    finally:
+        # The winner is read and closed below; the rest were cancelled mid-call
+        for other in streams:
+            if other is not iterator:
+                await other.aclose()
+    try:
+        if text is not None:
+            yield text
+            async for text in iterator:
+                yield text
+    finally:
+        await iterator.aclose()
+
+
+def stats() -> dict:
+    """Call, error and latency figures per provider, for this process."""
+    return {provider: _stats[provider].summary() for provider in PROVIDERS}
@@ -0,0 +1,173 @@
+"""Negotiated brotli/gzip response compression.
+
+Responses of at least COMPRESSION_MIN_BYTES are compressed with the best
+encoding the client accepts (brotli, then gzip). Streaming responses (the
+post event feed, import progress) are compressed as they go: every chunk is
+flushed through the compressor as soon as it is sent, so events are never
+held back waiting for more data.
+
+Images and bodies that are already encoded pass through untouched.
+Brotli is used only if the `brotli` package is installed.
+"""
+
+from __future__ import annotations
+
+import gzip
+import logging
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Already compressed, so not worth another pass
+_INCOMPRESSIBLE = ("image/", "video/", "audio/", "application/zip", "application/gzip")
+
+
+def _brotli_available() -> bool:
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+_brotli = _brotli_available()
+if not _brotli:
+    logger.info("The 'brotli' package is missing; compressing responses with gzip only")
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """The encoding to use for an Accept-Encoding header, if any."""
+    weights: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    candidates = ["br", "gzip"] if _brotli else ["gzip"]
+    best, best_q = None, 0.0
+    for name in candidates:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class _Encoder:
+    def __init__(self, encoding: str) -> None:
+        if encoding == "br":
+            import brotli
+
+            self._brotli = brotli.Compressor(quality=config.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(config.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip framing
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress `data` and flush, so the client can decode it right away."""
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        import brotli
+
+        return brotli.compress(data, quality=config.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=config.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int | None = None) -> None:
+        self.app = app
+        self.minimum_size = config.COMPRESSION_MIN_BYTES if minimum_size is None else minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        await self.app(scope, receive, _Responder(send, encoding, self.minimum_size).send)
+
+
+class _Responder:
+    def __init__(self, send: Send, encoding: str | None, minimum_size: int) -> None:
+        self._send = send
+        self._encoding = encoding
+        self._minimum_size = minimum_size
+        self._start: Message | None = None
+        self._encoder: _Encoder | None = None
+        self._passthrough = False
+
+    def _headers(self) -> MutableHeaders:
+        return MutableHeaders(scope=self._start)
+
+    def _mark_encoded(self, length: int | None) -> None:
+        headers = self._headers()
+        headers["Content-Encoding"] = self._encoding
+        if length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(length)
+        # The compressed bytes differ from the identity representation
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self._start = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self._passthrough = (
+                message["status"] in (204, 304)
+                or "content-encoding" in headers
+                or content_type.startswith(_INCOMPRESSIBLE)
+            )
+            if not self._passthrough:
+                self._headers().add_vary_header("Accept-Encoding")
+                self._passthrough = self._encoding is None
+            if self._passthrough:
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self._encoder is None:
+            if not more_body:
+                # The whole body at once
+                if len(body) < self._minimum_size:
+                    await self._send(self._start)
+                    await self._send(message)
+                    return
+                compressed = _compress(body, self._encoding)
+                self._mark_encoded(len(compressed))
+                await self._send(self._start)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+            self._encoder = _Encoder(self._encoding)
+            self._mark_encoded(None)
+            await self._send(self._start)
+
+        data = self._encoder.chunk(body) if body else b""
+        if not more_body:
+            data += self._encoder.finish()
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -0,0 +1,73 @@
+"""Strong ETags for read endpoints, from a cheap version check.
+
+A collection's version is a counter that every write changing what the API
+returns bumps once it has committed (`bump`), plus its newest `updated_at`
+and document count in case a bump was lost. `updated_at` alone is not
+enough: it is stamped before the write commits, so a write that commits
+late with an older stamp would leave it unchanged. Answering
+`If-None-Match` with 304 never runs the full query or serializes anything.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+
+from fastapi import Request, Response
+from pymongo.errors import PyMongoError
+
+from src.database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Conditional responses must still be revalidated on every use
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(request: Request, *version) -> str:
+    """An ETag for this URL (path and query) at `version`."""
+    key = repr((request.url.path, sorted(request.query_params.multi_items()), version))
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:24] + '"'
+
+
+def _counter_id(name: str) -> str:
+    return f"{name}_version"
+
+
+async def bump(name: str) -> None:
+    """Change `name`'s version, after a write to it has committed."""
+    try:
+        await get_db().counters.update_one({"_id": _counter_id(name)}, {"$inc": {"value": 1}}, upsert=True)
+    except PyMongoError as e:
+        # The write went through; updated_at and the count still cover most of it
+        logger.warning(f"Could not bump the {name} version: {e}")
+
+
+async def collection_version(name: str) -> tuple:
+    db = get_db()
+    # Read the counter first: a write that commits after this bumps it again
+    counter = await db.counters.find_one({"_id": _counter_id(name)})
+    collection = db[name]
+    newest = await collection.find_one({}, {"updated_at": 1, "_id": 0}, sort=[("updated_at", -1)])
+    return (
+        (counter or {}).get("value", 0),
+        (newest or {}).get("updated_at"),
+        await collection.estimated_document_count(),
+    )
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """A 304 if the client already holds `etag`, else None."""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return None
+    tags = {tag.strip() for tag in header.split(",")}
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    if "*" in tags or etag in tags or f"W/{etag}" in tags:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
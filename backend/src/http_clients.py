@@ -0,0 +1,70 @@
+"""Pooled httpx clients, one per upstream host.
+
+Reusing a client keeps connections alive between calls, so a publish or a
+generation request does not pay a fresh TCP+TLS handshake each time.
+Clients are created lazily and closed by `close_http_clients()`, which the
+FastAPI lifespan and the publisher entry points call on shutdown.
+"""
+
+from __future__ import annotations
+
+import logging
+from urllib.parse import urlsplit
+
+import httpx
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Per-host pool limits and timeouts; anything else (e.g. LinkedIn upload
+# hosts) gets DEFAULT_SETTINGS.
+DEFAULT_SETTINGS = {"timeout": 30.0, "max_connections": 10}
+HOST_SETTINGS: dict[str, dict] = {
+    "api.linkedin.com": {"timeout": 30.0, "max_connections": 20},
+    "www.linkedin.com": {"timeout": 15.0, "max_connections": 5},
+    "api.openai.com": {"timeout": 60.0, "max_connections": 10},
+    "api.anthropic.com": {"timeout": 60.0, "max_connections": 10},
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+_http2 = config.HTTP2_ENABLED and _http2_available()
+if config.HTTP2_ENABLED and not _http2:
+    logger.warning("HTTP2_ENABLED is set but the 'h2' package is missing; using HTTP/1.1")
+
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    """Return the shared client for the host serving `url`."""
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    client = _clients.get(origin)
+    if client is None or client.is_closed:
+        settings = HOST_SETTINGS.get(parts.hostname or "", DEFAULT_SETTINGS)
+        client = httpx.AsyncClient(
+            http2=_http2,
+            timeout=settings["timeout"],
+            limits=httpx.Limits(
+                max_connections=settings["max_connections"],
+                max_keepalive_connections=settings["max_connections"],
+                keepalive_expiry=config.HTTP_KEEPALIVE_SECONDS,
+            ),
+        )
+        _clients[origin] = client
+    return client
+
+
+async def close_http_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
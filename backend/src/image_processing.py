@@ -0,0 +1,106 @@
+"""Shrink uploaded images for LinkedIn in a worker process pool.
+
+Decoding, resizing and re-encoding are CPU-bound, so they run in a
+ProcessPoolExecutor and never block the event loop. Images are downscaled
+to fit LinkedIn's feed dimensions, stripped of metadata (EXIF incl. GPS,
+ICC profile) and re-encoded: JPEG for opaque images, optimized PNG when
+there is transparency. Animated GIFs pass through.
+
+Pillow is optional; without it images are stored exactly as uploaded.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# LinkedIn renders feed images at most 1200 px wide; 4:5 portrait is the
+# tallest ratio shown without cropping.
+MAX_WIDTH = 1200
+MAX_HEIGHT = 1500
+JPEG_QUALITY = 85
+MAX_PIXELS = 50_000_000  # refuse decompression bombs
+
+_pool: ProcessPoolExecutor | None = None
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def optimize_image_sync(data: bytes, content_type: str) -> tuple[bytes, str]:
+    """Return (bytes, content_type) of the optimized image.
+
+    Returns the input unchanged when re-encoding would not make it smaller.
+    Runs in a worker process.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        raise InvalidImage("Unsupported or corrupt image") from e
+
+    if getattr(img, "is_animated", False):
+        return data, content_type
+
+    resized = img.width > MAX_WIDTH or img.height > MAX_HEIGHT
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((MAX_WIDTH, MAX_HEIGHT), Image.Resampling.LANCZOS)
+
+    out = io.BytesIO()
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    if has_alpha:
+        img.save(out, format="PNG", optimize=True)
+        new_type = "image/png"
+    else:
+        img.convert("RGB").save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        new_type = "image/jpeg"
+
+    optimized = out.getvalue()
+    if not resized and len(optimized) >= len(data):
+        return data, content_type
+    return optimized, new_type
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=config.IMAGE_WORKERS)
+    return _pool
+
+
+_pillow = _pillow_available()
+if not _pillow:
+    logger.warning("Pillow is not installed; images are stored without optimization")
+
+
+async def optimize_image(data: bytes, content_type: str) -> tuple[bytes, str]:
+    """Optimize an image off the event loop. Raises InvalidImage."""
+    if not _pillow:
+        return data, content_type
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), optimize_image_sync, data, content_type)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
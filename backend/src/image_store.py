@@ -0,0 +1,341 @@
+"""Post images in GridFS, referenced from post_queue by `image_id`.
+
+Keeping the bytes out of the post documents keeps queue queries small;
+images are read back in GridFS-sized chunks and streamed to LinkedIn.
+
+Uploads are written with `ImageWriter`, which stores GridFS chunk documents
+as bytes arrive and only creates the file document once the image is
+complete, so a partial upload never shows up as a file.
+
+Stored images are content-addressed: the `images` collection has one entry
+per sha256 (`_id`), pointing at a single GridFS file and counting the posts
+that reference it. Posts carry `image_hash` plus a denormalized `image_id`,
+`image_size` and `image_content_type`. The entry also caches the LinkedIn
+image URN per account, so an image already uploaded to LinkedIn is reused
+instead of uploaded again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator
+
+from bson import Binary, ObjectId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import config
+from src.database import get_db
+
+logger = logging.getLogger(__name__)
+
+BUCKET_NAME = "post_images"
+CHUNK_SIZE = 255 * 1024  # GridFS default
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+class CheckpointLost(Exception):
+    """The stored partial chunk an upload would resume after is missing or short."""
+
+
+def get_bucket() -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(get_db(), bucket_name=BUCKET_NAME, chunk_size_bytes=CHUNK_SIZE)
+
+
+class ImageWriter:
+    """Incrementally write one image into the GridFS bucket.
+
+    Full chunks are stored as soon as they fill up; `checkpoint()` also
+    stores the trailing partial chunk so an upload can resume from `offset`
+    in a later request.
+    """
+
+    def __init__(self, file_id: ObjectId | None = None, offset: int = 0, tail: bytes = b""):
+        self.file_id = file_id or ObjectId()
+        self.offset = offset
+        self._buffer = bytearray(tail)
+        self._n = (offset - len(tail)) // CHUNK_SIZE
+        # sha256 state cannot be persisted, so only a writer that saw every
+        # byte can hash on the fly; resumed writers rehash in finish().
+        self._hasher = hashlib.sha256() if offset == 0 else None
+
+    @classmethod
+    async def resume(cls, file_id: ObjectId, offset: int) -> "ImageWriter":
+        tail = b""
+        if offset % CHUNK_SIZE:
+            chunk = await get_db()[f"{BUCKET_NAME}.chunks"].find_one(
+                {"files_id": file_id, "n": offset // CHUNK_SIZE}
+            )
+            tail = bytes(chunk["data"]) if chunk else b""
+            if len(tail) < offset % CHUNK_SIZE:
+                # Writing on would leave a gap in the file
+                raise CheckpointLost(f"Stored data of {file_id} ends before offset {offset}")
+            # Bytes past `offset` were never acknowledged; the client sends them again
+            tail = tail[:offset % CHUNK_SIZE]
+        return cls(file_id, offset, tail)
+
+    async def _put_chunk(self, n: int, data: bytes) -> None:
+        await get_db()[f"{BUCKET_NAME}.chunks"].replace_one(
+            {"files_id": self.file_id, "n": n},
+            {"files_id": self.file_id, "n": n, "data": Binary(data)},
+            upsert=True,
+        )
+
+    async def write(self, data: bytes) -> None:
+        if self.offset + len(data) > MAX_IMAGE_BYTES:
+            raise ImageTooLarge(f"Image too large (max {MAX_IMAGE_BYTES // (1024 * 1024)} MB)")
+        self.offset += len(data)
+        if self._hasher is not None:
+            self._hasher.update(data)
+        self._buffer += data
+        while len(self._buffer) >= CHUNK_SIZE:
+            await self._put_chunk(self._n, bytes(self._buffer[:CHUNK_SIZE]))
+            del self._buffer[:CHUNK_SIZE]
+            self._n += 1
+
+    async def checkpoint(self) -> None:
+        if self._buffer:
+            await self._put_chunk(self._n, bytes(self._buffer))
+
+    async def finish(self, content_type: str, filename: str = "image") -> str:
+        """Store the file document, making the image readable. Returns its sha256."""
+        await self.checkpoint()
+        if self._hasher is not None:
+            digest = self._hasher.hexdigest()
+        else:
+            hasher = hashlib.sha256()
+            async for chunk in stream_image(self.file_id, require_file=False):
+                hasher.update(chunk)
+            digest = hasher.hexdigest()
+        await get_db()[f"{BUCKET_NAME}.files"].insert_one({
+            "_id": self.file_id,
+            "length": self.offset,
+            "chunkSize": CHUNK_SIZE,
+            "uploadDate": datetime.now(timezone.utc),
+            "filename": filename,
+            "metadata": {"content_type": content_type, "sha256": digest},
+        })
+        return digest
+
+    async def abort(self) -> None:
+        await delete_image(self.file_id)
+
+
+async def save_image(data: bytes, content_type: str, filename: str = "image") -> ObjectId:
+    return await get_bucket().upload_from_stream(
+        filename, data, metadata={"content_type": content_type}
+    )
+
+
+async def stream_image(image_id: ObjectId, require_file: bool = True) -> AsyncIterator[bytes]:
+    """Yield an image's bytes chunk by chunk.
+
+    `require_file=False` reads the chunks of an upload that has no file
+    document yet.
+    """
+    if require_file:
+        grid_out = await get_bucket().open_download_stream(image_id)
+        while True:
+            chunk = await grid_out.readchunk()
+            if not chunk:
+                return
+            yield chunk
+    else:
+        cursor = get_db()[f"{BUCKET_NAME}.chunks"].find({"files_id": image_id}).sort("n", 1)
+        async for chunk in cursor:
+            yield bytes(chunk["data"])
+
+
+async def delete_image(image_id: ObjectId | None) -> None:
+    if image_id is None:
+        return
+    try:
+        await get_bucket().delete(image_id)
+    except NoFile:
+        pass
+
+
+# --- Content-addressed store ---
+
+def _entry_fields(entry: dict) -> dict:
+    """Post fields that reference a store entry."""
+    return {
+        "image_hash": entry["_id"],
+        "image_id": entry["file_id"],
+        "image_size": entry["size"],
+        "image_content_type": entry["content_type"],
+    }
+
+
+async def _acquire(digest: str) -> dict | None:
+    return await get_db().images.find_one_and_update(
+        {"_id": digest},
+        {"$inc": {"refcount": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _register(digest: str, file_id: ObjectId, size: int, content_type: str) -> dict:
+    """Create the entry for a freshly stored file, or join an existing one."""
+    entry = {
+        "_id": digest,
+        "file_id": file_id,
+        "size": size,
+        "content_type": content_type,
+        "refcount": 1,
+        "linkedin_urns": {},
+        "created_at": datetime.now(timezone.utc),
+    }
+    while True:
+        try:
+            await get_db().images.insert_one(entry)
+            return entry
+        except DuplicateKeyError:
+            pass
+        # Someone stored the same bytes meanwhile; keep theirs
+        existing = await _acquire(digest)
+        if existing is not None:
+            if existing["file_id"] != file_id:
+                await delete_image(file_id)
+            return existing
+        # ... and released it again before we could join; register ours after all
+
+
+async def store_image(data: bytes, content_type: str) -> dict:
+    """Take a reference to `data`, storing it only if it is new.
+
+    Returns post fields (`image_hash`, `image_id`, ...) for the entry.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    entry = await _acquire(digest)
+    if entry is None:
+        file_id = await save_image(data, content_type, filename=digest)
+        entry = await _register(digest, file_id, len(data), content_type)
+    return _entry_fields(entry)
+
+
+async def adopt_file(file_id: ObjectId, digest: str, size: int, content_type: str) -> dict:
+    """Take a reference to an already-stored file with known `digest`.
+
+    If that content is stored already, the file is dropped as a duplicate.
+    Returns post fields for the entry.
+    """
+    entry = await _acquire(digest)
+    if entry is None:
+        entry = await _register(digest, file_id, size, content_type)
+    elif entry["file_id"] != file_id:
+        await delete_image(file_id)
+    return _entry_fields(entry)
+
+
+async def release_image(digest: str | None) -> None:
+    """Drop one reference; the bytes go when nothing references them."""
+    if digest is None:
+        return
+    db = get_db()
+    entry = await db.images.find_one_and_update(
+        {"_id": digest},
+        {"$inc": {"refcount": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if entry is None or entry["refcount"] > 0:
+        return
+    result = await db.images.delete_one({"_id": digest, "refcount": {"$lte": 0}})
+    if result.deleted_count:
+        await delete_image(entry["file_id"])
+
+
+async def release_post_image(post: dict) -> None:
+    """Release whatever image a post references (hash, or pre-dedup file id)."""
+    if post.get("image_hash"):
+        await release_image(post["image_hash"])
+    else:
+        await delete_image(post.get("image_id"))
+
+
+async def cached_linkedin_urn(digest: str, account: str) -> str | None:
+    """LinkedIn image URN previously uploaded for this content and account."""
+    entry = await get_db().images.find_one({"_id": digest}, {f"linkedin_urns.{account}": 1})
+    cached = ((entry or {}).get("linkedin_urns") or {}).get(account)
+    if not cached:
+        return None
+    uploaded_at = cached["uploaded_at"]
+    if uploaded_at.tzinfo is None:
+        uploaded_at = uploaded_at.replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) - uploaded_at > timedelta(days=config.LINKEDIN_IMAGE_CACHE_DAYS):
+        return None
+    return cached["urn"]
+
+
+async def cache_linkedin_urn(digest: str, account: str, urn: str) -> None:
+    await get_db().images.update_one(
+        {"_id": digest},
+        {"$set": {f"linkedin_urns.{account}": {"urn": urn, "uploaded_at": datetime.now(timezone.utc)}}},
+    )
+
+
+async def forget_linkedin_urn(digest: str, account: str, urn: str) -> None:
+    await get_db().images.update_one(
+        {"_id": digest, f"linkedin_urns.{account}.urn": urn},
+        {"$unset": {f"linkedin_urns.{account}": ""}},
+    )
+
+
+async def migrate_images() -> int:
+    """Bring stored post images up to the current layout.
+
+    Moves legacy inline `image_data` into the content-addressed store, and
+    registers GridFS files referenced by `image_id` without an `image_hash`.
+    Idempotent and one image at a time, so it is safe to run on every start.
+    """
+    db = get_db()
+    migrated = 0
+
+    cursor = db.post_queue.find(
+        {"image_data": {"$exists": True}},
+        {"image_data": 1, "image_content_type": 1},
+        batch_size=1,
+    )
+    async for doc in cursor:
+        fields = await store_image(bytes(doc["image_data"]), doc.get("image_content_type") or "image/jpeg")
+        result = await db.post_queue.update_one(
+            {"_id": doc["_id"], "image_data": {"$exists": True}},
+            {"$set": fields, "$unset": {"image_data": ""}},
+        )
+        if result.modified_count:
+            migrated += 1
+        else:
+            await release_image(fields["image_hash"])
+
+    cursor = db.post_queue.find(
+        {"image_id": {"$exists": True}, "image_hash": {"$exists": False}},
+        {"image_id": 1, "image_size": 1, "image_content_type": 1},
+        batch_size=1,
+    )
+    async for doc in cursor:
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            async for chunk in stream_image(doc["image_id"]):
+                hasher.update(chunk)
+                size += len(chunk)
+        except NoFile:
+            logger.warning(f"Post {doc['_id']} references a missing image file")
+            continue
+        fields = await adopt_file(
+            doc["image_id"], hasher.hexdigest(), size, doc.get("image_content_type") or "image/jpeg"
+        )
+        await db.post_queue.update_one({"_id": doc["_id"]}, {"$set": fields})
+        migrated += 1
+
+    if migrated:
+        logger.info(f"Migrated {migrated} post images to the content-addressed store")
+    return migrated
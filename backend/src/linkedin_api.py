@@ -3,8 +3,9 @@
 from __future__ import annotations
 
 import logging
+from typing import AsyncIterable
 
-import httpx
+from src.http_clients import get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -39,20 +40,18 @@ async def publish_text_post(access_token: str, person_urn: str, text: str) -> di
         "lifecycleState": "PUBLISHED",
     }
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            POSTS_URL,
-            json=body,
-            headers={**_headers(access_token), "Content-Type": "application/json"},
-            timeout=30,
-        )
-        if resp.status_code == 201:
-            post_id = resp.headers.get("x-restli-id", "")
-            logger.info(f"Published text post: {post_id}")
-            return {"success": True, "post_id": post_id}
+    resp = await get_http_client(POSTS_URL).post(
+        POSTS_URL,
+        json=body,
+        headers={**_headers(access_token), "Content-Type": "application/json"},
+    )
+    if resp.status_code == 201:
+        post_id = resp.headers.get("x-restli-id", "")
+        logger.info(f"Published text post: {post_id}")
+        return {"success": True, "post_id": post_id}
 
-        logger.error(f"LinkedIn post failed: {resp.status_code} {resp.text}")
-        resp.raise_for_status()
+    logger.error(f"LinkedIn post failed: {resp.status_code} {resp.text}")
+    resp.raise_for_status()
 
 
 async def initialize_image_upload(access_token: str, person_urn: str) -> dict:
@@ -63,34 +62,44 @@ async def initialize_image_upload(access_token: str, person_urn: str) -> dict:
         }
     }
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            f"{IMAGES_URL}?action=initializeUpload",
-            json=body,
-            headers={**_headers(access_token), "Content-Type": "application/json"},
-            timeout=30,
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        return {
-            "upload_url": data["value"]["uploadUrl"],
-            "image_urn": data["value"]["image"],
-        }
+    resp = await get_http_client(IMAGES_URL).post(
+        f"{IMAGES_URL}?action=initializeUpload",
+        json=body,
+        headers={**_headers(access_token), "Content-Type": "application/json"},
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    return {
+        "upload_url": data["value"]["uploadUrl"],
+        "image_urn": data["value"]["image"],
+    }
 
 
-async def upload_image_binary(upload_url: str, access_token: str, image_data: bytes, content_type: str) -> None:
-    """Step 2: Upload the image binary to LinkedIn's upload URL."""
-    async with httpx.AsyncClient() as client:
-        resp = await client.put(
-            upload_url,
-            content=image_data,
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": content_type,
-            },
-            timeout=60,
-        )
-        resp.raise_for_status()
+async def upload_image_binary(
+    upload_url: str,
+    access_token: str,
+    image_data: bytes | AsyncIterable[bytes],
+    content_type: str,
+    content_length: int | None = None,
+) -> None:
+    """Step 2: Upload the image binary to LinkedIn's upload URL.
+
+    `image_data` may be an async iterator of chunks; pass `content_length`
+    with it so the body is streamed with a length rather than chunked.
+    """
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": content_type,
+    }
+    if content_length is not None:
+        headers["Content-Length"] = str(content_length)
+    resp = await get_http_client(upload_url).put(
+        upload_url,
+        content=image_data,
+        headers=headers,
+        timeout=60,
+    )
+    resp.raise_for_status()
 
 
 async def publish_image_post(access_token: str, person_urn: str, text: str, image_urn: str) -> dict:
@@ -113,17 +122,15 @@ async def publish_image_post(access_token: str, person_urn: str, text: str, imag
         "lifecycleState": "PUBLISHED",
     }
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            POSTS_URL,
-            json=body,
-            headers={**_headers(access_token), "Content-Type": "application/json"},
-            timeout=30,
-        )
-        if resp.status_code == 201:
-            post_id = resp.headers.get("x-restli-id", "")
-            logger.info(f"Published image post: {post_id}")
-            return {"success": True, "post_id": post_id}
-
-        logger.error(f"LinkedIn image post failed: {resp.status_code} {resp.text}")
-        resp.raise_for_status()
+    resp = await get_http_client(POSTS_URL).post(
+        POSTS_URL,
+        json=body,
+        headers={**_headers(access_token), "Content-Type": "application/json"},
+    )
+    if resp.status_code == 201:
+        post_id = resp.headers.get("x-restli-id", "")
+        logger.info(f"Published image post: {post_id}")
+        return {"success": True, "post_id": post_id}
+
+    logger.error(f"LinkedIn image post failed: {resp.status_code} {resp.text}")
+    resp.raise_for_status()
@@ -5,9 +5,8 @@ from __future__ import annotations
 import secrets
 from urllib.parse import urlencode
 
-import httpx
-
 import config
+from src.http_clients import get_http_client
 
 AUTHORIZE_URL = "https://www.linkedin.com/oauth/v2/authorization"
 TOKEN_URL = "https://www.linkedin.com/oauth/v2/accessToken"
@@ -33,45 +32,42 @@ def build_auth_url(state: str | None = None) -> tuple[str, str]:
 
 async def exchange_code(code: str) -> dict:
     """Exchange authorization code for tokens."""
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            TOKEN_URL,
-            data={
-                "grant_type": "authorization_code",
-                "code": code,
-                "redirect_uri": config.LINKEDIN_CALLBACK_URL,
-                "client_id": config.LINKEDIN_CLIENT_ID,
-                "client_secret": config.LINKEDIN_CLIENT_SECRET,
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        resp.raise_for_status()
-        return resp.json()
+    resp = await get_http_client(TOKEN_URL).post(
+        TOKEN_URL,
+        data={
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": config.LINKEDIN_CALLBACK_URL,
+            "client_id": config.LINKEDIN_CLIENT_ID,
+            "client_secret": config.LINKEDIN_CLIENT_SECRET,
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    resp.raise_for_status()
+    return resp.json()
 
 
 async def refresh_access_token(refresh_token: str) -> dict:
     """Refresh an expired access token."""
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            TOKEN_URL,
-            data={
-                "grant_type": "refresh_token",
-                "refresh_token": refresh_token,
-                "client_id": config.LINKEDIN_CLIENT_ID,
-                "client_secret": config.LINKEDIN_CLIENT_SECRET,
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        resp.raise_for_status()
-        return resp.json()
+    resp = await get_http_client(TOKEN_URL).post(
+        TOKEN_URL,
+        data={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": config.LINKEDIN_CLIENT_ID,
+            "client_secret": config.LINKEDIN_CLIENT_SECRET,
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    resp.raise_for_status()
+    return resp.json()
 
 
 async def get_user_info(access_token: str) -> dict:
     """Fetch the authenticated user's profile from LinkedIn."""
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            USERINFO_URL,
-            headers={"Authorization": f"Bearer {access_token}"},
-        )
-        resp.raise_for_status()
-        return resp.json()
+    resp = await get_http_client(USERINFO_URL).get(
+        USERINFO_URL,
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    resp.raise_for_status()
+    return resp.json()
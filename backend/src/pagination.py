@@ -0,0 +1,76 @@
+"""Keyset (cursor) pagination.
+
+A page is the first `limit` documents after the last one the client saw,
+in (sort key, _id) order. With a compound index on (status, key, _id) each
+page is one index range scan, so page 500 costs the same as page 1.
+
+Cursors are the last document's (key, _id) as BSON, base64url-encoded;
+clients pass them back untouched.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+
+import bson
+from bson.errors import BSONError
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(doc: dict, field: str) -> str:
+    raw = bson.encode({"k": doc.get(field), "id": doc["_id"]})
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = bson.decode(raw)
+        return data["k"], data["id"]
+    except (binascii.Error, BSONError, KeyError, ValueError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def after(field: str, direction: int, cursor: str) -> dict:
+    """Query matching documents after `cursor` in (field, _id) `direction` order.
+
+    Missing/null keys sort first ascending and last descending, as in MongoDB.
+    """
+    key, last_id = decode_cursor(cursor)
+    op = "$gt" if direction == 1 else "$lt"
+    if key is None:
+        if direction == 1:
+            return {"$or": [{field: None, "_id": {op: last_id}}, {field: {"$ne": None}}]}
+        return {field: None, "_id": {op: last_id}}
+    clauses = [{field: {op: key}}, {field: key, "_id": {op: last_id}}]
+    if direction == -1:
+        clauses.append({field: None})
+    return {"$or": clauses}
+
+
+async def page(
+    collection,
+    query: dict,
+    field: str,
+    direction: int,
+    limit: int,
+    cursor: str | None = None,
+    projection: dict | None = None,
+) -> tuple[list[dict], str | None]:
+    """Fetch one page. Returns (documents, cursor for the next page or None)."""
+    if cursor:
+        query = {"$and": [query, after(field, direction, cursor)]}
+    docs = await (
+        collection.find(query, projection)
+        .sort([(field, direction), ("_id", direction)])
+        .limit(limit + 1)
+        .to_list(length=limit + 1)
+    )
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1], field)
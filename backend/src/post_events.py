@@ -0,0 +1,188 @@
+"""Fan-out of post_queue changes to connected clients.
+
+One change stream per API process feeds every subscriber, whatever their
+number. Each change becomes an event with a sequence number; the last
+POST_EVENTS_BUFFER events are kept so a client that reconnects with the last
+id it saw gets exactly what it missed. If the stream drops, it is reopened
+from its resume token, so no change is lost in between.
+
+Standalone MongoDB servers have no change streams. There the hub polls
+`updated_at` instead, and deletes are reported by the API process that made
+them (see `deleted`). `updated_at` is stamped before a write commits, and a
+bulk write gives its whole batch one stamp, so each poll looks
+_POLL_LOOKBACK back again and skips the versions it has already sent.
+
+Events: {"type": "post", "post": <document>}, {"type": "delete", "_id": ...},
+or {"type": "resync"} when a client has missed events that are no longer
+buffered and should reload.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+import config
+from src.database import get_db
+from src.serialization import POST_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+RESYNC = {"type": "resync"}
+
+# The resume token is older than the oplog; the missed changes are gone
+_HISTORY_LOST = 286
+# Pause before reopening a failed stream
+_RETRY_SECONDS = 1.0
+# How long after its updated_at stamp a polled write may still commit
+_POLL_LOOKBACK = timedelta(seconds=30)
+
+_PIPELINE = [
+    {"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}},
+    {"$project": {"fullDocument.image_data": 0}},
+]
+
+
+class Subscription:
+    """A client's queue of (event id, event) pairs."""
+
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[tuple[str, dict]] = asyncio.Queue(maxsize=config.POST_EVENTS_QUEUE_SIZE)
+
+    def put(self, event_id: str, event: dict) -> None:
+        try:
+            self.queue.put_nowait((event_id, event))
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop the backlog and have it reload instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((event_id, RESYNC))
+
+
+class PostEventHub:
+    def __init__(self) -> None:
+        # Event ids are only meaningful to the process that issued them
+        self._epoch = os.urandom(4).hex()
+        self._seq = 0
+        self._recent: deque[tuple[int, dict]] = deque(maxlen=config.POST_EVENTS_BUFFER)
+        self._subscribers: set[Subscription] = set()
+        self._resume_token: dict | None = None
+        self._streaming = False
+        self._task: asyncio.Task | None = None
+
+    # --- Subscribers ---
+
+    def _event_id(self, seq: int) -> str:
+        return f"{self._epoch}-{seq}"
+
+    def subscribe(self, last_event_id: str | None = None) -> Subscription:
+        """Register a client, queueing whatever it missed since `last_event_id`."""
+        sub = Subscription()
+        self._subscribers.add(sub)
+        if last_event_id:
+            epoch, _, seq = last_event_id.partition("-")
+            oldest = self._recent[0][0] if self._recent else self._seq + 1
+            if epoch != self._epoch or not seq.isdigit() or int(seq) + 1 < oldest:
+                sub.put(self._event_id(self._seq), RESYNC)
+            else:
+                for n, event in self._recent:
+                    if n > int(seq):
+                        sub.put(self._event_id(n), event)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._subscribers.discard(sub)
+
+    def _publish(self, event: dict) -> None:
+        self._seq += 1
+        self._recent.append((self._seq, event))
+        event_id = self._event_id(self._seq)
+        for sub in self._subscribers:
+            sub.put(event_id, event)
+
+    def deleted(self, post_ids: list[ObjectId]) -> None:
+        """Report deletes made by this process; the change stream covers them otherwise."""
+        if not self._streaming:
+            for post_id in post_ids:
+                self._publish({"type": "delete", "_id": str(post_id)})
+
+    # --- Feed ---
+
+    def _apply_change(self, change: dict) -> None:
+        if change["operationType"] == "delete":
+            self._publish({"type": "delete", "_id": str(change["documentKey"]["_id"])})
+        elif change.get("fullDocument"):
+            self._publish({"type": "post", "post": change["fullDocument"]})
+        # An update to a post deleted since has no fullDocument; its delete follows
+
+    async def _watch(self) -> None:
+        """Follow the change stream, reopening it from the last resume token."""
+        db = get_db()
+        while True:
+            try:
+                async with db.post_queue.watch(
+                    _PIPELINE, full_document="updateLookup", resume_after=self._resume_token
+                ) as stream:
+                    self._streaming = True
+                    logger.info("Streaming post_queue changes to clients")
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        self._apply_change(change)
+            except OperationFailure as e:
+                if e.code == _HISTORY_LOST:
+                    logger.warning("Post change stream fell too far behind, clients will reload")
+                    self._resume_token = None
+                    self._publish(RESYNC)
+                    continue
+                if not self._streaming:
+                    # Standalone servers (the default compose setup) have no change streams.
+                    logger.info(f"Change stream unavailable ({e.code}), polling every {config.POST_EVENTS_POLL_SECONDS}s")
+                    return await self._poll()
+                logger.warning(f"Post change stream failed, resuming: {e}")
+            except PyMongoError as e:
+                logger.warning(f"Post change stream failed, resuming: {e}")
+            await asyncio.sleep(_RETRY_SECONDS)
+
+    async def _poll(self) -> None:
+        db = get_db()
+        since = datetime.now(timezone.utc)
+        # (post id, updated_at) of the versions sent within the lookback
+        sent: set[tuple[ObjectId, datetime]] = set()
+        while True:
+            await asyncio.sleep(config.POST_EVENTS_POLL_SECONDS)
+            try:
+                cursor = db.post_queue.find(
+                    {"updated_at": {"$gte": since - _POLL_LOOKBACK}}, POST_PROJECTION
+                ).sort("updated_at", 1)
+                async for doc in cursor:
+                    stamp = doc["updated_at"]
+                    if stamp.tzinfo is None:
+                        stamp = stamp.replace(tzinfo=timezone.utc)
+                    if (doc["_id"], stamp) in sent:
+                        continue
+                    sent.add((doc["_id"], stamp))
+                    self._publish({"type": "post", "post": doc})
+                    since = max(since, stamp)
+            except PyMongoError as e:
+                logger.warning(f"Post change poll failed: {e}")
+            sent = {(post_id, stamp) for post_id, stamp in sent if stamp >= since - _POLL_LOOKBACK}
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._streaming = False
+
+
+hub = PostEventHub()
@@ -0,0 +1,175 @@
+"""Create, update and delete posts in batches.
+
+Shared by the single-post endpoints, the bulk endpoints and the import.
+Each batch costs a fixed number of round trips whatever its size: ranks
+come from one counter increment, slots are claimed with one reserve_many,
+and posts are written with one insert_many or bulk_write. Results are
+reported per row, in input order.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from src import etags, image_store, queue_order, slot_reservations
+from src.post_events import hub
+from src.database import get_db
+from src.schemas import PostCreate, PostUpdate
+
+SLOT_TAKEN = "That time slot is already taken"
+NOT_FOUND = "Post not found"
+
+# Statuses whose post occupies its scheduled_time slot
+_HOLDING = ("scheduled", "publishing", "published")
+
+
+def holds_slot(status: str, slot: datetime | None) -> bool:
+    return status in _HOLDING and slot is not None
+
+
+def _as_utc(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def new_post_doc(body: PostCreate, post_id: ObjectId, rank: float, now: datetime) -> dict:
+    return {
+        "_id": post_id,
+        "content": body.content,
+        "post_type": body.post_type.value,
+        "status": body.status.value,
+        "scheduled_time": body.scheduled_time,
+        "queue_order": rank,
+        "image_urn": None,
+        "linkedin_post_id": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def changed_fields(body: PostUpdate) -> dict:
+    """The fields a PostUpdate sets, with enums as their stored values."""
+    fields = body.model_dump(exclude_none=True, exclude={"id"})
+    for key in ("post_type", "status"):
+        if key in fields:
+            fields[key] = fields[key].value
+    return fields
+
+
+def update_spec(fields: dict) -> dict:
+    """The update document for a set of changed fields (enums already converted)."""
+    # Edited posts are checked again by the lookahead stage
+    update = {"$set": fields, "$unset": {"prestaged_at": ""}}
+    if "status" in fields or "scheduled_time" in fields:
+        # A manual reschedule starts over with a clean retry state
+        update["$unset"].update({"attempts": "", "next_attempt_at": ""})
+    return update
+
+
+def _ok(post_id: ObjectId) -> dict:
+    return {"ok": True, "_id": str(post_id)}
+
+
+def _error(message: str, post_id: ObjectId | str | None = None) -> dict:
+    result = {"ok": False, "error": message}
+    if post_id is not None:
+        result["_id"] = str(post_id)
+    return result
+
+
+async def create_posts(bodies: list[PostCreate], post_ids: list[ObjectId] | None = None) -> list[dict]:
+    """Append posts to the end of the queue, in order, with new ids unless given."""
+    if not bodies:
+        return []
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    ranks = await queue_order.next_ranks(len(bodies))
+    post_ids = post_ids or [ObjectId() for _ in bodies]
+    docs = [new_post_doc(body, post_id, rank, now) for body, post_id, rank in zip(bodies, post_ids, ranks)]
+
+    results: list[dict | None] = [None] * len(docs)
+    wanted = [i for i, doc in enumerate(docs) if holds_slot(doc["status"], doc["scheduled_time"])]
+    claimed = await slot_reservations.reserve_many(
+        [(docs[i]["_id"], docs[i]["scheduled_time"]) for i in wanted]
+    )
+    for i, ok in zip(wanted, claimed):
+        if not ok:
+            results[i] = _error(SLOT_TAKEN)
+
+    to_insert = [doc for doc, result in zip(docs, results) if result is None]
+    if to_insert:
+        try:
+            await db.post_queue.insert_many(to_insert, ordered=False)
+        finally:
+            await etags.bump("post_queue")
+    return [result or _ok(doc["_id"]) for doc, result in zip(docs, results)]
+
+
+async def update_posts(changes: list[tuple[ObjectId, dict]]) -> list[dict]:
+    """Apply `fields` to each post. Rescheduling claims the new slot first."""
+    if not changes:
+        return []
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    current = {
+        doc["_id"]: doc
+        async for doc in db.post_queue.find(
+            {"_id": {"$in": [post_id for post_id, _ in changes]}}, {"status": 1, "scheduled_time": 1}
+        )
+    }
+
+    results: list[dict | None] = [None] * len(changes)
+    claims: list[tuple[int, ObjectId, datetime]] = []
+    for i, (post_id, fields) in enumerate(changes):
+        doc = current.get(post_id)
+        if doc is None:
+            results[i] = _error(NOT_FOUND, post_id)
+            continue
+        status = fields.get("status", doc["status"])
+        slot = fields.get("scheduled_time", doc.get("scheduled_time"))
+        if holds_slot(status, slot):
+            claims.append((i, post_id, slot))
+    claimed = await slot_reservations.reserve_many([(post_id, slot) for _, post_id, slot in claims])
+    kept = {}
+    for (i, post_id, slot), ok in zip(claims, claimed):
+        if ok:
+            kept[i] = slot
+        else:
+            results[i] = _error(SLOT_TAKEN, post_id)
+
+    ops, released = [], []
+    for i, (post_id, fields) in enumerate(changes):
+        if results[i] is not None:
+            continue
+        ops.append(UpdateOne({"_id": post_id}, update_spec({**fields, "updated_at": now})))
+        old_slot = current[post_id].get("scheduled_time")
+        if old_slot is not None and (i not in kept or _as_utc(kept[i]) != _as_utc(old_slot)):
+            released.append((post_id, old_slot))
+        results[i] = _ok(post_id)
+    if ops:
+        try:
+            await db.post_queue.bulk_write(ops, ordered=False)
+        finally:
+            await etags.bump("post_queue")
+    await slot_reservations.release_claims(released)
+    return results
+
+
+async def delete_posts(post_ids: list[ObjectId]) -> list[dict]:
+    db = get_db()
+    docs = await db.post_queue.find(
+        {"_id": {"$in": post_ids}}, {"image_id": 1, "image_hash": 1}
+    ).to_list(length=None)
+    found = {doc["_id"] for doc in docs}
+    await db.post_queue.delete_many({"_id": {"$in": list(found)}})
+    await etags.bump("post_queue")
+    for doc in docs:
+        if doc.get("image_id") or doc.get("image_hash"):
+            await image_store.release_post_image(doc)
+    await slot_reservations.release_posts(list(found))
+    hub.deleted(list(found))
+    return [_ok(post_id) if post_id in found else _error(NOT_FOUND, post_id) for post_id in post_ids]
+
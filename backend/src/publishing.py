@@ -0,0 +1,402 @@
+"""Lease-based post claiming and the shared LinkedIn publish path.
+
+A worker owns a post only after claiming it with a single atomic
+`find_one_and_update` that flips it to `publishing` and stamps a worker id and
+a lease expiry. Expired leases are reclaimed by the next worker, except while
+the final create call is in flight (`publish_stage: "posting"`): LinkedIn may
+already have the post, so those are failed for manual review rather than
+published twice.
+
+Every post gets a stable `idempotency_key` on its first claim. LinkedIn has
+no idempotency header, so it is only a local correlation id for the logs;
+duplicate creates are prevented by never retrying a create whose outcome is
+unknown (see `src.retry`). Completion, failure and
+rescheduling are fenced on the current claim (`lease_owner` and status
+`publishing`), so a worker whose lease was taken over cannot overwrite the
+new owner's outcome; its late result is logged and dropped.
+
+Retryable failures (see `src.retry`) put the post back to `scheduled` with an
+`attempts` count and a `next_attempt_at`; claims skip it until then, and
+skip every post scheduled after it too, so posts still go out in
+scheduled_time order.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import secrets
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+import config
+from src import etags
+from src.database import get_db
+from src.image_store import (
+    stream_image,
+    release_post_image,
+    cached_linkedin_urn,
+    cache_linkedin_urn,
+    forget_linkedin_urn,
+)
+from src.retry import classify, backoff_delay
+from src.linkedin_api import (
+    publish_text_post,
+    initialize_image_upload,
+    upload_image_binary,
+    publish_image_post,
+)
+
+logger = logging.getLogger(__name__)
+
+class PublishDeferred(Exception):
+    """A publish failed with a retryable error and was rescheduled."""
+
+    def __init__(self, error: BaseException, retry_at: datetime, throttled: bool):
+        super().__init__(f"{error} (retrying at {retry_at.isoformat()})")
+        self.error = error
+        self.retry_at = retry_at
+        self.throttled = throttled
+
+
+STRANDED_ERROR = (
+    "Publisher stopped while creating this post on LinkedIn. "
+    "Check LinkedIn before retrying to avoid a duplicate."
+)
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{secrets.token_hex(3)}"
+
+
+def _claim_update(worker_id: str, now: datetime, manual: bool = False) -> list[dict]:
+    # Pipeline update so the correlation key is only minted on the first claim.
+    # A manual publish starts a fresh run of attempts.
+    attempts = 1 if manual else {"$add": [{"$ifNull": ["$attempts", 0]}, 1]}
+    return [
+        {
+            "$set": {
+                "status": "publishing",
+                "publish_stage": "claimed",
+                "lease_owner": {"$literal": worker_id},
+                "lease_expires_at": now + timedelta(seconds=config.PUBLISH_LEASE_SECONDS),
+                "idempotency_key": {"$ifNull": ["$idempotency_key", uuid.uuid4().hex]},
+                "attempts": attempts,
+                "updated_at": now,
+            }
+        }
+    ]
+
+
+def _expired_lease(now: datetime) -> dict:
+    return {
+        "status": "publishing",
+        "lease_expires_at": {"$lt": now},
+        "publish_stage": {"$ne": "posting"},
+    }
+
+
+async def _held_back_from(now: datetime) -> datetime | None:
+    """scheduled_time of the earliest post waiting out a retry delay, if any."""
+    waiting = await get_db().post_queue.find_one(
+        {"status": "scheduled", "next_attempt_at": {"$gt": now}},
+        {"scheduled_time": 1},
+        sort=[("scheduled_time", 1)],
+    )
+    return waiting["scheduled_time"] if waiting else None
+
+
+async def claim_next_due(worker_id: str) -> dict | None:
+    """Claim the earliest due post (or expired lease). Returns it, or None.
+
+    Posts scheduled after one that is waiting to be retried wait behind it.
+    """
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    due = {"$lte": now}
+    if (held := await _held_back_from(now)) is not None:
+        due["$lt"] = held
+    post = await db.post_queue.find_one_and_update(
+        {
+            "$or": [
+                {
+                    "status": "scheduled",
+                    "scheduled_time": due,
+                    "$or": [{"next_attempt_at": None}, {"next_attempt_at": {"$lte": now}}],
+                },
+                _expired_lease(now),
+            ]
+        },
+        _claim_update(worker_id, now),
+        sort=[("scheduled_time", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+    if post is not None:
+        await etags.bump("post_queue")
+    return post
+
+
+async def claim_post(post_id: ObjectId, worker_id: str) -> dict | None:
+    """Claim one specific post (publish-now). Returns it, or None if taken."""
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    post = await db.post_queue.find_one_and_update(
+        {
+            "_id": post_id,
+            "$or": [
+                {"status": {"$in": ["draft", "scheduled", "failed"]}},
+                _expired_lease(now),
+            ],
+        },
+        _claim_update(worker_id, now, manual=True),
+        return_document=ReturnDocument.AFTER,
+    )
+    if post is not None:
+        await etags.bump("post_queue")
+    return post
+
+
+async def _enter_posting(post: dict, worker_id: str) -> bool:
+    """Mark the final create call as started. False means the lease was lost."""
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    result = await db.post_queue.update_one(
+        {"_id": post["_id"], "status": "publishing", "lease_owner": worker_id},
+        {
+            "$set": {
+                "publish_stage": "posting",
+                "lease_expires_at": now + timedelta(seconds=config.PUBLISH_LEASE_SECONDS),
+                "updated_at": now,
+            }
+        },
+    )
+    if result.matched_count == 0:
+        return False
+    await etags.bump("post_queue")
+    return True
+
+
+def _claimed_by(post: dict, worker_id: str) -> dict:
+    """Filter matching `post` only while `worker_id` still holds its claim."""
+    return {"_id": post["_id"], "status": "publishing", "lease_owner": worker_id}
+
+
+async def complete_claim(
+    post: dict, worker_id: str, linkedin_post_id: str | None, image_urn: str | None = None
+) -> bool:
+    """Record a publish. False if the claim was lost, in which case nothing is written."""
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    result = await db.post_queue.update_one(
+        _claimed_by(post, worker_id),
+        {
+            "$set": {
+                "status": "published",
+                "linkedin_post_id": linkedin_post_id,
+                "image_urn": image_urn,
+                "published_at": now,
+                "error": None,
+                "updated_at": now,
+            },
+            "$unset": {
+                "image_data": "",
+                "image_id": "",
+                "image_hash": "",
+                "publish_stage": "",
+                "lease_owner": "",
+                "lease_expires_at": "",
+                "next_attempt_at": "",
+            },
+        },
+    )
+    if result.matched_count == 0:
+        logger.warning(
+            f"Post {post['_id']} was published as {linkedin_post_id} after its claim was lost; "
+            "the result was not recorded"
+        )
+        return False
+    await etags.bump("post_queue")
+    return True
+
+
+async def fail_claim(post: dict, worker_id: str, error: str) -> None:
+    db = get_db()
+    await db.post_queue.update_one(
+        _claimed_by(post, worker_id),
+        {
+            "$set": {
+                "status": "failed",
+                "error": error,
+                "updated_at": datetime.now(timezone.utc),
+            },
+            "$unset": {
+                "publish_stage": "",
+                "lease_owner": "",
+                "lease_expires_at": "",
+                "next_attempt_at": "",
+            },
+        },
+    )
+    await etags.bump("post_queue")
+
+
+async def defer_claim(
+    post: dict, worker_id: str, retry_at: datetime, error: str, refund_attempt: bool = False
+) -> None:
+    """Hand a claimed post back to the schedule, to be retried at `retry_at`.
+
+    `refund_attempt` is for posts that were never tried (e.g. held back
+    because the account is being throttled).
+    """
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    fields = {
+        "status": "scheduled",
+        # publish-now on a draft has no slot; retry it as due now
+        "scheduled_time": {"$ifNull": ["$scheduled_time", now]},
+        "next_attempt_at": retry_at,
+        # A pipeline reads "$..." strings as field paths; provider messages are data
+        "error": {"$literal": error},
+        "updated_at": now,
+    }
+    if refund_attempt:
+        fields["attempts"] = {"$subtract": ["$attempts", 1]}
+    await db.post_queue.update_one(
+        _claimed_by(post, worker_id),
+        [
+            {"$set": fields},
+            {"$unset": ["publish_stage", "lease_owner", "lease_expires_at"]},
+        ],
+    )
+    await etags.bump("post_queue")
+
+
+async def _record_failure(post: dict, worker_id: str, exc: BaseException, creates: bool = False) -> None:
+    """Fail or reschedule a claimed post. Raises PublishDeferred if rescheduled."""
+    decision = classify(exc, creates=creates)
+    attempts = post.get("attempts", 1)
+    if not decision.retryable or attempts >= config.PUBLISH_MAX_ATTEMPTS:
+        await fail_claim(post, worker_id, str(exc))
+        return
+
+    delay = backoff_delay(attempts, decision.retry_after)
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+    await defer_claim(post, worker_id, retry_at, str(exc))
+    logger.warning(f"Post {post['_id']} attempt {attempts} failed, retrying in {delay:.0f}s: {exc}")
+    raise PublishDeferred(exc, retry_at, decision.throttled) from exc
+
+
+async def recover_stranded() -> int:
+    """Fail posts whose worker died mid-create (or pre-lease `publishing` docs)."""
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    result = await db.post_queue.update_many(
+        {
+            "status": "publishing",
+            "$or": [
+                {"publish_stage": "posting", "lease_expires_at": {"$lt": now}},
+                {"lease_expires_at": {"$exists": False}},
+            ],
+        },
+        {
+            "$set": {"status": "failed", "error": STRANDED_ERROR, "updated_at": now},
+            "$unset": {"publish_stage": "", "lease_owner": "", "lease_expires_at": ""},
+        },
+    )
+    if result.modified_count:
+        await etags.bump("post_queue")
+        logger.warning(f"Marked {result.modified_count} stranded posts as failed")
+    return result.modified_count
+
+
+async def ensure_linkedin_image(post: dict, access_token: str, person_urn: str) -> str | None:
+    """Make sure a post's image exists on LinkedIn for this account.
+
+    Returns the image URN (None for text posts). Content this account has
+    already uploaded reuses the cached URN; otherwise the image is uploaded
+    and its URN cached. Raises on upload failure.
+    """
+    digest = post.get("image_hash")
+    if digest:
+        cached = await cached_linkedin_urn(digest, person_urn)
+        if cached:
+            return cached
+
+    if post.get("image_id"):
+        image_data, length = stream_image(post["image_id"]), post.get("image_size")
+    elif post.get("image_data"):
+        # Inline image not yet moved to GridFS by migrate_images()
+        image_data, length = post["image_data"], None
+    else:
+        return None
+
+    init = await initialize_image_upload(access_token, person_urn)
+    await upload_image_binary(
+        init["upload_url"],
+        access_token,
+        image_data,
+        post.get("image_content_type", "image/jpeg"),
+        content_length=length,
+    )
+    if digest:
+        await cache_linkedin_urn(digest, person_urn, init["image_urn"])
+    return init["image_urn"]
+
+
+async def stage_image(post: dict, worker_id: str, access_token: str, person_urn: str) -> str | None:
+    """Get a claimed post's image onto LinkedIn. Returns the image URN, if any.
+
+    Free when the image was pre-staged or already used by this account.
+    Order-independent, so the publisher runs it ahead of the create call.
+    Raises on failure after marking the post failed (or PublishDeferred if
+    it was rescheduled).
+    """
+    try:
+        return await ensure_linkedin_image(post, access_token, person_urn)
+    except Exception as e:
+        await _record_failure(post, worker_id, e)
+        raise
+
+
+async def create_claimed(
+    post: dict, worker_id: str, access_token: str, person_urn: str, image_urn: str | None
+) -> dict:
+    """Create the LinkedIn post for a claimed (and staged) post and record it.
+
+    Raises on failure after marking the post failed (or PublishDeferred if
+    it was rescheduled).
+    """
+    if not await _enter_posting(post, worker_id):
+        raise RuntimeError("Publish lease lost before posting")
+
+    try:
+        logger.info(f"Creating LinkedIn post for {post['_id']} (key {post['idempotency_key']})")
+        if image_urn:
+            result = await publish_image_post(access_token, person_urn, post["content"], image_urn)
+        else:
+            result = await publish_text_post(access_token, person_urn, post["content"])
+    except Exception as e:
+        if image_urn and post.get("image_hash") and isinstance(e, httpx.HTTPStatusError):
+            # The cached image may have been rejected; upload afresh next time
+            await forget_linkedin_urn(post["image_hash"], person_urn, image_urn)
+        await _record_failure(post, worker_id, e, creates=True)
+        raise
+
+    if await complete_claim(post, worker_id, result.get("post_id"), image_urn):
+        # LinkedIn has its own copy now
+        await release_post_image(post)
+    return result
+
+
+async def publish_claimed(post: dict, worker_id: str, access_token: str, person_urn: str) -> dict:
+    """Publish a claimed post to LinkedIn and record the outcome.
+
+    Raises on failure after marking the post failed.
+    """
+    image_urn = await stage_image(post, worker_id, access_token, person_urn)
+    return await create_claimed(post, worker_id, access_token, person_urn, image_urn)
@@ -0,0 +1,152 @@
+"""Fractional ordering keys for the post queue.
+
+`queue_order` is a float. New posts go to the end, RANK_STEP past the
+highest key handed out so far, taken from an atomic counter rather than a
+max() query. Moving a post between two neighbours gives it the midpoint of
+their keys, so a move rewrites only that one post. When the gap between
+neighbours runs out of float precision, the whole queue is renumbered in a
+single bulk_write.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from src import etags
+from src.database import get_db
+
+RANK_STEP = 1024.0
+COUNTER_ID = "queue_order"
+
+QUEUED = ["draft", "scheduled"]
+
+
+class NotAdjacent(ValueError):
+    pass
+
+
+async def init_counter() -> None:
+    """Start the counter above any existing key. Runs on startup."""
+    db = get_db()
+    last = await db.post_queue.find_one({}, {"queue_order": 1}, sort=[("queue_order", -1)])
+    highest = float((last or {}).get("queue_order") or 0)
+    await db.counters.update_one({"_id": COUNTER_ID}, {"$max": {"value": highest}}, upsert=True)
+
+
+async def next_ranks(count: int) -> list[float]:
+    """Keys for `count` posts appended to the end of the queue, in order."""
+    counter = await get_db().counters.find_one_and_update(
+        {"_id": COUNTER_ID},
+        {"$inc": {"value": RANK_STEP * count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    first = counter["value"] - RANK_STEP * (count - 1)
+    return [first + RANK_STEP * i for i in range(count)]
+
+
+async def next_rank() -> float:
+    """Key for a post appended to the end of the queue."""
+    return (await next_ranks(1))[0]
+
+
+async def _raise_counter(value: float) -> None:
+    await get_db().counters.update_one({"_id": COUNTER_ID}, {"$max": {"value": value}}, upsert=True)
+
+
+async def renumber(post_ids: list[ObjectId]) -> None:
+    """Give `post_ids` evenly spaced keys in this order, in one bulk_write."""
+    if not post_ids:
+        return
+    now = datetime.now(timezone.utc)
+    await get_db().post_queue.bulk_write(
+        [
+            UpdateOne({"_id": post_id}, {"$set": {"queue_order": (i + 1) * RANK_STEP, "updated_at": now}})
+            for i, post_id in enumerate(post_ids)
+        ],
+        ordered=False,
+    )
+    await etags.bump("post_queue")
+    await _raise_counter(len(post_ids) * RANK_STEP)
+
+
+async def _renumber_queue() -> None:
+    cursor = get_db().post_queue.find({"status": {"$in": QUEUED}}, {"_id": 1}).sort(
+        [("queue_order", 1), ("_id", 1)]
+    )
+    await renumber([doc["_id"] async for doc in cursor])
+
+
+async def _adjacent(rank: float, forward: bool, exclude: ObjectId) -> float | None:
+    """Key of the queued post right after (or before) `rank`, other than `exclude`."""
+    doc = await get_db().post_queue.find_one(
+        {
+            "status": {"$in": QUEUED},
+            "queue_order": {"$gt": rank} if forward else {"$lt": rank},
+            "_id": {"$ne": exclude},
+        },
+        {"queue_order": 1},
+        sort=[("queue_order", 1 if forward else -1)],
+    )
+    return doc["queue_order"] if doc else None
+
+
+async def _rank_between(
+    post_id: ObjectId, after: ObjectId | None, before: ObjectId | None
+) -> float | None:
+    """A key strictly between two posts' keys, or None if there is no room.
+
+    With one side given, the other is the post that really sits next to it.
+    """
+    if after is None and before is None:
+        return await next_rank()
+    ids = [i for i in (after, before) if i is not None]
+    docs = {
+        doc["_id"]: doc.get("queue_order") or 0.0
+        async for doc in get_db().post_queue.find({"_id": {"$in": ids}}, {"queue_order": 1})
+    }
+    if len(docs) != len(ids):
+        raise LookupError("Neighbour post not found")
+
+    if after is None:
+        high = docs[before]
+        low = await _adjacent(high, forward=False, exclude=post_id)
+        if low is None:
+            return high - RANK_STEP  # new head
+    elif before is None:
+        low = docs[after]
+        high = await _adjacent(low, forward=True, exclude=post_id)
+        if high is None:
+            return await next_rank()  # new tail
+    else:
+        low, high = docs[after], docs[before]
+    if low >= high:
+        raise NotAdjacent("`after` must come before `before` in the queue")
+    mid = (low + high) / 2
+    return mid if low < mid < high else None
+
+
+async def move(post_id: ObjectId, after: ObjectId | None, before: ObjectId | None) -> float:
+    """Place a post between `after` and `before` (either may be None for an end).
+
+    Returns the post's new key. Raises LookupError for unknown posts and
+    NotAdjacent if the neighbours are out of order.
+    """
+    if post_id in (after, before):
+        raise NotAdjacent("A post cannot be placed next to itself")
+    rank = await _rank_between(post_id, after, before)
+    if rank is None:
+        await _renumber_queue()
+        rank = await _rank_between(post_id, after, before)
+
+    result = await get_db().post_queue.update_one(
+        {"_id": post_id},
+        {"$set": {"queue_order": rank, "updated_at": datetime.now(timezone.utc)}},
+    )
+    if result.matched_count == 0:
+        raise LookupError("Post not found")
+    await etags.bump("post_queue")
+    return rank
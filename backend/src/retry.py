@@ -0,0 +1,88 @@
+"""Classify upstream failures and compute retry delays.
+
+Retryable: throttling (429), request timeouts (408), server errors (5xx) and
+transport errors where the request never reached the server. Everything
+else (bad request, auth, not found, ...) is permanent.
+
+A failure of a call that creates something upstream is only retryable if
+the server definitely did not act on it: 408, 429 and 503 say the request
+was not processed, but a read timeout or another 5xx on `POST /rest/posts`
+may still have created the post, so those are not retried.
+"""
+
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+import config
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# The server turned the request away without processing it
+NOT_PROCESSED_STATUS = {408, 429, 503}
+
+# Raised before any bytes of the request were sent
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+@dataclass
+class RetryDecision:
+    retryable: bool
+    retry_after: float | None = None  # seconds the server asked us to wait
+    throttled: bool = False
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def classify(exc: BaseException, creates: bool = False) -> RetryDecision:
+    """Decide whether `exc` is worth retrying.
+
+    `creates` marks a non-idempotent call, where an ambiguous failure (a
+    transport error after sending, or a 5xx other than 503) must not be
+    retried.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        if status not in (NOT_PROCESSED_STATUS if creates else RETRYABLE_STATUS):
+            return RetryDecision(False)
+        return RetryDecision(
+            True,
+            retry_after=parse_retry_after(exc.response.headers.get("retry-after")),
+            throttled=status == 429,
+        )
+    if isinstance(exc, _NOT_SENT):
+        return RetryDecision(True)
+    if isinstance(exc, httpx.TransportError):
+        return RetryDecision(not creates)
+    return RetryDecision(False)
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Jittered exponential backoff for the given 1-based attempt.
+
+    Picks uniformly from the upper half of the current window, and never
+    returns less than the server's Retry-After.
+    """
+    ceiling = min(config.RETRY_MAX_DELAY_SECONDS, config.RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+    delay = random.uniform(ceiling / 2, ceiling)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
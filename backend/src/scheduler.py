@@ -2,11 +2,22 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+from pymongo import UpdateOne
+
+import config
+from src import etags, slot_reservations
 from src.database import get_db
 from src.schemas import ScheduleSettings
 
+logger = logging.getLogger(__name__)
+
+LOOKAHEAD_DAYS = 14
+DAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
 
 async def get_schedule_settings() -> ScheduleSettings:
     db = get_db()
@@ -19,73 +30,168 @@ async def get_schedule_settings() -> ScheduleSettings:
     return ScheduleSettings()
 
 
-async def get_next_available_slots(count: int = 5) -> list[datetime]:
-    """Calculate the next available posting slots based on schedule settings."""
-    settings = await get_schedule_settings()
-    db = get_db()
+def schedule_zone(name: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown schedule timezone {name!r}, using UTC")
+        return ZoneInfo("UTC")
+
+
+def _as_utc(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def _local_slots(settings: ScheduleSettings, day: date, tz: ZoneInfo) -> list[datetime]:
+    """The day's configured slots as UTC instants.
+
+    Wall times skipped by a DST jump land after the gap (02:30 becomes
+    03:30); repeated ones resolve to their first occurrence.
+    """
+    day_schedule = settings.schedule.get(DAY_NAMES[day.weekday()])
+    if not day_schedule or not day_schedule.enabled:
+        return []
+    slots = {
+        datetime.combine(day, time(slot.hour, slot.minute), tzinfo=tz).astimezone(timezone.utc)
+        for slot in day_schedule.slots
+    }
+    return sorted(slots)
+
+
+def compute_slots(
+    settings: ScheduleSettings,
+    now: datetime,
+    taken: list[datetime],
+    count: int,
+    days: int = LOOKAHEAD_DAYS,
+) -> list[datetime]:
+    """Pick the next `count` free slots after `now`.
+
+    `taken` are the scheduled_times of posts already occupying the window;
+    they block their exact slot and count toward their local day's
+    `daily_cap`. Pure, so it can be benchmarked and reused without Mongo.
+    """
+    tz = schedule_zone(settings.timezone)
+    today = now.astimezone(tz).date()
+
+    taken_set: set[datetime] = set()
+    per_day: dict[date, int] = {}
+    for scheduled_time in taken:
+        scheduled_time = _as_utc(scheduled_time)
+        taken_set.add(scheduled_time)
+        local_day = scheduled_time.astimezone(tz).date()
+        per_day[local_day] = per_day.get(local_day, 0) + 1
 
-    now = datetime.now(timezone.utc)
-    day_names = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
     slots: list[datetime] = []
-
-    # Look ahead up to 14 days
-    for day_offset in range(14):
-        date = now + timedelta(days=day_offset)
-        day_name = day_names[date.weekday()]
-        day_schedule = settings.schedule.get(day_name)
-
-        if not day_schedule or not day_schedule.enabled:
-            continue
-
-        for slot in day_schedule.slots:
-            slot_time = date.replace(
-                hour=slot.hour, minute=slot.minute, second=0, microsecond=0
-            )
-            if slot_time <= now:
-                continue
-
-            # Check if this slot is already taken
-            existing = await db.post_queue.count_documents({
-                "status": "scheduled",
-                "scheduled_time": slot_time,
-            })
-            if existing > 0:
+    for day_offset in range(days):
+        day = today + timedelta(days=day_offset)
+        used = per_day.get(day, 0)
+        for slot_time in _local_slots(settings, day, tz):
+            if used >= settings.daily_cap:
+                break
+            if slot_time <= now or slot_time in taken_set:
                 continue
-
             slots.append(slot_time)
+            used += 1
             if len(slots) >= count:
                 return slots
-
     return slots
 
 
-async def auto_schedule_drafts() -> int:
-    """Assign time slots to draft posts in queue order. Returns count scheduled."""
-    db = get_db()
+async def materialize_schedule(settings: ScheduleSettings | None = None) -> None:
+    """Write the schedule's open slots for the next SLOT_MATERIALIZE_DAYS."""
+    settings = settings or await get_schedule_settings()
+    now = datetime.now(timezone.utc)
+    tz = schedule_zone(settings.timezone)
+    today = now.astimezone(tz).date()
+    slot_times = [
+        slot_time
+        for day_offset in range(config.SLOT_MATERIALIZE_DAYS)
+        for slot_time in _local_slots(settings, today + timedelta(days=day_offset), tz)
+        if slot_time > now
+    ]
+    await slot_reservations.materialize(slot_times, after=now)
+
+
+async def get_next_available_slots(count: int = 5, days: int = LOOKAHEAD_DAYS) -> list[datetime]:
+    """Calculate the next available posting slots based on schedule settings."""
     settings = await get_schedule_settings()
 
-    drafts = db.post_queue.find(
-        {"status": "draft", "scheduled_time": None},
-    ).sort("queue_order", 1)
+    now = datetime.now(timezone.utc)
+    tz = schedule_zone(settings.timezone)
+    # From local midnight today, so posts already out today count toward the cap
+    window_start = datetime.combine(now.astimezone(tz).date(), time(), tzinfo=tz)
+    window_end = window_start + timedelta(days=days + 1)
+
+    taken = await slot_reservations.reserved_times(window_start, window_end)
+    return compute_slots(settings, now, taken, count, days)
+
 
-    draft_list = await drafts.to_list(length=settings.daily_cap)
-    if not draft_list:
-        return 0
+async def auto_schedule_drafts(days: int = LOOKAHEAD_DAYS) -> int:
+    """Assign time slots to draft posts in queue order. Returns count scheduled.
 
-    slots = await get_next_available_slots(count=len(draft_list))
+    Every draft that fits in the next `days` days gets a slot. Slots are
+    claimed in slot_reservations with one bulk_write, then the drafts are
+    updated with another, so scheduling any number of drafts takes two
+    round trips. A slot lost to a concurrent claim is retried.
+    """
+    db = get_db()
+    await materialize_schedule()
     scheduled = 0
 
-    for draft, slot in zip(draft_list, slots):
-        await db.post_queue.update_one(
-            {"_id": draft["_id"]},
-            {
-                "$set": {
-                    "status": "scheduled",
-                    "scheduled_time": slot,
-                    "updated_at": datetime.now(timezone.utc),
-                }
-            },
-        )
-        scheduled += 1
+    for _ in range(3):
+        drafts = await db.post_queue.find(
+            {"status": "draft", "scheduled_time": None},
+            {"_id": 1},
+        ).sort([("queue_order", 1), ("_id", 1)]).to_list(length=None)
+        if not drafts:
+            break
+        slots = await get_next_available_slots(count=len(drafts), days=days)
+        if not slots:
+            break
+
+        pairs = [(draft["_id"], slot) for draft, slot in zip(drafts, slots)]
+        claimed = await slot_reservations.reserve_many(pairs)
+        pairs = [pair for pair, ok in zip(pairs, claimed) if ok]
+        if pairs:
+            now = datetime.now(timezone.utc)
+            result = await db.post_queue.bulk_write(
+                [
+                    # Skip drafts that were edited or scheduled since we read them
+                    UpdateOne(
+                        {"_id": post_id, "status": "draft", "scheduled_time": None},
+                        {
+                            "$set": {"status": "scheduled", "scheduled_time": slot, "updated_at": now},
+                            "$unset": {"prestaged_at": ""},
+                        },
+                    )
+                    for post_id, slot in pairs
+                ],
+                ordered=False,
+            )
+            scheduled += result.modified_count
+            await etags.bump("post_queue")
+            if result.modified_count < len(pairs):
+                await _release_unused(pairs)
+        if len(pairs) == len(claimed):
+            break
 
     return scheduled
+
+
+async def _release_unused(pairs: list[tuple]) -> None:
+    """Free slots claimed for drafts that changed before they were scheduled."""
+    cursor = get_db().post_queue.find(
+        {"_id": {"$in": [post_id for post_id, _ in pairs]}},
+        {"status": 1, "scheduled_time": 1},
+    )
+    held = {
+        doc["_id"]: doc["scheduled_time"]
+        async for doc in cursor
+        if doc["status"] == "scheduled" and doc.get("scheduled_time")
+    }
+    unused = [
+        (post_id, slot) for post_id, slot in pairs
+        if post_id not in held or _as_utc(held[post_id]) != slot
+    ]
+    await slot_reservations.release_claims(unused)
@@ -29,6 +29,11 @@ class Tone(str, Enum):
     storytelling = "storytelling"
 
 
+class AIProvider(str, Enum):
+    openai = "openai"
+    anthropic = "anthropic"
+
+
 class AIPostType(str, Enum):
     text = "text"
     insight = "insight"
@@ -52,10 +57,40 @@ class PostUpdate(BaseModel):
     scheduled_time: Optional[datetime] = None
 
 
+class PostBulkCreate(BaseModel):
+    posts: list[PostCreate] = Field(..., min_length=1, max_length=1000)
+
+
+class PostBulkUpdateItem(PostUpdate):
+    id: str
+
+
+class PostBulkUpdate(BaseModel):
+    updates: list[PostBulkUpdateItem] = Field(..., min_length=1, max_length=1000)
+
+
+class PostBulkIds(BaseModel):
+    ids: list[str] = Field(..., min_length=1, max_length=1000)
+
+
+class PostBulkStatus(PostBulkIds):
+    status: PostStatus
+
+
 class PostReorder(BaseModel):
     post_ids: list[str]
 
 
+class PostMove(BaseModel):
+    after: Optional[str] = None   # post that should come right before it
+    before: Optional[str] = None  # post that should come right after it
+
+
+class ImageUploadCreate(BaseModel):
+    size: int = Field(..., gt=0, le=10 * 1024 * 1024)
+    content_type: str = "image/jpeg"
+
+
 # --- AI Generation ---
 
 class GenerateRequest(BaseModel):
@@ -63,15 +98,31 @@ class GenerateRequest(BaseModel):
     tone: Tone = Tone.professional
     post_type: AIPostType = AIPostType.text
     additional_context: Optional[str] = None
+    variants: Optional[int] = Field(None, ge=1, le=5)
+    no_cache: bool = False  # ask the model again instead of reusing a cached answer
 
 
 class ImproveRequest(BaseModel):
     content: str = Field(..., min_length=1)
     instructions: Optional[str] = None
+    no_cache: bool = False
+
+
+class GenerateBatchRequest(BaseModel):
+    topics: list[str] = Field(..., min_length=1, max_length=100)
+    tone: Tone = Tone.professional
+    post_type: AIPostType = AIPostType.text
+    additional_context: Optional[str] = None
+    variants: Optional[int] = Field(None, ge=1, le=5)
+    save_draft: bool = True  # add each topic's first variant to the queue as a draft
 
 
 # --- Settings ---
 
+class AutoScheduleRequest(BaseModel):
+    days: Optional[int] = Field(None, ge=1, le=90)
+
+
 class TimeSlot(BaseModel):
     hour: int = Field(..., ge=0, le=23)
     minute: int = Field(0, ge=0, le=59)
@@ -97,7 +148,7 @@ class ScheduleSettings(BaseModel):
 
 
 class AISettings(BaseModel):
-    provider: str = "openai"
+    provider: AIProvider = AIProvider.openai  # preferred; the other one is the fallback
     default_tone: Tone = Tone.professional
     default_post_type: AIPostType = AIPostType.text
 
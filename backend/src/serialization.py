@@ -0,0 +1,61 @@
+"""JSON output: one post shape and an orjson response class.
+
+Posts are read with POST_PROJECTION and turned into their API shape by
+`post_out` without touching the document. ObjectIds and datetimes are left
+as they are and encoded natively by orjson in a single pass; datetimes come
+out exactly as `isoformat()` would write them.
+
+Endpoints that return a JSONResponse directly skip FastAPI's
+`jsonable_encoder` pass as well; anything else still goes through it before
+being rendered by the same response class, which is the app default.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+
+# Fields a post exposes through the API, besides `_id` and `has_image`
+POST_FIELDS = (
+    "content",
+    "post_type",
+    "status",
+    "scheduled_time",
+    "queue_order",
+    "linkedin_post_id",
+    "error",
+    "attempts",
+    "next_attempt_at",
+    "published_at",
+    "created_at",
+    "updated_at",
+)
+POST_PROJECTION = {field: 1 for field in (*POST_FIELDS, "image_id", "image_urn")}
+
+
+def post_out(doc: dict) -> dict:
+    """A post document in its API shape. Leaves `doc` as it is."""
+    out: dict[str, Any] = {"_id": doc["_id"]}
+    for field in POST_FIELDS:
+        if field in doc:
+            out[field] = doc[field]
+    out["has_image"] = bool(doc.get("image_id") or doc.get("image_urn"))
+    return out
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class JSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,184 @@
+"""Materialized posting slots, one document per (account, slot_time).
+
+The unique index on (account, slot_time) is what makes a slot taken:
+reserving is a single conditional upsert that either claims the open slot
+(or creates it, for a time outside the schedule) or hits the unique index
+because another post holds it. Open slots are written ahead from the
+schedule settings, so the calendar reads free and taken slots from here
+without touching post_queue.
+
+Documents: `account`, `slot_time` (UTC), `post_id` (None while open),
+`source` ("schedule" for materialized slots, "post" for ad-hoc times, which
+are removed again when released) and `reserved_at`.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import DeleteMany, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from src.database import get_db
+
+# The app publishes to one LinkedIn account; the key leaves room for more.
+ACCOUNT = "default"
+
+_DUPLICATE_KEY = 11000
+
+
+def _claim_args(post_id: ObjectId, slot_time: datetime) -> tuple[dict, dict]:
+    return (
+        {"account": ACCOUNT, "slot_time": slot_time, "post_id": None},
+        {
+            "$set": {"post_id": post_id, "reserved_at": datetime.now(timezone.utc)},
+            "$setOnInsert": {"source": "post"},
+        },
+    )
+
+
+async def reserve(post_id: ObjectId, slot_time: datetime) -> bool:
+    """Claim `slot_time` for a post. False if another post holds it."""
+    db = get_db()
+    try:
+        await db.slot_reservations.update_one(*_claim_args(post_id, slot_time), upsert=True)
+        return True
+    except DuplicateKeyError:
+        held = await db.slot_reservations.find_one(
+            {"account": ACCOUNT, "slot_time": slot_time, "post_id": post_id}, {"_id": 1}
+        )
+        return held is not None
+
+
+async def reserve_many(pairs: list[tuple[ObjectId, datetime]]) -> list[bool]:
+    """Claim many slots in one round trip. Returns which claims succeeded.
+
+    A slot the same post already holds counts as claimed.
+    """
+    if not pairs:
+        return []
+    db = get_db()
+    claimed = [True] * len(pairs)
+    ops = [UpdateOne(*_claim_args(post_id, slot_time), upsert=True) for post_id, slot_time in pairs]
+    try:
+        await db.slot_reservations.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        conflicts = []
+        for error in e.details["writeErrors"]:
+            if error["code"] != _DUPLICATE_KEY:
+                raise
+            conflicts.append(error["index"])
+        held = {
+            (doc["post_id"], doc["slot_time"].replace(tzinfo=timezone.utc))
+            async for doc in db.slot_reservations.find(
+                {
+                    "account": ACCOUNT,
+                    "$or": [{"post_id": pairs[i][0], "slot_time": pairs[i][1]} for i in conflicts],
+                },
+                {"post_id": 1, "slot_time": 1},
+            )
+        }
+        for i in conflicts:
+            post_id, slot_time = pairs[i]
+            slot_time = slot_time.replace(tzinfo=timezone.utc) if slot_time.tzinfo is None else slot_time
+            claimed[i] = (post_id, slot_time.astimezone(timezone.utc)) in held
+    return claimed
+
+
+async def release(post_id: ObjectId, keep: datetime | None = None) -> None:
+    """Free every slot held by a post, except `keep`."""
+    query: dict = {"account": ACCOUNT, "post_id": post_id}
+    if keep is not None:
+        query["slot_time"] = {"$ne": keep}
+    await get_db().slot_reservations.bulk_write([
+        DeleteMany({**query, "source": "post"}),
+        UpdateMany(query, {"$set": {"post_id": None}, "$unset": {"reserved_at": ""}}),
+    ])
+
+
+async def release_posts(post_ids: list[ObjectId]) -> None:
+    """Free every slot held by any of `post_ids`."""
+    if not post_ids:
+        return
+    query = {"account": ACCOUNT, "post_id": {"$in": post_ids}}
+    await get_db().slot_reservations.bulk_write([
+        DeleteMany({**query, "source": "post"}),
+        UpdateMany(query, {"$set": {"post_id": None}, "$unset": {"reserved_at": ""}}),
+    ])
+
+
+async def release_claims(pairs: list[tuple[ObjectId, datetime]]) -> None:
+    """Undo specific claims made by reserve_many."""
+    if not pairs:
+        return
+    query = {
+        "account": ACCOUNT,
+        "$or": [{"post_id": post_id, "slot_time": slot_time} for post_id, slot_time in pairs],
+    }
+    await get_db().slot_reservations.bulk_write([
+        DeleteMany({**query, "source": "post"}),
+        UpdateMany(query, {"$set": {"post_id": None}, "$unset": {"reserved_at": ""}}),
+    ])
+
+
+async def materialize(slot_times: list[datetime], after: datetime) -> None:
+    """Make the open slots after `after` exactly `slot_times`.
+
+    Reserved slots are never touched, so posts keep their times when the
+    schedule changes.
+    """
+    db = get_db()
+    ops = [
+        DeleteMany({
+            "account": ACCOUNT,
+            "source": "schedule",
+            "post_id": None,
+            "slot_time": {"$gt": after, "$nin": slot_times},
+        })
+    ]
+    ops += [
+        UpdateOne(
+            {"account": ACCOUNT, "slot_time": slot_time},
+            {"$setOnInsert": {"post_id": None, "source": "schedule"}},
+            upsert=True,
+        )
+        for slot_time in slot_times
+    ]
+    await db.slot_reservations.bulk_write(ops, ordered=False)
+
+
+async def reserved_times(start: datetime, end: datetime) -> list[datetime]:
+    """slot_times held by posts in [start, end)."""
+    cursor = get_db().slot_reservations.find(
+        {"account": ACCOUNT, "slot_time": {"$gte": start, "$lt": end}, "post_id": {"$ne": None}},
+        {"slot_time": 1, "_id": 0},
+    )
+    return [doc["slot_time"] async for doc in cursor]
+
+
+async def slots_between(start: datetime, end: datetime) -> list[dict]:
+    """All slots, open and reserved, in [start, end) in time order."""
+    cursor = get_db().slot_reservations.find(
+        {"account": ACCOUNT, "slot_time": {"$gte": start, "$lt": end}},
+        {"slot_time": 1, "post_id": 1, "_id": 0},
+    ).sort("slot_time", 1)
+    return await cursor.to_list(length=None)
+
+
+async def backfill(since: datetime) -> int:
+    """Reserve the slots of posts scheduled before reservations existed.
+
+    Idempotent, so it runs on every start.
+    """
+    cursor = get_db().post_queue.find(
+        {
+            "status": {"$in": ["scheduled", "publishing", "published"]},
+            "scheduled_time": {"$gte": since},
+        },
+        {"scheduled_time": 1},
+    )
+    pairs = [(doc["_id"], doc["scheduled_time"]) async for doc in cursor]
+    claimed = await reserve_many(pairs)
+    # Failures are slots already held, by this post or a double-booked one
+    return sum(claimed)
@@ -2,12 +2,19 @@
 
 from __future__ import annotations
 
+import logging
 from datetime import datetime, timezone
 
 from cryptography.fernet import Fernet
 
 import config
 from src.database import get_db
+from src.linkedin_oauth import refresh_access_token
+
+logger = logging.getLogger(__name__)
+
+# Tokens this many days (or fewer) from expiry are refreshed proactively
+REFRESH_DAYS = 7
 
 
 def _fernet() -> Fernet:
@@ -112,3 +119,35 @@ async def update_tokens(person_urn: str, access_token: str, refresh_token: str |
         update["refresh_token"] = encrypt_token(refresh_token)
 
     await db.linkedin_tokens.update_one({"person_urn": person_urn}, {"$set": update})
+
+
+async def refresh_if_needed(tokens: dict, needed_until: datetime | None = None) -> dict:
+    """Refresh the access token if it expires within REFRESH_DAYS.
+
+    Also refreshes if it would expire before `needed_until`. Returns
+    `tokens`, updated in place; a failed refresh is logged and the old
+    token kept.
+    """
+    if not tokens.get("expires_at") or not tokens.get("refresh_token"):
+        return tokens
+
+    expires_at = tokens["expires_at"]
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    remaining = expires_at - datetime.now(timezone.utc)
+    if remaining.days <= REFRESH_DAYS or (needed_until is not None and expires_at <= needed_until):
+        logger.info(f"Token expires in {remaining.days} days, refreshing...")
+        try:
+            new_data = await refresh_access_token(tokens["refresh_token"])
+            await update_tokens(
+                tokens["person_urn"],
+                new_data["access_token"],
+                new_data.get("refresh_token"),
+                new_data.get("expires_in", 5184000),
+            )
+            tokens["access_token"] = new_data["access_token"]
+            logger.info("Token refreshed successfully")
+        except Exception as e:
+            logger.error(f"Token refresh failed: {e}")
+
+    return tokens
@@ -0,0 +1,119 @@
+"""Resumable image upload sessions.
+
+A session records how many bytes of an image have been durably written
+(`offset`) so a client on a flaky connection can continue where it left
+off. The bytes themselves go straight into GridFS chunks via ImageWriter;
+the session document only tracks progress. A short write lease stops two
+requests appending to the same session at once.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterable
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from src.database import get_db
+from src.image_store import CHUNK_SIZE, CheckpointLost, ImageWriter, delete_image
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL = timedelta(hours=24)
+WRITE_LEASE = timedelta(minutes=10)
+
+
+class SessionConflict(Exception):
+    pass
+
+
+async def _purge_expired() -> None:
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    async for session in db.upload_sessions.find({"expires_at": {"$lt": now}}, {"_id": 1}):
+        await delete_image(session["_id"])
+        await db.upload_sessions.delete_one({"_id": session["_id"]})
+
+
+async def create_session(post_id: ObjectId, size: int, content_type: str) -> dict:
+    await _purge_expired()
+    now = datetime.now(timezone.utc)
+    session = {
+        "_id": ObjectId(),  # also the GridFS file id of the finished image
+        "post_id": post_id,
+        "size": size,
+        "content_type": content_type,
+        "offset": 0,
+        "writer_until": None,
+        "created_at": now,
+        "expires_at": now + SESSION_TTL,
+    }
+    await get_db().upload_sessions.insert_one(session)
+    return session
+
+
+async def get_session(post_id: ObjectId, upload_id: ObjectId) -> dict | None:
+    return await get_db().upload_sessions.find_one({"_id": upload_id, "post_id": post_id})
+
+
+async def append(
+    session: dict, offset: int, chunks: AsyncIterable[bytes]
+) -> tuple[dict, ImageWriter | None]:
+    """Write `chunks` to the session starting at `offset`.
+
+    Returns the updated session, plus the writer if the upload is now
+    complete (the caller finishes and attaches it). Bytes received before a
+    disconnect are kept. Raises SessionConflict if `offset` is stale or
+    another request is writing, or if the partial chunk it ends in was lost;
+    the session then goes back to the last whole chunk to resume from.
+    """
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    locked = await db.upload_sessions.find_one_and_update(
+        {
+            "_id": session["_id"],
+            "offset": offset,
+            "$or": [{"writer_until": None}, {"writer_until": {"$lt": now}}],
+        },
+        {"$set": {"writer_until": now + WRITE_LEASE}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if locked is None:
+        raise SessionConflict("Upload offset mismatch or upload in progress")
+
+    try:
+        writer = await ImageWriter.resume(session["_id"], offset)
+    except CheckpointLost as e:
+        logger.warning(f"{e}; resuming the upload from the last whole chunk")
+        await db.upload_sessions.update_one(
+            {"_id": session["_id"]},
+            {"$set": {"offset": offset - offset % CHUNK_SIZE, "writer_until": None}},
+        )
+        raise SessionConflict("Stored upload data was lost; resume from the upload's offset")
+    try:
+        async for chunk in chunks:
+            if writer.offset + len(chunk) > locked["size"]:
+                raise ValueError("Upload exceeds declared size")
+            await writer.write(chunk)
+    finally:
+        # Keep whatever arrived, even if the client went away mid-body
+        await writer.checkpoint()
+        locked = await db.upload_sessions.find_one_and_update(
+            {"_id": session["_id"]},
+            {
+                "$set": {
+                    "offset": writer.offset,
+                    "writer_until": None,
+                    "expires_at": datetime.now(timezone.utc) + SESSION_TTL,
+                }
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+
+    return locked, writer if writer.offset == locked["size"] else None
+
+
+async def close_session(session: dict) -> None:
+    await get_db().upload_sessions.delete_one({"_id": session["_id"]})
@@ -0,0 +1,25 @@
+"""Fixtures: an in-memory MongoDB (mongomock-motor) in place of the real one.
+
+    pip install -r requirements-dev.txt
+    python -m pytest -q
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import database  # noqa: E402
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # Skips only the tests that need a database, if the dev requirements are missing
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(database, "get_client", lambda: client)
+    return database.get_db()
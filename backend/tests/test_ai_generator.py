@@ -0,0 +1,23 @@
+import asyncio
+
+import config
+from src import ai_generator
+from src.ai_generator import VARIANT_SEPARATOR
+
+
+def test_streaming_one_variant_ends_with_just_that_variant(monkeypatch):
+    monkeypatch.setattr(config, "AI_VARIANT_MODE", "single")
+
+    async def stream(prompt, use_cache=True, **options):
+        for text in ["First variant", VARIANT_SEPARATOR, "Start of the sec", "ond variant"]:
+            yield text
+
+    monkeypatch.setattr(ai_generator, "_stream", stream)
+
+    async def run():
+        return [event async for event in ai_generator.stream_posts("Hiring", "casual", "text", count=1)]
+
+    events = asyncio.run(run())
+    [variant] = [e for e in events if e["type"] == "variant"]
+    assert variant["content"] == "First variant"
+    assert events[-1] == {"type": "done", "variants": ["First variant"]}
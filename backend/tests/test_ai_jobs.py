@@ -0,0 +1,22 @@
+import asyncio
+
+from src import ai_generator, ai_jobs
+
+
+def test_a_retried_job_saves_its_draft_once(db, monkeypatch):
+    async def generate_posts(**kwargs):
+        return ["First variant", "Second variant"]
+
+    monkeypatch.setattr(ai_generator, "generate_posts", generate_posts)
+    params = {"topic": "Hiring", "tone": "casual", "post_type": "text", "save_draft": True}
+
+    async def run():
+        job = ai_jobs._new_job("generate", params, "openai", None)
+        first = await ai_jobs.run_job(job)
+        # The attempt is lost before its result is recorded, and the job runs again
+        second = await ai_jobs.run_job(job)
+        return job, first, second, await db.post_queue.count_documents({})
+
+    job, first, second, drafts = asyncio.run(run())
+    assert first["post_id"] == second["post_id"] == job["draft_id"]
+    assert drafts == 1
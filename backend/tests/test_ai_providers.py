@@ -0,0 +1,66 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import config
+from src import ai_providers
+
+
+def test_preferred_is_cached_and_refreshed_by_saving_settings(db, monkeypatch):
+    monkeypatch.setattr(config, "AI_PROVIDER", "openai")
+    monkeypatch.setattr(ai_providers, "_preferred", None)
+    reads = []
+    real_get_db = ai_providers.get_db
+
+    def counting_get_db():
+        reads.append(1)
+        return real_get_db()
+
+    monkeypatch.setattr(ai_providers, "get_db", counting_get_db)
+
+    async def preferred_five_times():
+        return [await ai_providers.preferred() for _ in range(5)]
+
+    assert asyncio.run(preferred_five_times()) == ["openai"] * 5
+    assert len(reads) == 1
+
+    from app import app
+
+    client = TestClient(app)
+    client.post("/api/auth/login", json={"password": config.ADMIN_PASSWORD})
+    assert client.put("/api/settings/ai", json={"provider": "anthropic"}).status_code == 200
+
+    assert asyncio.run(preferred_five_times()) == ["anthropic"] * 5
+    assert len(reads) == 2
+
+
+def test_capped_calls_count_against_the_provider_they_fail_over_to(monkeypatch):
+    monkeypatch.setattr(config, "AI_FAILOVER", True)
+    monkeypatch.setattr(config, "AI_HEDGE", False)
+    monkeypatch.setattr(config, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(config, "ANTHROPIC_API_KEY", "sk-ant-test")
+    monkeypatch.setattr(ai_providers, "_stats", {p: ai_providers.ProviderStats() for p in ai_providers.PROVIDERS})
+    open_calls = {"openai": 0}
+    most_open = {"openai": 0}
+
+    async def call(provider):
+        if provider == "anthropic":
+            raise RuntimeError("overloaded")
+        open_calls[provider] += 1
+        most_open[provider] = max(most_open[provider], open_calls[provider])
+        await asyncio.sleep(0.01)
+        open_calls[provider] -= 1
+        return provider
+
+    async def run():
+        # One shared set of slots, as for the jobs of one runner
+        slots = {"openai": asyncio.Semaphore(1), "anthropic": asyncio.Semaphore(2)}
+
+        async def capped_job():
+            ai_providers.limit(slots)
+            return await ai_providers.complete("anthropic", call, "test")
+
+        return await asyncio.gather(*(asyncio.create_task(capped_job()) for _ in range(3)))
+
+    assert asyncio.run(run()) == ["openai"] * 3
+    assert most_open["openai"] == 1
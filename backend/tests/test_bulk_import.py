@@ -0,0 +1,48 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+from routers import bulk
+from src import post_ops
+
+
+@pytest.fixture
+def client(db):
+    from app import app
+
+    client = TestClient(app)
+    client.post("/api/auth/login", json={"password": config.ADMIN_PASSWORD})
+    return client
+
+
+def test_chunked_oversize_import_is_refused(client, monkeypatch):
+    monkeypatch.setattr(bulk, "MAX_IMPORT_BYTES", 1000)
+
+    def body():
+        for _ in range(20):
+            yield b'{"content": "Hello"}\n' * 10
+
+    response = client.post("/api/posts/import", content=body(), headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 413
+
+
+def test_a_failed_batch_is_reported_per_row(client, monkeypatch):
+    monkeypatch.setattr(bulk, "IMPORT_BATCH_SIZE", 2)
+    real_create_posts = post_ops.create_posts
+    calls = []
+
+    async def flaky_create_posts(bodies, *args):
+        calls.append(len(bodies))
+        if len(calls) == 1:
+            raise RuntimeError("connection reset")
+        return await real_create_posts(bodies, *args)
+
+    monkeypatch.setattr(post_ops, "create_posts", flaky_create_posts)
+    body = "".join(json.dumps({"content": f"Post {n}"}) + "\n" for n in range(3))
+    response = client.post("/api/posts/import", content=body, headers={"Content-Type": "application/x-ndjson"})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line.get("ok") for line in lines[:3]] == [False, False, True]
+    assert "connection reset" in lines[0]["error"]
+    assert lines[-1] == {"done": True, "created": 1, "failed": 2}
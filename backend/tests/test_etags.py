@@ -0,0 +1,29 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from src import etags
+
+
+def test_a_late_write_with_an_older_stamp_changes_the_version(db):
+    async def run():
+        now = datetime.now(timezone.utc)
+        late_id = ObjectId()
+        await db.post_queue.insert_many(
+            [
+                {"_id": ObjectId(), "status": "draft", "updated_at": now},
+                {"_id": late_id, "status": "draft", "updated_at": now - timedelta(seconds=5)},
+            ]
+        )
+        before = await etags.collection_version("post_queue")
+        # Stamped before the newer write above, but committed after it
+        await db.post_queue.update_one(
+            {"_id": late_id}, {"$set": {"status": "scheduled", "updated_at": now - timedelta(seconds=1)}}
+        )
+        await etags.bump("post_queue")
+        return before, await etags.collection_version("post_queue")
+
+    before, after = asyncio.run(run())
+    assert before[1:] == after[1:]  # newest stamp and count alone miss it
+    assert before != after
@@ -0,0 +1,84 @@
+import asyncio
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from src import image_store, upload_sessions
+
+
+def test_register_falls_back_to_own_file_when_the_other_entry_vanishes(db, monkeypatch):
+    deleted = []
+
+    async def fake_delete(image_id):
+        deleted.append(image_id)
+
+    monkeypatch.setattr(image_store, "delete_image", fake_delete)
+    images = type(db.images)
+    real_insert = images.insert_one
+    calls = []
+
+    async def racing_insert(self, doc, *args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            # Another upload of the same bytes registered first, then was released
+            raise DuplicateKeyError("E11000 duplicate key")
+        return await real_insert(self, doc, *args, **kwargs)
+
+    monkeypatch.setattr(images, "insert_one", racing_insert)
+    file_id = ObjectId()
+
+    async def run():
+        entry = await image_store._register("abc", file_id, 3, "image/png")
+        return entry, await db.images.find_one({"_id": "abc"})
+
+    entry, stored = asyncio.run(run())
+    assert entry["file_id"] == file_id
+    assert stored["file_id"] == file_id and stored["refcount"] == 1
+    assert deleted == []
+
+
+def test_register_joins_an_existing_entry_and_drops_the_duplicate(db, monkeypatch):
+    deleted = []
+
+    async def fake_delete(image_id):
+        deleted.append(image_id)
+
+    monkeypatch.setattr(image_store, "delete_image", fake_delete)
+    theirs, ours = ObjectId(), ObjectId()
+
+    async def run():
+        await db.images.insert_one({"_id": "abc", "file_id": theirs, "size": 3, "content_type": "image/png", "refcount": 1})
+        return await image_store._register("abc", ours, 3, "image/png")
+
+    entry = asyncio.run(run())
+    assert entry["file_id"] == theirs and entry["refcount"] == 2
+    assert deleted == [ours]
+
+
+def test_resuming_after_a_lost_partial_chunk_goes_back_to_the_last_whole_chunk(db):
+    async def chunks(data):
+        yield data
+
+    async def run():
+        session = await upload_sessions.create_session(ObjectId(), 2 * image_store.CHUNK_SIZE, "image/png")
+        first = b"a" * (image_store.CHUNK_SIZE + 10)
+        session, _ = await upload_sessions.append(session, 0, chunks(first))
+        # The trailing partial chunk is lost, e.g. by a failed write
+        await db[f"{image_store.BUCKET_NAME}.chunks"].delete_one({"files_id": session["_id"], "n": 1})
+        try:
+            await upload_sessions.append(session, len(first), chunks(b"b" * 10))
+        except upload_sessions.SessionConflict:
+            conflict = True
+        else:
+            conflict = False
+        reset = await upload_sessions.get_session(session["post_id"], session["_id"])
+        rest = b"c" * (2 * image_store.CHUNK_SIZE - reset["offset"])
+        done, writer = await upload_sessions.append(reset, reset["offset"], chunks(rest))
+        await writer.finish("image/png")
+        stored = b"".join([chunk async for chunk in image_store.stream_image(session["_id"], require_file=False)])
+        return conflict, reset["offset"], stored, rest
+
+    conflict, offset, stored, rest = asyncio.run(run())
+    assert conflict
+    assert offset == image_store.CHUNK_SIZE
+    assert stored == b"a" * image_store.CHUNK_SIZE + rest
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+from routers import posts
+from src import image_store
+
+
+@pytest.fixture
+def client(db):
+    from app import app
+
+    client = TestClient(app)
+    client.post("/api/auth/login", json={"password": config.ADMIN_PASSWORD})
+    return client
+
+
+def test_chunked_oversize_upload_is_refused(client):
+    boundary = "b0undary"
+
+    def body():
+        yield f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="a.png"\r\n'.encode()
+        yield b"Content-Type: image/png\r\n\r\n"
+        for _ in range(image_store.MAX_IMAGE_BYTES // (1024 * 1024) + 2):
+            yield b"\0" * (1024 * 1024)
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post(
+        "/api/posts/0123456789abcdef01234567/image",
+        content=body(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    assert response.status_code == 411
+
+
+def test_body_is_cut_off_once_past_the_limit():
+    received = []
+
+    async def stream():
+        for _ in range(10):
+            received.append(1)
+            yield b"x" * 100
+
+    async def run():
+        async for _ in posts._limited(stream(), 250):
+            pass
+
+    with pytest.raises(posts._BodyTooLarge):
+        asyncio.run(run())
+    assert len(received) == 3  # stopped at the first chunk over the limit
@@ -0,0 +1,35 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+import config
+from src.post_events import PostEventHub
+
+
+def test_polling_catches_late_commits_and_the_rest_of_a_batch(db, monkeypatch):
+    monkeypatch.setattr(config, "POST_EVENTS_POLL_SECONDS", 0.01)
+
+    async def run():
+        hub = PostEventHub()
+        sub = hub.subscribe()
+        task = asyncio.create_task(hub._poll())
+        await asyncio.sleep(0.05)
+        stamp = datetime.now(timezone.utc) + timedelta(seconds=2)
+        first, rest, late = ObjectId(), ObjectId(), ObjectId()
+        await db.post_queue.insert_one({"_id": first, "updated_at": stamp})
+        await asyncio.sleep(0.05)
+        # The rest of the same batch, and a write stamped earlier that committed last
+        await db.post_queue.insert_one({"_id": rest, "updated_at": stamp})
+        await db.post_queue.insert_one({"_id": late, "updated_at": stamp - timedelta(seconds=1)})
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        events = []
+        while not sub.queue.empty():
+            events.append(sub.queue.get_nowait()[1]["post"]["_id"])
+        return events, [first, rest, late]
+
+    events, (first, rest, late) = asyncio.run(run())
+    assert events[0] == first
+    assert sorted(events[1:]) == sorted([rest, late])
@@ -0,0 +1,79 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from src import publishing
+
+
+def test_completion_after_the_lease_was_taken_over_is_ignored(db):
+    async def run():
+        post_id = ObjectId()
+        now = datetime.now(timezone.utc)
+        await db.post_queue.insert_one(
+            {"_id": post_id, "content": "hi", "status": "scheduled", "scheduled_time": now - timedelta(minutes=1)}
+        )
+        first = await publishing.claim_next_due("worker-1")
+        # The first worker stalls until its lease runs out, and another takes the post over
+        await db.post_queue.update_one({"_id": post_id}, {"$set": {"lease_expires_at": now - timedelta(seconds=1)}})
+        second = await publishing.claim_next_due("worker-2")
+
+        late = await publishing.complete_claim(first, "worker-1", "urn:li:share:1")
+        after_late = await db.post_queue.find_one({"_id": post_id})
+        current = await publishing.complete_claim(second, "worker-2", "urn:li:share:2")
+        return first, second, late, after_late, current, await db.post_queue.find_one({"_id": post_id})
+
+    first, second, late, after_late, current, final = asyncio.run(run())
+    assert first["_id"] == second["_id"]
+    assert first["idempotency_key"] == second["idempotency_key"]  # same correlation id across attempts
+    assert late is False
+    assert after_late["status"] == "publishing" and after_late["lease_owner"] == "worker-2"
+    assert current is True
+    assert final["status"] == "published" and final["linkedin_post_id"] == "urn:li:share:2"
+
+
+def test_defer_after_the_lease_was_taken_over_is_ignored(db):
+    async def run():
+        post_id = ObjectId()
+        now = datetime.now(timezone.utc)
+        await db.post_queue.insert_one(
+            {"_id": post_id, "content": "hi", "status": "scheduled", "scheduled_time": now - timedelta(minutes=1)}
+        )
+        first = await publishing.claim_next_due("worker-1")
+        await db.post_queue.update_one({"_id": post_id}, {"$set": {"lease_expires_at": now - timedelta(seconds=1)}})
+        await publishing.claim_next_due("worker-2")
+        await publishing.defer_claim(first, "worker-1", now + timedelta(minutes=5), "late failure")
+        return await db.post_queue.find_one({"_id": post_id})
+
+    doc = asyncio.run(run())
+    assert doc["status"] == "publishing" and doc["lease_owner"] == "worker-2"
+    assert doc.get("error") != "late failure"
+
+
+def test_posts_scheduled_after_a_deferred_post_wait_behind_it(db):
+    async def run():
+        now = datetime.now(timezone.utc)
+        first, second, third = ObjectId(), ObjectId(), ObjectId()
+        await db.post_queue.insert_many(
+            [
+                {"_id": first, "content": "1", "status": "scheduled", "scheduled_time": now - timedelta(minutes=3)},
+                {
+                    "_id": second,
+                    "content": "2",
+                    "status": "scheduled",
+                    "scheduled_time": now - timedelta(minutes=2),
+                    "next_attempt_at": now + timedelta(minutes=5),
+                },
+                {"_id": third, "content": "3", "status": "scheduled", "scheduled_time": now - timedelta(minutes=1)},
+            ]
+        )
+        claimed = []
+        while (post := await publishing.claim_next_due("worker-1")) is not None:
+            claimed.append(post["_id"])
+        await db.post_queue.update_one({"_id": second}, {"$set": {"next_attempt_at": now - timedelta(seconds=1)}})
+        while (post := await publishing.claim_next_due("worker-1")) is not None:
+            claimed.append(post["_id"])
+        return [first, second, third], claimed
+
+    ids, claimed = asyncio.run(run())
+    assert claimed == ids
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from src import queue_order
+
+
+async def _queue(db, count: int) -> list[ObjectId]:
+    now = datetime.now(timezone.utc)
+    ranks = await queue_order.next_ranks(count)
+    ids = [ObjectId() for _ in range(count)]
+    await db.post_queue.insert_many(
+        [
+            {"_id": i, "status": "draft", "queue_order": rank, "created_at": now}
+            for i, rank in zip(ids, ranks)
+        ]
+    )
+    return ids
+
+
+async def _order(db) -> list[ObjectId]:
+    return [doc["_id"] async for doc in db.post_queue.find({}).sort("queue_order", 1)]
+
+
+def _keys_unique(db) -> bool:
+    async def keys():
+        return [doc["queue_order"] async for doc in db.post_queue.find({})]
+
+    found = asyncio.run(keys())
+    return len(found) == len(set(found))
+
+
+def test_move_after_neighbour_lands_before_the_next_post(db):
+    async def run():
+        ids = await _queue(db, 4)
+        await queue_order.move(ids[0], after=ids[1], before=None)
+        return ids, await _order(db)
+
+    ids, order = asyncio.run(run())
+    assert order == [ids[1], ids[0], ids[2], ids[3]]
+    assert _keys_unique(db)
+
+
+def test_move_before_neighbour_lands_after_the_previous_post(db):
+    async def run():
+        ids = await _queue(db, 4)
+        await queue_order.move(ids[3], after=None, before=ids[2])
+        return ids, await _order(db)
+
+    ids, order = asyncio.run(run())
+    assert order == [ids[0], ids[1], ids[3], ids[2]]
+    assert _keys_unique(db)
+
+
+def test_one_sided_moves_at_the_ends(db):
+    async def run():
+        ids = await _queue(db, 3)
+        await queue_order.move(ids[0], after=ids[2], before=None)
+        await queue_order.move(ids[2], after=None, before=ids[1])
+        return ids, await _order(db)
+
+    ids, order = asyncio.run(run())
+    assert order == [ids[2], ids[1], ids[0]]
+    assert _keys_unique(db)
@@ -0,0 +1,21 @@
+import httpx
+
+from src.retry import classify
+
+
+def _status_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://api.linkedin.com/rest/posts")
+    response = httpx.Response(status, request=request)
+    return httpx.HTTPStatusError(f"{status}", request=request, response=response)
+
+
+def test_a_502_on_create_is_not_retried():
+    # LinkedIn may have created the post before the gateway gave up
+    assert classify(_status_error(502), creates=True).retryable is False
+    assert classify(_status_error(502)).retryable is True
+
+
+def test_a_create_the_server_turned_away_is_retried():
+    for status in (408, 429, 503):
+        assert classify(_status_error(status), creates=True).retryable is True
+    assert classify(_status_error(429), creates=True).throttled is True
@@ -1,8 +1,11 @@
-import React, { useState } from 'react';
+import React, { useState, useRef, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { Card, Form, Button, Alert, Spinner, Row, Col } from 'react-bootstrap';
-import api from '../config/api';
-import { FiZap, FiPlus, FiRefreshCw } from 'react-icons/fi';
+import { Card, Form, Button, Alert, Spinner, Row, Col, ProgressBar } from 'react-bootstrap';
+import api, { postStream } from '../config/api';
+import { FiZap, FiPlus, FiRefreshCw, FiLayers } from 'react-icons/fi';
+
+const BATCH_KEY = 'aiBatchId';
+const BATCH_POLL_MS = 3000;
 
 export default function AIGenerator() {
     const navigate = useNavigate();
@@ -15,6 +18,49 @@ export default function AIGenerator() {
     const [improving, setImproving] = useState(null);
     const [error, setError] = useState('');
     const [addingToQueue, setAddingToQueue] = useState(null);
+    const lastRequest = useRef(null);
+    const [batchTopics, setBatchTopics] = useState('');
+    const [batchId, setBatchId] = useState(() => localStorage.getItem(BATCH_KEY));
+    const [batch, setBatch] = useState(null);
+    const [submittingBatch, setSubmittingBatch] = useState(false);
+
+    // Batch jobs run on the server; follow the last one, across reloads, until it finishes
+    useEffect(() => {
+        if (!batchId) return undefined;
+        let timer;
+        const poll = async () => {
+            try {
+                const { data } = await api.get(`/generate/jobs/batches/${batchId}`);
+                setBatch(data);
+                const pending = (data.counts.queued || 0) + (data.counts.running || 0);
+                if (pending > 0) timer = setTimeout(poll, BATCH_POLL_MS);
+            } catch (err) {
+                localStorage.removeItem(BATCH_KEY);
+                setBatchId(null);
+            }
+        };
+        poll();
+        return () => clearTimeout(timer);
+    }, [batchId]);
+
+    const handleBatch = async () => {
+        const topics = batchTopics.split('\n').map(t => t.trim()).filter(Boolean);
+        setSubmittingBatch(true);
+        setError('');
+        try {
+            const { data } = await api.post('/generate/jobs/batch', {
+                topics, tone, post_type: postType, additional_context: context || null, save_draft: true,
+            });
+            localStorage.setItem(BATCH_KEY, data.batch_id);
+            setBatch(null);
+            setBatchId(data.batch_id);
+            setBatchTopics('');
+        } catch (err) {
+            setError(err.response?.data?.detail || 'Failed to queue the batch');
+        } finally {
+            setSubmittingBatch(false);
+        }
+    };
 
     const handleGenerate = async (e) => {
         e.preventDefault();
@@ -22,16 +68,34 @@ export default function AIGenerator() {
         setError('');
         setVariants([]);
 
+        const request = { topic, tone, post_type: postType, additional_context: context || null };
+        // Generating the same thing again means "give me new ones", not the cached answer
+        const again = JSON.stringify(request) === lastRequest.current;
+        lastRequest.current = JSON.stringify(request);
+
         try {
-            const { data } = await api.post('/generate', {
-                topic,
-                tone,
-                post_type: postType,
-                additional_context: context || null,
+            // Variants fill in as the model writes them
+            await postStream('/generate/stream', { ...request, no_cache: again }, (event) => {
+                if (event.type === 'delta') {
+                    setVariants(prev => {
+                        const updated = [...prev];
+                        updated[event.index] = (updated[event.index] || '') + event.text;
+                        return updated;
+                    });
+                } else if (event.type === 'variant') {
+                    setVariants(prev => {
+                        const updated = [...prev];
+                        updated[event.index] = event.content;
+                        return updated;
+                    });
+                } else if (event.type === 'done') {
+                    setVariants(event.variants);
+                } else if (event.type === 'error') {
+                    setError(event.detail);
+                }
             });
-            setVariants(data.variants || []);
         } catch (err) {
-            setError(err.response?.data?.detail || 'Generation failed');
+            setError(err.message || 'Generation failed');
         } finally {
             setGenerating(false);
         }
@@ -40,12 +104,16 @@ export default function AIGenerator() {
     const handleImprove = async (index) => {
         setImproving(index);
         try {
-            const { data } = await api.post('/generate/improve', {
-                content: variants[index],
+            let improved = '';
+            await postStream('/generate/improve/stream', { content: variants[index] }, (event) => {
+                if (event.type === 'error') throw new Error(event.detail);
+                improved = event.type === 'done' ? event.improved : improved + event.text;
+                setVariants(prev => {
+                    const updated = [...prev];
+                    updated[index] = improved;
+                    return updated;
+                });
             });
-            const updated = [...variants];
-            updated[index] = data.improved;
-            setVariants(updated);
         } catch (err) {
             setError('Improve failed');
         } finally {
@@ -137,6 +205,36 @@ export default function AIGenerator() {
                 </Card.Body>
             </Card>
 
+            <Card className="mb-4">
+                <Card.Body>
+                    <Form.Group className="mb-3">
+                        <Form.Label><FiLayers className="me-2" />Batch Drafts</Form.Label>
+                        <Form.Control
+                            as="textarea"
+                            rows={4}
+                            value={batchTopics}
+                            onChange={e => setBatchTopics(e.target.value)}
+                            placeholder="One topic per line. Each becomes a draft in your queue, using the tone and type above."
+                        />
+                    </Form.Group>
+                    <Button variant="outline-primary" onClick={handleBatch} disabled={submittingBatch || !batchTopics.trim()}>
+                        {submittingBatch ? <Spinner size="sm" /> : 'Generate Drafts'}
+                    </Button>
+                    {batch && (
+                        <div className="mt-3">
+                            <ProgressBar
+                                now={batch.jobs.length ? ((batch.counts.done || 0) + (batch.counts.failed || 0)) / batch.jobs.length * 100 : 0}
+                                label={`${batch.counts.done || 0} / ${batch.jobs.length}`}
+                            />
+                            <small className="text-muted">
+                                {batch.counts.failed ? `${batch.counts.failed} failed. ` : ''}
+                                Finished drafts are in the <Button variant="link" size="sm" className="p-0 align-baseline" onClick={() => navigate('/queue')}>queue</Button>.
+                            </small>
+                        </div>
+                    )}
+                </Card.Body>
+            </Card>
+
             {variants.map((variant, i) => (
                 <Card key={i} className="mb-3">
                     <Card.Header className="d-flex justify-content-between align-items-center">
@@ -7,18 +7,21 @@ import { FiEdit, FiClock, FiCheck, FiAlertCircle, FiZap } from 'react-icons/fi';
 
 export default function Dashboard() {
     const { linkedIn } = useAuth();
-    const [queue, setQueue] = useState([]);
+    const [drafts, setDrafts] = useState(0);
+    const [scheduled, setScheduled] = useState({ posts: [], total: 0 });
     const [history, setHistory] = useState({ posts: [], total: 0 });
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
         const load = async () => {
             try {
-                const [qRes, hRes] = await Promise.all([
-                    api.get('/posts/queue'),
-                    api.get('/history?limit=5'),
+                const [dRes, sRes, hRes] = await Promise.all([
+                    api.get('/posts/queue?status=draft&limit=1&total=true'),
+                    api.get('/posts/queue?status=scheduled&limit=1&total=true'),
+                    api.get('/history?limit=5&total=true'),
                 ]);
-                setQueue(qRes.data.posts || []);
+                setDrafts(dRes.data.total);
+                setScheduled(sRes.data);
                 setHistory(hRes.data);
             } catch (err) {
                 console.error(err);
@@ -29,9 +32,7 @@ export default function Dashboard() {
         load();
     }, []);
 
-    const drafts = queue.filter(p => p.status === 'draft');
-    const scheduled = queue.filter(p => p.status === 'scheduled');
-    const nextPost = scheduled.length > 0 ? scheduled[0] : null;
+    const nextPost = scheduled.posts.length > 0 ? scheduled.posts[0] : null;
 
     if (loading) return <div className="text-center mt-5">Loading...</div>;
 
@@ -50,7 +51,7 @@ export default function Dashboard() {
                     <Card className="text-center">
                         <Card.Body>
                             <FiEdit size={24} className="text-secondary mb-2" />
-                            <h2>{drafts.length}</h2>
+                            <h2>{drafts}</h2>
                             <small className="text-muted">Drafts</small>
                         </Card.Body>
                     </Card>
@@ -59,7 +60,7 @@ export default function Dashboard() {
                     <Card className="text-center">
                         <Card.Body>
                             <FiClock size={24} className="text-primary mb-2" />
-                            <h2>{scheduled.length}</h2>
+                            <h2>{scheduled.total}</h2>
                             <small className="text-muted">Scheduled</small>
                         </Card.Body>
                     </Card>
@@ -19,8 +19,7 @@ export default function PostEditor() {
 
     useEffect(() => {
         if (isEdit) {
-            api.get('/posts/queue').then(({ data }) => {
-                const post = (data.posts || []).find(p => p._id === id);
+            api.get(`/posts/${id}`).then(({ data: post }) => {
                 if (post) {
                     setContent(post.content);
                     setStatus(post.status);
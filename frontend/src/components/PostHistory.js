@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Card, Table, Badge, Spinner, Button } from 'react-bootstrap';
 import api from '../config/api';
 import { FiArchive } from 'react-icons/fi';
@@ -8,15 +8,21 @@ export default function PostHistory() {
     const [total, setTotal] = useState(0);
     const [loading, setLoading] = useState(true);
     const [page, setPage] = useState(0);
+    // cursors[n] fetches page n; page 0 has none
+    const cursors = useRef([null]);
     const limit = 20;
 
     useEffect(() => {
         const load = async () => {
             setLoading(true);
             try {
-                const { data } = await api.get(`/history?skip=${page * limit}&limit=${limit}`);
+                const cursor = cursors.current[page];
+                const query = cursor ? `cursor=${encodeURIComponent(cursor)}` : 'total=true';
+                const { data } = await api.get(`/history?limit=${limit}&${query}`);
                 setPosts(data.posts || []);
-                setTotal(data.total);
+                if (data.total !== undefined) setTotal(data.total);
+                cursors.current = cursors.current.slice(0, page + 1);
+                if (data.next_cursor) cursors.current.push(data.next_cursor);
             } catch (err) {
                 console.error(err);
             } finally {
@@ -99,7 +105,7 @@ export default function PostHistory() {
                             <Button
                                 variant="outline-primary"
                                 size="sm"
-                                disabled={page >= totalPages - 1}
+                                disabled={page >= cursors.current.length - 1}
                                 onClick={() => setPage(p => p + 1)}
                             >
                                 Next
@@ -1,21 +1,29 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Card, Button, Badge, Alert, Spinner } from 'react-bootstrap';
 import { DragDropContext, Droppable, Draggable } from '@hello-pangea/dnd';
 import api from '../config/api';
 import { FiEdit2, FiTrash2, FiSend, FiClock, FiMenu } from 'react-icons/fi';
 
+const QUEUED = ['draft', 'scheduled'];
+
+const byQueueOrder = (a, b) =>
+    (a.queue_order ?? 0) - (b.queue_order ?? 0) || (a._id < b._id ? -1 : a._id > b._id ? 1 : 0);
+
 export default function PostQueue() {
     const [posts, setPosts] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
     const [publishing, setPublishing] = useState(null);
+    const [nextCursor, setNextCursor] = useState(null);
+    const nextCursorRef = useRef(null);
     const navigate = useNavigate();
 
     const loadQueue = useCallback(async () => {
         try {
             const { data } = await api.get('/posts/queue');
             setPosts(data.posts || []);
+            setNextCursor(data.next_cursor);
         } catch (err) {
             setError('Failed to load queue');
         } finally {
@@ -24,22 +32,59 @@ export default function PostQueue() {
     }, []);
 
     useEffect(() => { loadQueue(); }, [loadQueue]);
+    useEffect(() => { nextCursorRef.current = nextCursor; }, [nextCursor]);
+
+    // Live updates: publishes, failures and edits made elsewhere
+    useEffect(() => {
+        const source = new EventSource(`${api.defaults.baseURL}/events/posts`, { withCredentials: true });
+        source.onmessage = (message) => {
+            const event = JSON.parse(message.data);
+            if (event.type === 'resync') {
+                loadQueue();
+                return;
+            }
+            const id = event.type === 'delete' ? event._id : event.post._id;
+            setPosts(prev => {
+                const rest = prev.filter(p => p._id !== id);
+                if (event.type !== 'post' || !QUEUED.includes(event.post.status)) return rest;
+                // Posts past the loaded page arrive with "Load more"
+                const last = prev[prev.length - 1];
+                if (nextCursorRef.current && last && byQueueOrder(event.post, last) > 0) return rest;
+                return [...rest, event.post].sort(byQueueOrder);
+            });
+        };
+        return () => source.close();
+    }, [loadQueue]);
 
     const handleDragEnd = async (result) => {
         if (!result.destination) return;
         const items = Array.from(posts);
         const [moved] = items.splice(result.source.index, 1);
-        items.splice(result.destination.index, 0, moved);
+        const index = result.destination.index;
+        items.splice(index, 0, moved);
         setPosts(items);
 
         try {
-            await api.put('/posts/reorder', { post_ids: items.map(p => p._id) });
+            // One anchor is enough: the server finds the post really on the other side,
+            // which may be on a page not loaded yet
+            const anchor = index > 0 ? { after: items[index - 1]._id } : { before: items[1]?._id || null };
+            await api.post(`/posts/${moved._id}/move`, anchor);
         } catch (err) {
             setError('Failed to reorder');
             loadQueue();
         }
     };
 
+    const loadMore = async () => {
+        try {
+            const { data } = await api.get(`/posts/queue?cursor=${encodeURIComponent(nextCursor)}`);
+            setPosts(prev => [...prev, ...(data.posts || [])]);
+            setNextCursor(data.next_cursor);
+        } catch (err) {
+            setError('Failed to load queue');
+        }
+    };
+
     const handleDelete = async (id) => {
         if (!window.confirm('Delete this post?')) return;
         try {
@@ -55,7 +100,7 @@ export default function PostQueue() {
         setPublishing(id);
         try {
             await api.post(`/posts/${id}/publish-now`);
-            loadQueue();
+            setPosts(prev => prev.filter(p => p._id !== id));
         } catch (err) {
             setError(err.response?.data?.detail || 'Publish failed');
         } finally {
@@ -155,6 +200,12 @@ export default function PostQueue() {
                     </Droppable>
                 </DragDropContext>
             )}
+
+            {nextCursor && (
+                <div className="text-center mt-3">
+                    <Button variant="outline-primary" size="sm" onClick={loadMore}>Load more</Button>
+                </div>
+            )}
         </>
     );
 }